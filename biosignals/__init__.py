@@ -0,0 +1,2 @@
+# Signal processing for Empatica E4 recordings (ACC, BVP, EDA, HR, IBI, TEMP, tags).
+# Shared by the data/ training scripts, merging.py and the live service in "polar h10/".
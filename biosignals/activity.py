@@ -0,0 +1,159 @@
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from scipy.signal import butter, sosfilt, sosfilt_zi
+
+# Activity estimation from raw tri-axial accelerometer data (E4 ACC at 32 Hz,
+# or any live stream). Per epoch it reports:
+#   enmo_mg  - Euclidean norm minus one g, floored at zero, in milli-g
+#   counts   - band-passed (0.25-2.5 Hz) magnitude, rectified and averaged, in
+#              milli-g; the movement band without gravity or high-frequency noise
+#   met      - energy expenditure estimate interpolated from ENMO
+# The batch and the incremental path share one causal filter, so streaming a
+# recording in chunks gives the same epochs as processing it at once.
+
+BAND_HZ = (0.25, 2.5)
+FILTER_ORDER = 4
+
+# ENMO (mg) -> MET anchors; the ENMO values are the usual wrist thresholds for
+# light (44.8 mg), moderate (100.6 mg) and vigorous (428.8 mg) activity
+ENMO_ANCHORS_MG = np.array([0.0, 44.8, 100.6, 428.8, 1000.0])
+MET_ANCHORS = np.array([1.0, 1.5, 3.0, 6.0, 10.0])
+
+# MET bands for activity levels
+LEVELS = [(1.5, 'sedentary'), (3.0, 'light'), (6.0, 'moderate'), (np.inf, 'high')]
+
+
+def _band_sos(rate):
+    high = min(BAND_HZ[1], 0.45 * rate)
+    return butter(FILTER_ORDER, [BAND_HZ[0], high], btype='bandpass', fs=rate, output='sos')
+
+
+def enmo_to_met(enmo_mg):
+    return np.interp(enmo_mg, ENMO_ANCHORS_MG, MET_ANCHORS)
+
+
+def met_level(met):
+    """Activity level name for a MET value"""
+    for upper, name in LEVELS:
+        if met < upper:
+            return name
+    return LEVELS[-1][1]
+
+
+def magnitude_g(acc, units_per_g=1.0):
+    acc = np.asarray(acc, dtype=np.float64).reshape(-1, 3) / units_per_g
+    return np.sqrt((acc * acc).sum(axis=1))
+
+
+def movement_signals(magnitude, rate):
+    """Per-sample ENMO and rectified band-passed magnitude (both milli-g) for a whole recording"""
+    if len(magnitude) == 0:
+        return magnitude, magnitude
+    sos = _band_sos(rate)
+    # Start the filter settled at the first sample, as the streaming path does
+    filtered, _ = sosfilt(sos, magnitude, zi=sosfilt_zi(sos) * magnitude[0])
+    return np.maximum(magnitude - 1.0, 0.0) * 1000.0, np.abs(filtered) * 1000.0
+
+
+def _epoch_stats(enmo, band, epoch_samples):
+    """Per-epoch ENMO, counts and MET over whole epochs of per-sample ENMO / rectified band"""
+    n_epochs = len(enmo) // epoch_samples
+    used = n_epochs * epoch_samples
+    enmo_mg = enmo[:used].reshape(n_epochs, epoch_samples).mean(axis=1)
+    counts = band[:used].reshape(n_epochs, epoch_samples).mean(axis=1)
+    return enmo_mg, counts, enmo_to_met(enmo_mg)
+
+
+def activity_epochs(acc, rate, epoch_s=10.0, units_per_g=1.0, start=0.0):
+    """Epoch table for a whole ACC recording; acc is (n, 3) raw samples
+
+    units_per_g converts raw values to g (64 for E4 ACC counts).
+    """
+    enmo, band = movement_signals(magnitude_g(acc, units_per_g), rate)
+    epoch_samples = max(int(round(epoch_s * rate)), 1)
+    enmo_mg, counts, met = _epoch_stats(enmo, band, epoch_samples)
+    return pd.DataFrame({
+        'epoch_start': start + np.arange(len(met)) * epoch_samples / rate,
+        'enmo_mg': enmo_mg,
+        'counts': counts,
+        'met': met,
+    })
+
+
+class ActivityStream:
+    """Incremental activity epochs for one live accelerometer stream"""
+
+    def __init__(self, rate, epoch_s=10.0, units_per_g=1.0, history=360):
+        self.rate = float(rate)
+        self.units_per_g = units_per_g
+        self.epoch_samples = max(int(round(epoch_s * rate)), 1)
+        self._sos = _band_sos(self.rate)
+        self._zi = None
+        self._pending_enmo = np.empty(0)
+        self._pending_band = np.empty(0)
+        self.epochs = deque(maxlen=history)  # (epoch_start, enmo_mg, counts, met)
+        self._next_start = None
+        self._lock = threading.Lock()
+
+    def add(self, samples, t_first=None):
+        """Add (n, 3) samples; returns the epochs completed by this chunk"""
+        magnitude = magnitude_g(samples, self.units_per_g)
+        if len(magnitude) == 0:
+            return []
+        with self._lock:
+            if self._zi is None:
+                self._zi = sosfilt_zi(self._sos) * magnitude[0]
+                self._next_start = 0.0 if t_first is None else float(t_first)
+            filtered, self._zi = sosfilt(self._sos, magnitude, zi=self._zi)
+            enmo = np.concatenate([self._pending_enmo, np.maximum(magnitude - 1.0, 0.0) * 1000.0])
+            band = np.concatenate([self._pending_band, np.abs(filtered) * 1000.0])
+
+            enmo_mg, counts, met = _epoch_stats(enmo, band, self.epoch_samples)
+            used = len(met) * self.epoch_samples
+            self._pending_enmo, self._pending_band = enmo[used:], band[used:]
+
+            completed = []
+            for i in range(len(met)):
+                epoch = (self._next_start, float(enmo_mg[i]), float(counts[i]), float(met[i]))
+                self._next_start += self.epoch_samples / self.rate
+                self.epochs.append(epoch)
+                completed.append(epoch)
+            return completed
+
+    def summary(self, last_epochs=6):
+        """Mean ENMO/counts/MET over the most recent epochs, or None before the first epoch"""
+        with self._lock:
+            recent = list(self.epochs)[-last_epochs:]
+        if not recent:
+            return None
+        values = np.array([e[1:] for e in recent])
+        enmo_mg, counts, met = values.mean(axis=0)
+        return {'enmo_mg': float(enmo_mg), 'counts': float(counts), 'met': float(met),
+                'activity_level': met_level(met), 'epochs': len(recent)}
+
+
+class ActivityRegistry:
+    """One ActivityStream per user, created on the first ACC window"""
+
+    def __init__(self, epoch_s=10.0, units_per_g=1.0):
+        self.epoch_s = epoch_s
+        self.units_per_g = units_per_g
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def add(self, user_id, samples, rate, t_first=None):
+        stream = self._streams.get(user_id)
+        if stream is None or stream.rate != float(rate):
+            with self._lock:
+                # Another thread may have created it since the unlocked check
+                stream = self._streams.get(user_id)
+                if stream is None or stream.rate != float(rate):
+                    stream = self._streams[user_id] = ActivityStream(rate, self.epoch_s, self.units_per_g)
+        return stream.add(samples, t_first)
+
+    def summary(self, user_id, last_epochs=6):
+        stream = self._streams.get(user_id)
+        return stream.summary(last_epochs) if stream is not None else None
@@ -0,0 +1,122 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Content-addressed cache of parsed E4 recordings and the datasets derived from them.
+# A stream CSV is parsed once into <root>/streams/<sha1 of file bytes>.npy plus a
+# JSON sidecar with its start time, sample rate and channel count; later loads
+# memory-map the .npy instead of re-parsing. Derived frames (windowed features,
+# merged tables) are keyed by the digests of their inputs, their build
+# parameters and the producer's schema version, so editing or replacing an
+# input file, or changing the columns a producer outputs (bump its version),
+# invalidates them.
+
+CACHE_VERSION = 1
+DEFAULT_ROOT = os.getenv('E4_CACHE_DIR', '.e4cache')
+HASH_CHUNK = 1 << 20
+
+
+def _write_atomic(path, write):
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+class RecordingCache:
+    """Parsed-recording cache rooted at one directory"""
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+        self._digests = {}  # (path, size, mtime_ns) -> sha1, so unchanged files are hashed once per process
+
+    def digest(self, path):
+        """sha1 of a file's contents"""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(key)
+        if digest is None:
+            h = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(HASH_CHUNK), b''):
+                    h.update(block)
+            digest = self._digests[key] = h.hexdigest()
+        return digest
+
+    def _paths(self, kind, key):
+        directory = os.path.join(self.root, kind)
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, key)
+        return base + '.npy', base + '.json'
+
+    def stream(self, path, parse):
+        """(meta, samples) for a stream file; parse(path) -> (meta, array) runs only on a cache miss
+
+        samples is a read-only memory map of the cached array.
+        """
+        array_path, meta_path = self._paths('streams', self.digest(path))
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('version') == CACHE_VERSION:
+                return meta, np.load(array_path, mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            pass
+
+        meta, samples = parse(path)
+        meta = dict(meta, version=CACHE_VERSION, source=os.path.abspath(path))
+        samples = np.ascontiguousarray(samples)
+        # Array first, sidecar last: a sidecar only exists once its array is complete
+        _write_atomic(array_path, lambda f: np.save(f, samples))
+        _write_atomic(meta_path, lambda f: f.write(json.dumps(meta).encode()))
+        return meta, np.load(array_path, mmap_mode='r')
+
+    def derived_key(self, name, inputs, params=None, schema_version=1):
+        """Cache key of a dataset built from input files with the given parameters by a producer at schema_version"""
+        spec = {
+            'name': name,
+            'version': CACHE_VERSION,
+            'schema': schema_version,
+            'inputs': {label: self.digest(path) for label, path in sorted(inputs.items())},
+            'params': params or {},
+        }
+        return hashlib.sha1(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+    def frame(self, name, inputs, params, build, schema_version=1):
+        """DataFrame built by build() from the input files, cached until any input, param or schema_version changes
+
+        inputs maps a label to a file path; params must be JSON-serializable.
+        Columns must be numeric. Producers bump schema_version whenever the
+        frame's columns or their meaning change.
+        """
+        array_path, meta_path = self._paths('derived', self.derived_key(name, inputs, params, schema_version))
+        if os.path.exists(meta_path):
+            try:
+                records = np.load(array_path, mmap_mode='r')
+                return pd.DataFrame.from_records(records)
+            except (FileNotFoundError, ValueError):
+                pass
+
+        frame = build()
+        records = frame.to_records(index=False)
+        _write_atomic(array_path, lambda f: np.save(f, records))
+        meta = {'name': name, 'version': CACHE_VERSION, 'schema': schema_version, 'rows': len(frame), 'columns': list(frame.columns),
+                'inputs': {label: os.path.abspath(path) for label, path in inputs.items()}, 'params': params}
+        _write_atomic(meta_path, lambda f: f.write(json.dumps(meta, default=str).encode()))
+        return frame
+
+    def clear(self):
+        """Delete every cached file; returns how many were removed"""
+        removed = 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                os.remove(os.path.join(directory, name))
+                removed += 1
+        return removed
+
+
+def default_cache(root=DEFAULT_ROOT):
+    """RecordingCache at root, or None when root is empty (caching disabled)"""
+    return RecordingCache(root) if root else None
@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import shutil
+import traceback
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from biosignals.cache import default_cache
+from biosignals.features import extract_recording_features
+from biosignals.hrv import recording_hrv
+from biosignals.merge import stream_spans
+from biosignals.phases import load_phase_index
+from biosignals.quality import mask_low_quality
+
+# Multi-subject dataset builder.
+# Subjects come from subject-info.csv and the two Stress_Level files; each
+# subject's E4 recordings (<recordings>/<subject>/*.csv) are turned into windowed
+# features in a worker process, every window is labelled with the stress rating
+# of the protocol phase it falls in, and the result is written as one partition
+# per subject. A subject that fails is reported and skipped; the rest still build.
+#
+# Output layout (columnar, one .npy per column so partitions can be memory-mapped):
+#   <output>/protocol=V1/subject=S01/<column>.npy + _meta.json
+
+STREAMS = ['HR', 'TEMP', 'EDA', 'BVP']
+SUBJECT_ID = re.compile(r'^[A-Za-z]\d+$')
+
+
+def load_subjects(data_dir):
+    """One row per subject: demographics from subject-info.csv plus protocol and phase ratings"""
+    info = pd.read_csv(os.path.join(data_dir, 'subject-info.csv'), dtype=str)
+    info.columns = [c.strip() for c in info.columns]
+    info = info.rename(columns={
+        'Info': 'subject', 'Gender': 'gender', 'Age': 'age', 'Height (cm)': 'height_cm',
+        'Weight (kg)': 'weight_kg', 'Does physical activity regularly?': 'physically_active', 'Protocol': 'protocol',
+    })
+    info['subject'] = info['subject'].str.strip()
+    # The file ends with a legend; annotation marks (*, **) are stripped from values
+    info = info[info['subject'].fillna('').str.match(SUBJECT_ID)]
+    info = info.apply(lambda col: col.str.replace('*', '', regex=False).str.strip())
+    info = info.set_index('subject')[['gender', 'age', 'height_cm', 'weight_kg', 'physically_active', 'protocol']]
+
+    labels = {}
+    for protocol, name in (('V1', 'Stress_Level_v1.csv'), ('V2', 'Stress_Level_v2.csv')):
+        table = pd.read_csv(os.path.join(data_dir, name), index_col=0)
+        table.index = table.index.str.strip()
+        for subject, row in table.iterrows():
+            labels[subject] = (protocol, row.to_dict())
+
+    subjects = sorted(set(info.index) | set(labels))
+    rows = []
+    for subject in subjects:
+        row = info.loc[subject].to_dict() if subject in info.index else {}
+        protocol, ratings = labels.get(subject, (row.get('protocol'), {}))
+        row.update(subject=subject, protocol=row.get('protocol') or protocol, ratings=ratings)
+        rows.append(row)
+    return rows
+
+
+def write_partition(output, keys, frame):
+    """Write a frame as one column file per column under output/k=v/..., replacing any previous build"""
+    directory = os.path.join(output, *(f'{k}={v}' for k, v in keys.items()))
+    tmp_dir = f'{directory}.tmp{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for column in frame.columns:
+        values = frame[column].to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        np.save(os.path.join(tmp_dir, f'{column}.npy'), values)
+    with open(os.path.join(tmp_dir, '_meta.json'), 'w') as f:
+        json.dump({'rows': len(frame), 'columns': list(frame.columns), 'keys': keys}, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return directory
+
+
+def read_dataset(output, columns=None, **filters):
+    """Concatenate partitions into one DataFrame; filters select partitions, e.g. protocol='V1'"""
+    frames = []
+    for directory, _, names in sorted(os.walk(output)):
+        if '_meta.json' not in names or '.tmp' in directory:
+            continue
+        with open(os.path.join(directory, '_meta.json')) as f:
+            meta = json.load(f)
+        if any(str(meta['keys'].get(k)) != str(v) for k, v in filters.items()):
+            continue
+        wanted = [c for c in (columns or meta['columns']) if c in meta['columns']]
+        frames.append(pd.DataFrame({c: np.load(os.path.join(directory, f'{c}.npy'), mmap_mode='r') for c in wanted}))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def build_subject(subject, recordings, output, window_s=60.0, hop_s=10.0, cache_dir=None, streams=STREAMS):
+    """Build and write one subject's partition; returns a summary dict (runs in a worker)"""
+    directory = os.path.join(recordings, subject['subject'])
+    paths = {name: os.path.join(directory, f'{name}.csv') for name in streams}
+    paths = {name: path for name, path in paths.items() if os.path.exists(path)}
+    if not paths:
+        raise FileNotFoundError(f"no {'/'.join(streams)} recordings in {directory}")
+    cache = default_cache(cache_dir) if cache_dir else None
+
+    # Protocol phases from tags.csv; windows are laid out within each phase so none straddles a boundary
+    protocol = subject['protocol']
+    spans = stream_spans(paths, cache)
+    index = load_phase_index(directory, protocol, subject['ratings'],
+                             min(s for s, _, _ in spans.values()), max(e for _, e, _ in spans.values()))
+
+    frame = extract_recording_features(paths, window_s, hop_s, cache, phase_index=index)
+    if frame.empty:
+        raise ValueError("streams do not overlap for a single full window")
+    window_starts = frame['window_start'].to_numpy()
+
+    ibi_path = os.path.join(directory, 'IBI.csv')
+    if os.path.exists(ibi_path):
+        bvp_path = paths.get('BVP')
+        frame = pd.concat([frame, recording_hrv(ibi_path, window_starts, window_s, bvp_path, cache)], axis=1)
+    # Motion-corrupted pulse windows are blanked; bvp_sqi stays as a sample weight
+    frame = mask_low_quality(frame)
+
+    # Label each window by the phase it lies in
+    if index is not None:
+        frame['phase'], frame['stress_level'] = index.label(window_starts)
+    else:
+        frame['phase'], frame['stress_level'] = '', np.nan
+    labelled = int((frame['phase'] != '').sum())
+
+    for column in ('gender', 'physically_active'):
+        frame[column] = subject.get(column) or ''
+    for column in ('age', 'height_cm', 'weight_kg'):
+        frame[column] = pd.to_numeric(subject.get(column), errors='coerce')
+    frame['subject'] = subject['subject']
+
+    write_partition(output, {'protocol': protocol, 'subject': subject['subject']}, frame)
+    return {'subject': subject['subject'], 'rows': len(frame), 'labelled': labelled}
+
+
+def _build_subject_safe(subject, *args):
+    try:
+        return build_subject(subject, *args)
+    except Exception as e:
+        return {'subject': subject['subject'], 'error': f"{type(e).__name__}: {e}",
+                'traceback': traceback.format_exc()}
+
+
+def build_dataset(data_dir, recordings, output, window_s=60.0, hop_s=10.0, cache_dir=None,
+                  workers=None, subjects=None):
+    """Build every subject's partition in a process pool; returns (successes, failures)"""
+    rows = load_subjects(data_dir)
+    if subjects:
+        rows = [r for r in rows if r['subject'] in subjects]
+    os.makedirs(output, exist_ok=True)
+
+    successes, failures = [], []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_build_subject_safe, row, recordings, output, window_s, hop_s, cache_dir): row['subject']
+                   for row in rows}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. out of memory); only its subject is lost
+                result = {'subject': futures[future], 'error': f"{type(e).__name__}: {e}"}
+            (failures if 'error' in result else successes).append(result)
+    key = lambda r: r['subject']
+    return sorted(successes, key=key), sorted(failures, key=key)
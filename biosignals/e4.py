@@ -0,0 +1,110 @@
+import csv
+import numpy as np
+import pandas as pd
+
+# Readers for Empatica E4 CSV exports.
+# Every stream file starts with a header row holding the session start time (one
+# cell per channel) and a second row holding the sample rate in Hz; the samples
+# follow, one row per sample. IBI.csv and tags.csv have their own layouts.
+
+# E4 accelerometer counts per g
+ACC_UNITS_PER_G = 64.0
+
+# Channel names per stream file
+STREAM_CHANNELS = {
+    'ACC': ['Acc_X', 'Acc_Y', 'Acc_Z'],
+    'BVP': ['BVP'],
+    'EDA': ['EDA'],
+    'HR': ['HR'],
+    'TEMP': ['Temp'],
+}
+
+
+def parse_timestamp(value):
+    """E4 start time as UTC epoch seconds; accepts epoch numbers or date strings"""
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        ts = pd.Timestamp(value)
+        if ts.tzinfo is None:
+            ts = ts.tz_localize('UTC')
+        return ts.timestamp()
+
+
+def read_header(path):
+    """(start_time, sample_rate, n_channels) from the first two rows of an E4 stream file"""
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        start_row = next(reader)
+        rate_row = next(reader)
+    return parse_timestamp(start_row[0]), float(rate_row[0]), len(start_row)
+
+
+def parse_stream(path, dtype=np.float32):
+    """(meta, samples) for a whole E4 stream file; the parse a RecordingCache stores"""
+    start, rate, n_channels = read_header(path)
+    samples = pd.read_csv(path, skiprows=2, header=None, dtype=dtype, engine='c').to_numpy()
+    return {'start': start, 'rate': rate, 'n_channels': n_channels}, samples
+
+
+class E4Stream:
+    """Header info for one E4 stream file plus helpers to read its samples
+
+    With a RecordingCache, samples are parsed once and memory-mapped on later reads.
+    """
+
+    def __init__(self, path, channels=None, cache=None):
+        self.path = path
+        self.cache = cache
+        self.start, self.rate, self.n_channels = read_header(path)
+        self.channels = channels or [f'ch{i}' for i in range(self.n_channels)]
+
+    def times(self, first_index, n):
+        """Epoch timestamps of samples first_index .. first_index + n - 1"""
+        return self.start + (first_index + np.arange(n)) / self.rate
+
+    def iter_chunks(self, chunk_rows=65536, dtype=np.float32):
+        """Yield (first_index, samples) blocks of at most chunk_rows rows"""
+        if self.cache is not None:
+            samples = self.read(dtype)
+            for first_index in range(0, len(samples), chunk_rows):
+                yield first_index, samples[first_index:first_index + chunk_rows]
+            return
+        first_index = 0
+        reader = pd.read_csv(self.path, skiprows=2, header=None, chunksize=chunk_rows,
+                             dtype=dtype, engine='c')
+        for chunk in reader:
+            values = chunk.to_numpy()
+            yield first_index, values
+            first_index += len(values)
+
+    def read(self, dtype=np.float32):
+        """All samples as one (n, n_channels) array; read-only when served from the cache"""
+        if self.cache is not None:
+            _, samples = self.cache.stream(self.path, parse_stream)
+            return samples if samples.dtype == dtype else samples.astype(dtype)
+        return parse_stream(self.path, dtype)[1]
+
+
+def open_stream(path, name=None, cache=None):
+    """E4Stream with channel names filled in from STREAM_CHANNELS when the stream is known"""
+    return E4Stream(path, STREAM_CHANNELS.get(name), cache)
+
+
+def read_tags(path):
+    """Event-marker times from tags.csv as sorted epoch seconds"""
+    try:
+        tags = pd.read_csv(path, header=None)
+    except pd.errors.EmptyDataError:
+        return np.empty(0)
+    return np.sort(np.array([parse_timestamp(v) for v in tags[0]], dtype=np.float64))
+
+
+def read_ibi(path):
+    """(beat_times, intervals) from IBI.csv; beat_times are epoch seconds, intervals in seconds"""
+    start, _, _ = read_header(path)
+    data = pd.read_csv(path, skiprows=1, header=None, dtype=np.float64).to_numpy()
+    if len(data) == 0:
+        return np.empty(0), np.empty(0)
+    return start + data[:, 0], data[:, 1]
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from biosignals.activity import enmo_to_met, movement_signals
+from biosignals.e4 import ACC_UNITS_PER_G, open_stream
+from biosignals.eda import windowed_eda
+from biosignals.quality import bvp_quality
+
+# Rolling-window physiological features over E4 streams.
+# Windows are zero-copy strided views of the raw signal, and every statistic
+# is computed for all windows of a stream in one vectorized pass. Offline
+# dataset builds use extract_features; the live vitals ring uses window_summary.
+# The training scripts in data/ still train on instantaneous samples.
+
+# Version of extract_features' output columns; bump it whenever a column is
+# added, removed or computed differently so cached feature frames are rebuilt
+FEATURES_VERSION = 4
+
+# Streams and the prefix their features get
+FEATURE_STREAMS = {'HR': 'hr', 'TEMP': 'temp', 'EDA': 'eda', 'BVP': 'bvp', 'ACC': 'acc'}
+
+
+def sliding_windows(x, window, hop):
+    """(n_windows, window[, channels]) strided view of x; no data is copied"""
+    if len(x) < window:
+        return sliding_window_view(np.empty((window,) + x.shape[1:], dtype=x.dtype), window, axis=0)[:0]
+    return sliding_window_view(x, window, axis=0)[::hop]
+
+
+def window_stats(windows, rate):
+    """mean, std and least-squares slope (units per minute) of each 1-D window"""
+    w = windows.shape[-1]
+    mean = windows.mean(axis=-1)
+    std = windows.std(axis=-1)
+    # Slope against centred time; windows @ t is one BLAS call for all windows
+    t = (np.arange(w) - (w - 1) / 2.0) / rate / 60.0
+    denom = (t * t).sum()
+    slope = windows @ t / denom if denom > 0 else np.zeros(len(windows))
+    return mean, std, slope
+
+
+def acc_magnitude(acc):
+    """Acceleration magnitude in g from raw E4 ACC counts, shape (n, 3) -> (n,)"""
+    acc = np.asarray(acc, dtype=np.float32)
+    return np.sqrt((acc * acc).sum(axis=-1)) / ACC_UNITS_PER_G
+
+
+def stream_features(values, rate, window_s, hop_s, prefix):
+    """Feature columns for one stream; ACC adds activity measures and EDA its tonic/phasic split"""
+    window = max(int(round(window_s * rate)), 2)
+    hop = max(int(round(hop_s * rate)), 1)
+    values = np.asarray(values, dtype=np.float32)
+
+    if prefix == 'acc':
+        magnitude = acc_magnitude(values)
+        mean, std, _ = window_stats(sliding_windows(magnitude, window, hop), rate)
+        enmo, band = movement_signals(magnitude.astype(np.float64), rate)
+        enmo_mg = sliding_windows(enmo, window, hop).mean(axis=-1)
+        # Movement energy: variance of the magnitude, i.e. with gravity (the window mean) removed
+        return {'acc_mag_mean': mean, 'acc_energy': std * std, 'acc_enmo_mg': enmo_mg,
+                'acc_counts': sliding_windows(band, window, hop).mean(axis=-1), 'acc_met': enmo_to_met(enmo_mg)}
+
+    x = values[:, 0] if values.ndim == 2 else values
+    mean, std, slope = window_stats(sliding_windows(x, window, hop), rate)
+    columns = {f'{prefix}_mean': mean, f'{prefix}_std': std, f'{prefix}_slope': slope}
+    if prefix == 'eda':
+        # Tonic level and skin conductance responses separate slow drift from arousal
+        columns.update(windowed_eda(x, rate, window, hop))
+    return columns
+
+
+def extract_features(streams, window_s=60.0, hop_s=10.0, phase_index=None):
+    """Windowed features for several streams on one window grid
+
+    streams maps a stream name ('HR', 'TEMP', 'EDA', 'BVP', 'ACC') to
+    (start_time, rate, values). Windows start at the latest stream start and
+    advance by hop_s; only windows every stream fully covers are returned.
+    With BVP, each window also gets a signal-quality index (bvp_sqi), which
+    includes a motion score when ACC is present.
+
+    With a PhaseIndex the grid restarts at each protocol phase, so no window
+    straddles a phase boundary; time outside the labelled phases gets no windows.
+    """
+    if not streams:
+        return pd.DataFrame()
+    if phase_index is not None:
+        phases = [{} for _ in range(len(phase_index))]
+        for name, (start, rate, values) in streams.items():
+            for k, first_time, segment in phase_index.segments(start, rate, np.asarray(values)):
+                phases[k][name] = (first_time, rate, segment)
+        frames = [extract_features(phase, window_s, hop_s) for phase in phases]
+        frames = [frame for frame in frames if not frame.empty]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    grid_start = max(start for start, _, _ in streams.values())
+    columns = {}
+    n_windows = None
+    for name, (start, rate, values) in streams.items():
+        # Skip the samples before the shared grid start so window k begins at grid_start + k * hop_s
+        offset = int(round((grid_start - start) * rate))
+        feats = stream_features(np.asarray(values)[offset:], rate, window_s, hop_s, FEATURE_STREAMS[name])
+        for key, column in feats.items():
+            columns[key] = column
+            n_windows = len(column) if n_windows is None else min(n_windows, len(column))
+
+    if 'BVP' in streams:
+        start, rate, values = streams['BVP']
+        bvp = np.asarray(values)[int(round((grid_start - start) * rate)):]
+        window = max(int(round(window_s * rate)), 2)
+        hop = max(int(round(hop_s * rate)), 1)
+        columns.update(bvp_quality(bvp, rate, window, hop, columns.get('acc_energy')))
+
+    n_windows = n_windows or 0
+    frame = pd.DataFrame({key: column[:n_windows] for key, column in columns.items()})
+    frame.insert(0, 'window_start', grid_start + np.arange(n_windows) * hop_s)
+    return frame
+
+
+def extract_recording_features(paths, window_s=60.0, hop_s=10.0, cache=None, phase_index=None):
+    """extract_features for E4 CSV files; paths maps stream name to CSV path
+
+    With a RecordingCache both the parsed streams and the resulting feature
+    frame are cached; the frame is rebuilt when an input file or parameter
+    (including the phase boundaries) changes.
+    """
+    def build():
+        streams = {}
+        for name, path in paths.items():
+            stream = open_stream(path, name, cache)
+            streams[name] = (stream.start, stream.rate, stream.read())
+        return extract_features(streams, window_s, hop_s, phase_index)
+
+    if cache is None:
+        return build()
+    params = {'window_s': window_s, 'hop_s': hop_s}
+    if phase_index is not None:
+        params['phases'] = phase_index.boundaries[:len(phase_index) + 1].tolist()
+    return cache.frame('windowed_features', paths, params, build, schema_version=FEATURES_VERSION)
+
+
+def window_summary(timestamps, values, weights=None):
+    """mean, std, least-squares slope (per minute), min and max of each row of values over one live window
+
+    values is (n_columns, n) sampled at the (irregular) timestamps in seconds;
+    optional per-sample weights (e.g. signal quality) give a weighted fit.
+    """
+    t = np.asarray(timestamps, dtype=np.float64)
+    x = np.asarray(values, dtype=np.float64)
+    w = np.ones(len(t)) if weights is None else np.asarray(weights, dtype=np.float64)
+    w = w / w.sum()
+    mean = x @ w
+    centred = x - mean[:, None]
+    tc = (t - w @ t) / 60.0
+    denom = w @ (tc * tc)
+    slope = centred @ (w * tc) / denom if denom > 0 else np.zeros(len(x))
+    std = np.sqrt((centred * centred) @ w)
+    return mean, std, slope, x.min(axis=1), x.max(axis=1)
+
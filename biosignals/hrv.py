@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+from scipy.signal import butter, sosfiltfilt, find_peaks
+
+from biosignals.e4 import open_stream, read_ibi
+
+# Time-domain heart-rate variability from E4 beats.
+# Beats come from IBI.csv; where the E4 dropped beats (gaps in IBI.csv), peaks
+# detected in the 64 Hz BVP signal fill in. Window statistics are computed for
+# all windows at once from cumulative sums, so a whole session takes milliseconds.
+
+# Physiologically plausible inter-beat interval range in seconds (30 - 200 bpm)
+MIN_IBI = 0.3
+MAX_IBI = 2.0
+
+# Successive-difference threshold for pNN50, seconds
+NN50 = 0.05
+
+
+def detect_bvp_peaks(bvp, rate, low_hz=0.7, high_hz=3.5):
+    """Beat times (seconds from the first sample) from a BVP signal
+
+    The signal is band-passed around the heart-rate band, then peaks at least
+    MIN_IBI apart with a prominence relative to the signal spread are kept.
+    """
+    bvp = np.asarray(bvp, dtype=np.float64).ravel()
+    if len(bvp) < int(3 * rate):
+        return np.empty(0)
+    sos = butter(2, [low_hz, high_hz], btype='bandpass', fs=rate, output='sos')
+    filtered = sosfiltfilt(sos, bvp)
+    spread = np.percentile(filtered, 95) - np.percentile(filtered, 5)
+    peaks, _ = find_peaks(filtered, distance=max(int(MIN_IBI * rate), 1), prominence=0.2 * spread)
+    return peaks / rate
+
+
+def find_gaps(beat_times, intervals, tolerance=0.5):
+    """(gap_start, gap_end) times where IBI.csv skips beats
+
+    E4 reports each beat with the interval to the previous one; when the time
+    since the previous reported beat is clearly longer than that interval, beats
+    were dropped in between.
+    """
+    beat_times = np.asarray(beat_times, dtype=np.float64)
+    if len(beat_times) < 2:
+        return np.empty(0), np.empty(0)
+    elapsed = np.diff(beat_times)
+    gap = elapsed > np.asarray(intervals)[1:] * (1 + tolerance)
+    return beat_times[:-1][gap], beat_times[1:][gap]
+
+
+def fill_beats(beat_times, intervals, peak_times, gap_starts=None, gap_ends=None):
+    """IBI beats plus the BVP peaks that fall inside IBI gaps, sorted
+
+    peak_times must be epoch seconds. Also returns a flag per beat: True where
+    the beat came from BVP.
+    """
+    beat_times = np.asarray(beat_times, dtype=np.float64)
+    peak_times = np.asarray(peak_times, dtype=np.float64)
+    if gap_starts is None:
+        gap_starts, gap_ends = find_gaps(beat_times, intervals)
+    if len(beat_times) == 0:
+        # No IBI at all: the BVP peaks are the beats
+        return peak_times, np.ones(len(peak_times), dtype=bool)
+
+    # Peaks before the first / after the last IBI beat count as gaps too
+    gap_starts = np.concatenate([[-np.inf], gap_starts, [beat_times[-1]]])
+    gap_ends = np.concatenate([[beat_times[0]], gap_ends, [np.inf]])
+    # A peak is inside gap k when it lies after gap_starts[k] and before gap_ends[k],
+    # keeping MIN_IBI away from the bounding IBI beats to avoid double counting
+    k = np.searchsorted(gap_starts, peak_times, side='right') - 1
+    inside = (k >= 0) & (peak_times > gap_starts[k] + MIN_IBI) & (peak_times < gap_ends[k] - MIN_IBI)
+    extra = peak_times[inside]
+
+    times = np.concatenate([beat_times, extra])
+    from_bvp = np.concatenate([np.zeros(len(beat_times), dtype=bool), np.ones(len(extra), dtype=bool)])
+    order = np.argsort(times, kind='stable')
+    return times[order], from_bvp[order]
+
+
+def beat_intervals(times):
+    """(interval_end_times, intervals, valid) from sorted beat times"""
+    times = np.asarray(times, dtype=np.float64)
+    intervals = np.diff(times)
+    valid = (intervals >= MIN_IBI) & (intervals <= MAX_IBI)
+    return times[1:], intervals, valid
+
+
+def time_domain_hrv(intervals, valid=None):
+    """RMSSD and SDNN (ms), pNN50 (%) and mean HR (bpm) for one run of consecutive intervals"""
+    x = np.asarray(intervals, dtype=np.float64)
+    valid = np.ones(len(x), dtype=bool) if valid is None else np.asarray(valid)
+    nn = x[valid]
+    pair = valid[1:] & valid[:-1]
+    diffs = np.diff(x)[pair]
+    return {
+        'rmssd_ms': float(np.sqrt(np.mean(diffs ** 2)) * 1000) if len(diffs) else np.nan,
+        'sdnn_ms': float(np.std(nn, ddof=1) * 1000) if len(nn) > 1 else np.nan,
+        'pnn50': float(np.mean(np.abs(diffs) > NN50) * 100) if len(diffs) else np.nan,
+        'mean_hr': float(60.0 / nn.mean()) if len(nn) else np.nan,
+        'n_beats': int(len(nn)),
+    }
+
+
+def windowed_hrv(end_times, intervals, valid, window_starts, window_s):
+    """Time-domain HRV for every window [start, start + window_s) at once
+
+    An interval belongs to the window its ending beat falls in. Returns a
+    DataFrame with hrv_rmssd_ms, hrv_sdnn_ms, hrv_pnn50, hrv_mean_hr, hrv_beats.
+    """
+    end_times = np.asarray(end_times, dtype=np.float64)
+    x = np.asarray(intervals, dtype=np.float64)
+    v = np.asarray(valid, dtype=bool)
+    starts = np.asarray(window_starts, dtype=np.float64)
+
+    def prefix(values):
+        return np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+
+    xv = np.where(v, x, 0.0)
+    n_cs, x_cs, x2_cs = prefix(v), prefix(xv), prefix(xv * xv)
+    # Successive differences, attributed to the later interval; both must be valid
+    pair = np.concatenate([[False], v[1:] & v[:-1]])
+    d = np.concatenate([[0.0], np.diff(x)])
+    d = np.where(pair, d, 0.0)
+    p_cs, d2_cs, nn50_cs = prefix(pair), prefix(d * d), prefix(np.abs(d) > NN50)
+
+    lo = np.searchsorted(end_times, starts, side='left')
+    hi = np.searchsorted(end_times, starts + window_s, side='left')
+    # The window's first interval pairs with one outside the window; skip that pair
+    lo_pair = np.minimum(lo + 1, hi)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        n = n_cs[hi] - n_cs[lo]
+        mean = (x_cs[hi] - x_cs[lo]) / n
+        var = ((x2_cs[hi] - x2_cs[lo]) - n * mean * mean) / (n - 1)
+        pairs = p_cs[hi] - p_cs[lo_pair]
+        rmssd = np.sqrt((d2_cs[hi] - d2_cs[lo_pair]) / pairs)
+        pnn50 = (nn50_cs[hi] - nn50_cs[lo_pair]) / pairs * 100
+
+    return pd.DataFrame({
+        'hrv_rmssd_ms': np.where(pairs > 0, rmssd * 1000, np.nan),
+        'hrv_sdnn_ms': np.where(n > 1, np.sqrt(np.maximum(var, 0)) * 1000, np.nan),
+        'hrv_pnn50': np.where(pairs > 0, pnn50, np.nan),
+        'hrv_mean_hr': np.where(n > 0, 60.0 / mean, np.nan),
+        'hrv_beats': n.astype(np.int64),
+    })
+
+
+def session_beats(ibi_path, bvp_path=None, cache=None):
+    """Beat times for a recording: IBI.csv beats, gaps filled from BVP peaks when bvp_path is given"""
+    beat_times, intervals = read_ibi(ibi_path)
+    if bvp_path is None:
+        return beat_times, np.zeros(len(beat_times), dtype=bool)
+    bvp = open_stream(bvp_path, 'BVP', cache)
+    peak_times = bvp.start + detect_bvp_peaks(bvp.read(), bvp.rate)
+    return fill_beats(beat_times, intervals, peak_times)
+
+
+def recording_hrv(ibi_path, window_starts, window_s, bvp_path=None, cache=None):
+    """Windowed HRV feature columns for a recording, aligned to the given window starts"""
+    times, from_bvp = session_beats(ibi_path, bvp_path, cache)
+    end_times, intervals, valid = beat_intervals(times)
+    frame = windowed_hrv(end_times, intervals, valid, window_starts, window_s)
+    # Share of each window's beats that had to come from BVP
+    bvp_cs = np.concatenate([[0.0], np.cumsum(from_bvp[1:] & valid)])
+    lo = np.searchsorted(end_times, window_starts, side='left')
+    hi = np.searchsorted(end_times, np.asarray(window_starts) + window_s, side='left')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        frame['hrv_bvp_fraction'] = np.where(frame['hrv_beats'] > 0, (bvp_cs[hi] - bvp_cs[lo]) / frame['hrv_beats'], np.nan)
+    return frame
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+from biosignals.e4 import open_stream
+
+# Streaming, timestamp-aligned merge of E4 streams onto one common clock.
+# Each stream is read in chunks and resampled block by block: streams faster
+# than the target rate (ACC at 32 Hz) are averaged into target-rate bins,
+# slower ones (HR at 1 Hz) are linearly interpolated. Only one block of output
+# plus a small tail of each input is held in memory at a time.
+
+
+class StreamResampler:
+    """Incrementally resample one E4 stream onto target-clock blocks"""
+
+    def __init__(self, stream, target_rate, chunk_rows=65536):
+        self.stream = stream
+        self.target_rate = target_rate
+        self.mode = 'mean' if stream.rate > target_rate else 'interp'
+        self._chunks = stream.iter_chunks(chunk_rows)
+        self._t = np.empty(0)
+        self._v = np.empty((0, stream.n_channels), dtype=np.float32)
+        self.exhausted = False
+        self.end = None  # time of the last sample, known once exhausted
+
+    def _fill(self, t_needed):
+        while not self.exhausted and (len(self._t) == 0 or self._t[-1] < t_needed):
+            try:
+                first_index, values = next(self._chunks)
+            except StopIteration:
+                self.exhausted = True
+                self.end = self._t[-1] if len(self._t) else self.stream.start
+                break
+            self._t = np.concatenate([self._t, self.stream.times(first_index, len(values))])
+            self._v = np.concatenate([self._v, values])
+
+    def _drop_before(self, t):
+        keep = np.searchsorted(self._t, t, side='left')
+        # Keep one earlier sample so interpolation at the next block's left edge still works
+        keep = max(keep - 1, 0)
+        self._t = self._t[keep:]
+        self._v = self._v[keep:]
+
+    def resample(self, grid):
+        """Values of this stream at the grid times, shape (len(grid), n_channels); NaN where not covered"""
+        width = 1.0 / self.target_rate
+        self._fill(grid[-1] + width)
+        out = np.full((len(grid), self.stream.n_channels), np.nan, dtype=np.float32)
+
+        if len(self._t):
+            if self.mode == 'mean':
+                # Bin i covers [grid[i], grid[i] + width)
+                bins = np.floor((self._t - grid[0]) / width).astype(np.int64)
+                inside = (bins >= 0) & (bins < len(grid))
+                counts = np.bincount(bins[inside], minlength=len(grid))
+                have = counts > 0
+                for c in range(self.stream.n_channels):
+                    sums = np.bincount(bins[inside], weights=self._v[inside, c], minlength=len(grid))
+                    out[have, c] = sums[have] / counts[have]
+            else:
+                covered = (grid >= self._t[0]) & (grid <= self._t[-1])
+                for c in range(self.stream.n_channels):
+                    out[covered, c] = np.interp(grid[covered], self._t, self._v[:, c])
+
+        self._drop_before(grid[-1] + width)
+        return out
+
+
+def merge_streams(paths, target_rate=4.0, block_seconds=600, how='outer', chunk_rows=65536, cache=None):
+    """Yield merged DataFrame blocks with a 'timestamp' column plus every stream's channels
+
+    paths maps stream name ('EDA', 'TEMP', 'HR', 'ACC', ...) to its CSV path.
+    how='inner' restricts the clock to the span every stream covers, 'outer' to
+    the span any stream covers (missing values are NaN). With a RecordingCache
+    the streams are read from their cached binary copies.
+    """
+    streams = {name: open_stream(path, name, cache) for name, path in paths.items()}
+    spans = {name: (s, e) for name, (s, e, _) in stream_spans(paths, cache).items()}
+
+    if how == 'inner':
+        start = max(s for s, _ in spans.values())
+        end = min(e for _, e in spans.values())
+    else:
+        start = min(s for s, _ in spans.values())
+        end = max(e for _, e in spans.values())
+    if end < start:
+        return
+
+    # Align the clock to whole target periods so blocks from different runs line up
+    start = np.ceil(start * target_rate) / target_rate
+    resamplers = {name: StreamResampler(stream, target_rate, chunk_rows) for name, stream in streams.items()}
+    n_total = int(np.floor((end - start) * target_rate)) + 1
+    block = max(int(block_seconds * target_rate), 1)
+
+    for first in range(0, n_total, block):
+        grid = start + np.arange(first, min(first + block, n_total)) / target_rate
+        columns = {'timestamp': grid}
+        for name, resampler in resamplers.items():
+            values = resampler.resample(grid)
+            for c, channel in enumerate(resampler.stream.channels):
+                columns[channel] = values[:, c]
+        yield pd.DataFrame(columns)
+
+
+def stream_spans(paths, cache=None):
+    """(start, end, rate) per stream, for reporting coverage"""
+    spans = {}
+    for name, path in paths.items():
+        stream = open_stream(path, name, cache)
+        if cache is not None:
+            n_samples = len(stream.read())
+        else:
+            with open(path, 'rb') as f:
+                n_samples = sum(1 for _ in f) - 2
+        spans[name] = (stream.start, stream.start + max(n_samples - 1, 0) / stream.rate, stream.rate)
+    return spans
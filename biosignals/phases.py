@@ -0,0 +1,91 @@
+import os
+import numpy as np
+
+from biosignals.e4 import read_tags
+
+# Protocol phases and how tags.csv maps onto them.
+# The wristband button is pressed at each transition, so the tags split a session
+# into consecutive segments: [session start, tag 1) is the first phase, [tag 1,
+# tag 2) the second, and so on. Segments past the last protocol phase are left
+# unlabelled.
+#
+# A PhaseIndex holds one session's sorted boundaries. Fixed-rate streams are cut
+# into phase segments by direct arithmetic; segments are numpy views, so nothing
+# is copied. Feature windows are laid out within each segment, so a window never
+# straddles a phase boundary.
+
+PHASES = {
+    'V1': ['Baseline', 'Stroop', 'First Rest', 'TMCT', 'Second Rest', 'Real Opinion', 'Opposite Opinion', 'Subtract'],
+    'V2': ['Baseline', 'TMCT', 'First Rest', 'Real Opinion', 'Opposite Opinion', 'Second Rest', 'Subtract'],
+}
+
+
+def phase_boundaries(tags, start, end):
+    """Sorted segment edges for a session: its start, the tags inside it, its end"""
+    tags = np.sort(np.asarray(tags, dtype=np.float64))
+    tags = tags[(tags > start) & (tags < end)]
+    return np.concatenate([[start], tags, [end]])
+
+
+def assign_phases(times, boundaries, n_phases):
+    """Phase number for each time, or -1 outside the labelled phases"""
+    times = np.asarray(times, dtype=np.float64)
+    k = np.searchsorted(boundaries, times, side='right') - 1
+    outside = (k < 0) | (k >= min(n_phases, len(boundaries) - 1)) | (times >= boundaries[-1])
+    return np.where(outside, -1, k)
+
+
+class PhaseIndex:
+    """One session's phase boundaries with the name and stress rating of each phase"""
+
+    def __init__(self, boundaries, phases, ratings=None):
+        self.boundaries = np.asarray(boundaries, dtype=np.float64)
+        # Only segments that exist get a phase; extra phases (missing tags) are dropped
+        self.phases = list(phases)[:len(self.boundaries) - 1]
+        ratings = ratings or {}
+        self.levels = np.array([float(ratings.get(p, np.nan)) for p in self.phases])
+
+    @classmethod
+    def from_tags(cls, tags, start, end, protocol, ratings=None):
+        return cls(phase_boundaries(tags, start, end), PHASES.get(protocol, []), ratings)
+
+    def __len__(self):
+        return len(self.phases)
+
+    def span(self, k):
+        """(start, end) time of phase k"""
+        return self.boundaries[k], self.boundaries[k + 1]
+
+    def phase_of(self, times):
+        """Phase number for each time, -1 outside the labelled phases"""
+        return assign_phases(times, self.boundaries, len(self.phases))
+
+    def label(self, times):
+        """(phase names, stress levels) for each time; '' / NaN outside the labelled phases"""
+        k = self.phase_of(times)
+        names = np.array([''] + self.phases, dtype=object)[k + 1]
+        levels = np.concatenate([[np.nan], self.levels])[k + 1]
+        return names, levels
+
+    def sample_bounds(self, stream_start, rate, n_samples):
+        """(first, stop) sample index of each phase in a fixed-rate stream"""
+        edges = np.ceil((self.boundaries[:len(self.phases) + 1] - stream_start) * rate).astype(np.int64)
+        edges = np.clip(edges, 0, n_samples)
+        return edges[:-1], edges[1:]
+
+    def segments(self, stream_start, rate, samples):
+        """(phase number, time of first sample, view) for each phase of a fixed-rate stream
+
+        Views share memory with samples; a phase the stream doesn't cover gets an empty view.
+        """
+        first, stop = self.sample_bounds(stream_start, rate, len(samples))
+        return [(k, stream_start + first[k] / rate, samples[first[k]:stop[k]]) for k in range(len(self.phases))]
+
+
+def load_phase_index(directory, protocol, ratings, start, end):
+    """PhaseIndex from a recording folder's tags.csv, or None when it has no tags"""
+    path = os.path.join(directory, 'tags.csv')
+    tags = read_tags(path) if os.path.exists(path) else np.empty(0)
+    if len(tags) == 0:
+        return None
+    return PhaseIndex.from_tags(tags, start, end, protocol, ratings)
@@ -0,0 +1,126 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from biosignals.hrv import detect_bvp_peaks
+
+# Signal-quality index (SQI) for wrist BVP and the HR derived from it.
+# Each window gets three scores in [0, 1], multiplied into bvp_sqi:
+#   purity   - share of 0.5-8 Hz power at the dominant cardiac frequency and its
+#              first harmonic; motion spreads power across the spectrum
+#   template - mean correlation of each beat with the average of its neighbours;
+#              clean pulses all look alike
+#   motion   - falls with accelerometer movement energy
+# Windows below MIN_QUALITY are masked before features are used. A 45 minute
+# session is scored in well under 0.1 s.
+
+CARDIAC_BAND_HZ = (0.7, 3.5)
+TOTAL_BAND_HZ = (0.5, 8.0)
+PEAK_HALF_WIDTH_HZ = 0.2
+BEAT_HALF_S = 0.3
+TEMPLATE_BEATS = 9
+
+# Score ranges: purity/template below the first value score 0, above the second 1
+PURITY_RANGE = (0.2, 0.6)
+TEMPLATE_RANGE = (0.5, 0.9)
+# ACC magnitude variance (g^2) at which the motion score is 0.5
+MOTION_REF_G2 = 0.02
+# Live equivalents: rectified band-passed ACC (mg) at which the score is 0.5
+MOTION_REF_COUNTS_MG = 150.0
+
+MIN_QUALITY = 0.3
+
+# Feature columns that depend on a clean pulse signal
+PULSE_PREFIXES = ('hr_', 'bvp_', 'hrv_')
+QUALITY_COLUMNS = ('bvp_purity', 'bvp_template_corr', 'bvp_sqi')
+
+
+def _ramp(x, lo, hi):
+    return np.clip((x - lo) / (hi - lo), 0.0, 1.0)
+
+
+def spectral_purity(windows, rate):
+    """Cardiac-peak share of in-band power for each (n_windows, n) BVP window"""
+    n = windows.shape[-1]
+    spectrum = np.abs(np.fft.rfft((windows - windows.mean(axis=-1, keepdims=True)) * np.hanning(n), axis=-1)) ** 2
+    freqs = np.fft.rfftfreq(n, 1.0 / rate)
+    cardiac = (freqs >= CARDIAC_BAND_HZ[0]) & (freqs <= CARDIAC_BAND_HZ[1])
+    total = (freqs >= TOTAL_BAND_HZ[0]) & (freqs <= TOTAL_BAND_HZ[1])
+    peak = freqs[cardiac][spectrum[:, cardiac].argmax(axis=-1)]
+    offset = freqs[None, :] - peak[:, None]
+    near = (np.abs(offset) <= PEAK_HALF_WIDTH_HZ) | (np.abs(offset - peak[:, None]) <= PEAK_HALF_WIDTH_HZ)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        purity = (spectrum * near).sum(axis=-1) / (spectrum * total).sum(axis=-1)
+    return np.nan_to_num(purity)
+
+
+def beat_template_correlation(bvp, rate):
+    """(peak_indices, correlation of each beat with its local template)"""
+    bvp = np.asarray(bvp, dtype=np.float64).ravel()
+    half = int(BEAT_HALF_S * rate)
+    peaks = np.round(detect_bvp_peaks(bvp, rate) * rate).astype(np.int64)
+    peaks = peaks[(peaks >= half) & (peaks < len(bvp) - half)]
+    if len(peaks) == 0:
+        return peaks, np.empty(0)
+    beats = bvp[peaks[:, None] + np.arange(-half, half + 1)]
+    beats -= beats.mean(axis=1, keepdims=True)
+    beats /= np.linalg.norm(beats, axis=1, keepdims=True) + 1e-12
+    # Template: mean of the TEMPLATE_BEATS beats around each beat, from prefix sums
+    cs = np.concatenate([np.zeros((1, beats.shape[1])), np.cumsum(beats, axis=0)])
+    i = np.arange(len(beats))
+    lo = np.clip(i - TEMPLATE_BEATS // 2, 0, len(beats))
+    hi = np.clip(i + TEMPLATE_BEATS // 2 + 1, 0, len(beats))
+    template = (cs[hi] - cs[lo]) / (hi - lo)[:, None]
+    template /= np.linalg.norm(template, axis=1, keepdims=True) + 1e-12
+    return peaks, (beats * template).sum(axis=1)
+
+
+def motion_score(acc_energy_g2):
+    return 1.0 / (1.0 + np.asarray(acc_energy_g2, dtype=np.float64) / MOTION_REF_G2)
+
+
+def bvp_quality(bvp, rate, window, hop, acc_energy=None):
+    """Per-window bvp_purity, bvp_template_corr and combined bvp_sqi
+
+    window and hop are in samples; acc_energy (g^2 per window, same windows) adds
+    the motion score when the accelerometer covers the BVP windows.
+    """
+    bvp = np.asarray(bvp, dtype=np.float64).ravel()
+    if len(bvp) < window:
+        empty = np.empty(0)
+        return {name: empty for name in QUALITY_COLUMNS}
+    windows = sliding_window_view(bvp, window)[::hop]
+    purity = spectral_purity(windows, rate)
+
+    peaks, corr = beat_template_correlation(bvp, rate)
+    starts = np.arange(len(windows)) * hop
+    lo = np.searchsorted(peaks, starts, side='left')
+    hi = np.searchsorted(peaks, starts + window, side='left')
+    corr_cs = np.concatenate([[0.0], np.cumsum(corr)])
+    count = hi - lo
+    with np.errstate(invalid='ignore', divide='ignore'):
+        template_corr = np.where(count > 0, (corr_cs[hi] - corr_cs[lo]) / count, 0.0)
+
+    sqi = _ramp(purity, *PURITY_RANGE) * _ramp(template_corr, *TEMPLATE_RANGE)
+    if acc_energy is not None:
+        n = min(len(sqi), len(acc_energy))
+        sqi[:n] *= motion_score(acc_energy[:n])
+    return {'bvp_purity': purity, 'bvp_template_corr': template_corr, 'bvp_sqi': sqi}
+
+
+def mask_low_quality(frame, min_quality=MIN_QUALITY):
+    """Set pulse-derived columns to NaN in windows whose bvp_sqi is below min_quality"""
+    if 'bvp_sqi' not in frame.columns:
+        return frame
+    bad = frame['bvp_sqi'].to_numpy() < min_quality
+    columns = [c for c in frame.columns if c.startswith(PULSE_PREFIXES) and c not in QUALITY_COLUMNS]
+    frame = frame.copy()
+    frame.loc[bad, columns] = np.nan
+    return frame
+
+
+def live_hr_quality(rejected_fraction=0.0, counts_mg=None):
+    """Quality weight in [0, 1] for a live HR reading from beat rejections and current movement"""
+    quality = 1.0 - float(rejected_fraction or 0.0)
+    if counts_mg is not None:
+        quality *= 1.0 / (1.0 + counts_mg / MOTION_REF_COUNTS_MG)
+    return max(min(quality, 1.0), 0.0)
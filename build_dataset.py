@@ -0,0 +1,40 @@
+import os
+import sys
+import time
+import argparse
+
+from biosignals.cache import DEFAULT_ROOT
+from biosignals.dataset import build_dataset, read_dataset
+
+# Path where subject-info.csv and the Stress_Level files are
+data_path = 'data/'
+
+parser = argparse.ArgumentParser(description="Build the windowed multi-subject dataset from every subject's E4 recordings")
+parser.add_argument('--data', default=data_path, help="Folder with subject-info.csv and Stress_Level_v1/v2.csv")
+parser.add_argument('--recordings', default=data_path, help="Folder holding one sub-folder of E4 CSVs per subject")
+parser.add_argument('--output', default='dataset')
+parser.add_argument('--subjects', nargs='*', default=None, help="Only these subject ids")
+parser.add_argument('--window', type=float, default=60.0, help="Window length in seconds")
+parser.add_argument('--hop', type=float, default=10.0, help="Seconds between window starts")
+parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per core)")
+parser.add_argument('--cache-dir', default=DEFAULT_ROOT, help="Parsed-recording cache; empty string disables it")
+parser.add_argument('--verbose', action='store_true', help="Print tracebacks for failed subjects")
+args = parser.parse_args()
+
+started = time.perf_counter()
+successes, failures = build_dataset(args.data, args.recordings, args.output, window_s=args.window, hop_s=args.hop,
+                                    cache_dir=args.cache_dir, workers=args.workers, subjects=args.subjects)
+elapsed = time.perf_counter() - started
+
+for result in successes:
+    print(f"✅ {result['subject']}: {result['rows']} windows ({result['labelled']} with a phase label)")
+for result in failures:
+    print(f"❌ {result['subject']}: {result['error']}")
+    if args.verbose and 'traceback' in result:
+        print(result['traceback'])
+
+rows = sum(r['rows'] for r in successes)
+print(f"Built {len(successes)} subjects, {rows} windows in {elapsed:.1f} s; {len(failures)} failed")
+if not successes:
+    sys.exit(1)
+print(f"✅ Dataset saved under '{args.output}' (load it with biosignals.dataset.read_dataset)")
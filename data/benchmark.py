@@ -0,0 +1,276 @@
+import os
+import sys
+import time
+import pickle
+import argparse
+import pandas as pd
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import LeaveOneGroupOut, KFold
+from sklearn.metrics import accuracy_score, mean_squared_error
+
+# Headless benchmark for every model family in data/*.py.
+# Loads the dataset once, runs leave-one-subject-out CV across a process pool and
+# writes accuracy / train time / inference latency / model size to a CSV that
+# compare.py plots.
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATASET = os.path.join(script_dir, "merged_dataset.csv")
+DEFAULT_RESULTS = os.path.join(script_dir, "benchmark_results.csv")
+
+SENSOR_COLS = ['EDA', 'Temp', 'HR', 'Acc_X', 'Acc_Y', 'Acc_Z']
+ANN_COLS = ['Temp', 'HR', 'Acc_X', 'Acc_Y', 'Acc_Z']  # ann.py drops EDA
+
+# Number of single-row predictions timed per fold for the latency figure
+LATENCY_SAMPLES = 50
+
+
+def label_status_binary(level):
+    return 0 if level <= 3 else 1
+
+
+def load_dataset(csv_path=DEFAULT_DATASET):
+    """Load the merged dataset once and return features, labels and subject groups"""
+    df = pd.read_csv(csv_path)
+    if 'subject' in df.columns:
+        df['subject'] = df['subject'].astype(str)
+    numeric_cols = SENSOR_COLS + ['stress_level']
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
+    df.dropna(subset=numeric_cols, inplace=True)
+
+    X = df[SENSOR_COLS].to_numpy(dtype=np.float64)
+    stress = df['stress_level'].to_numpy(dtype=np.float64)
+    y = np.array([label_status_binary(s) for s in stress], dtype=np.int64)
+    groups = df['subject'].to_numpy() if 'subject' in df.columns else None
+    return X, y, stress, groups
+
+
+def build_ann(n_features):
+    # Same architecture as ann.py; tensorflow is only imported in workers that need it
+    import tensorflow as tf
+    model = tf.keras.Sequential([
+        tf.keras.layers.Dense(32, activation='relu', input_shape=(n_features,)),
+        tf.keras.layers.Dense(16, activation='relu'),
+        tf.keras.layers.Dense(1, activation='sigmoid')
+    ])
+    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    return model
+
+
+def build_model(name):
+    """Return (estimator, task) for a model family; task is 'classification' or 'regression'"""
+    from sklearn.svm import SVC
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.linear_model import LinearRegression, LogisticRegression
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+    if name == 'svm':
+        return make_pipeline(StandardScaler(), SVC(kernel='rbf', probability=True, random_state=42)), 'classification'
+    if name == 'naive_bayes':
+        return make_pipeline(StandardScaler(), GaussianNB()), 'classification'
+    if name == 'logistic_regression':
+        return make_pipeline(StandardScaler(), LogisticRegression(max_iter=1000, random_state=42)), 'classification'
+    if name == 'random_forest_classifier':
+        return make_pipeline(StandardScaler(), RandomForestClassifier(n_estimators=100, random_state=42)), 'classification'
+    if name == 'linear_regression':
+        return make_pipeline(StandardScaler(), LinearRegression()), 'regression'
+    if name == 'random_forest':
+        return make_pipeline(StandardScaler(), RandomForestRegressor(n_estimators=100, random_state=42)), 'regression'
+    raise ValueError(f"Unknown model family: {name}")
+
+
+# Model family -> the script it mirrors
+MODEL_FAMILIES = {
+    'ann': 'ann.py',
+    'svm': 'svm.py',
+    'logistic_regression': 'regression.py',
+    'naive_bayes': 'naivebayes.py',
+    'random_forest_classifier': 'randomforestclassifier.py',
+    'linear_regression': 'linear.py',
+    'random_forest': 'randomforest.py',
+}
+
+
+def make_folds(y, groups, n_splits=5):
+    """Leave-one-subject-out folds, or plain K-fold when the dataset has no subject column"""
+    if groups is not None and len(np.unique(groups)) > 1:
+        splitter = LeaveOneGroupOut()
+        return [(train, test, str(groups[test][0])) for train, test in splitter.split(y, y, groups)]
+    print("⚠️ No 'subject' column found - falling back to K-fold CV")
+    splitter = KFold(n_splits=min(n_splits, len(y)), shuffle=True, random_state=42)
+    return [(train, test, f"fold{i}") for i, (train, test) in enumerate(splitter.split(y))]
+
+
+# Dataset shared with pool workers through the initializer, so it is only pickled once per worker
+_DATA = {}
+
+
+def _init_worker(X, y, stress):
+    _DATA['X'] = X
+    _DATA['y'] = y
+    _DATA['stress'] = stress
+
+
+def _time_single_row(predict, X_test):
+    rows = X_test[:LATENCY_SAMPLES]
+    timings = []
+    for i in range(len(rows)):
+        start = time.perf_counter()
+        predict(rows[i:i + 1])
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000 if timings else float('nan')
+
+
+def run_fold(task):
+    """Train and evaluate one model family on one fold; runs inside a pool worker"""
+    name, train_idx, test_idx, fold_id = task
+    X, y, stress = _DATA['X'], _DATA['y'], _DATA['stress']
+
+    try:
+        if name == 'ann':
+            cols = [SENSOR_COLS.index(c) for c in ANN_COLS]
+            X_train, X_test = X[train_idx][:, cols], X[test_idx][:, cols]
+            scaler = StandardScaler().fit(X_train)
+            model = build_ann(X_train.shape[1])
+            start = time.perf_counter()
+            model.fit(scaler.transform(X_train), y[train_idx], epochs=50, verbose=0)
+            train_time = time.perf_counter() - start
+
+            def predict(rows):
+                return (model(scaler.transform(rows), training=False).numpy().ravel() >= 0.5).astype(int)
+
+            y_pred = predict(X_test)
+            model_size = model.count_params() * 4 + len(pickle.dumps(scaler))
+        else:
+            model, task_type = build_model(name)
+            X_train, X_test = X[train_idx], X[test_idx]
+            target = stress if task_type == 'regression' else y
+            start = time.perf_counter()
+            model.fit(X_train, target[train_idx])
+            train_time = time.perf_counter() - start
+
+            if task_type == 'regression':
+                def predict(rows):
+                    return np.array([label_status_binary(v) for v in model.predict(rows)])
+            else:
+                predict = model.predict
+
+            y_pred = predict(X_test)
+            model_size = len(pickle.dumps(model))
+
+        return {
+            'model': name,
+            'fold': fold_id,
+            'n_test': len(test_idx),
+            'accuracy': accuracy_score(y[test_idx], y_pred),
+            'mse': mean_squared_error(y[test_idx], y_pred),
+            'train_time_s': train_time,
+            'latency_ms': _time_single_row(predict, X_test),
+            'model_size_kb': model_size / 1024,
+            'error': ''
+        }
+    except Exception as e:
+        return {'model': name, 'fold': fold_id, 'n_test': len(test_idx), 'error': str(e)}
+
+
+def summarize(fold_results):
+    """Aggregate per-fold rows into one row per model family"""
+    df = pd.DataFrame(fold_results)
+    ok = df[df['error'] == ''] if 'error' in df.columns else df
+    if ok.empty:
+        return pd.DataFrame(columns=['model', 'script', 'accuracy', 'accuracy_std', 'mse', 'train_time_s',
+                                     'latency_ms', 'model_size_kb', 'folds'])
+
+    # Weight accuracy by fold size so small subjects don't dominate
+    summary = ok.groupby('model').apply(lambda g: pd.Series({
+        'accuracy': np.average(g['accuracy'], weights=g['n_test']),
+        'accuracy_std': g['accuracy'].std(ddof=0),
+        'mse': np.average(g['mse'], weights=g['n_test']),
+        'train_time_s': g['train_time_s'].mean(),
+        'latency_ms': g['latency_ms'].median(),
+        'model_size_kb': g['model_size_kb'].mean(),
+        'folds': len(g)
+    })).reset_index()
+    summary['folds'] = summary['folds'].astype(int)
+    summary.insert(1, 'script', summary['model'].map(MODEL_FAMILIES))
+    return summary.sort_values(['accuracy', 'latency_ms'], ascending=[False, True]).reset_index(drop=True)
+
+
+def mark_pareto(summary):
+    """Flag models that no other model beats on both accuracy and latency"""
+    pareto = []
+    for _, row in summary.iterrows():
+        dominated = ((summary['accuracy'] >= row['accuracy']) &
+                     (summary['latency_ms'] <= row['latency_ms']) &
+                     ((summary['accuracy'] > row['accuracy']) |
+                      (summary['latency_ms'] < row['latency_ms']))).any()
+        pareto.append(not dominated)
+    summary = summary.copy()
+    summary['pareto'] = pareto
+    return summary
+
+
+def select_model(summary, max_latency_ms=None, min_accuracy=0.0):
+    """Pick the most accurate model within the latency budget (ties go to the faster one)"""
+    candidates = summary[summary['accuracy'] >= min_accuracy]
+    if max_latency_ms is not None:
+        candidates = candidates[candidates['latency_ms'] <= max_latency_ms]
+    if candidates.empty:
+        return None
+    best = candidates.sort_values(['accuracy', 'latency_ms'], ascending=[False, True]).iloc[0]
+    return best['model']
+
+
+def run_benchmark(csv_path=DEFAULT_DATASET, models=None, workers=None):
+    """Run every requested model family over every CV fold in a process pool"""
+    models = models or list(MODEL_FAMILIES)
+    X, y, stress, groups = load_dataset(csv_path)
+    print(f"📂 Loaded {len(y)} rows from {csv_path}")
+    folds = make_folds(y, groups)
+    tasks = [(name, train, test, fold_id) for name in models for train, test, fold_id in folds]
+    print(f"🧪 Running {len(models)} model families x {len(folds)} folds = {len(tasks)} jobs")
+    sys.stdout.flush()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y, stress)) as pool:
+        fold_results = list(pool.map(run_fold, tasks))
+
+    for r in fold_results:
+        if r.get('error'):
+            print(f"❌ {r['model']} failed on {r['fold']}: {r['error']}")
+    return mark_pareto(summarize(fold_results)), fold_results
+
+
+def load_results(results_path=DEFAULT_RESULTS):
+    """Read a results file written by run_benchmark (used by compare.py)"""
+    return pd.read_csv(results_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark all hydration model families")
+    parser.add_argument('--dataset', default=DEFAULT_DATASET)
+    parser.add_argument('--output', default=DEFAULT_RESULTS)
+    parser.add_argument('--models', nargs='*', choices=list(MODEL_FAMILIES), default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-latency-ms', type=float, default=None,
+                        help="Latency budget for model selection")
+    args = parser.parse_args()
+
+    summary, fold_results = run_benchmark(args.dataset, args.models, args.workers)
+    summary.to_csv(args.output, index=False)
+    pd.DataFrame(fold_results).to_csv(os.path.splitext(args.output)[0] + "_folds.csv", index=False)
+
+    print("\n📊 Benchmark Results:")
+    print(summary.to_string(index=False))
+    print(f"\n💾 Saved: {args.output}")
+
+    best = select_model(summary, args.max_latency_ms)
+    if best is None:
+        print("\n❌ No model meets the latency budget")
+    else:
+        print(f"\n🧠 Selected model: {best}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,66 @@
+import os
+import argparse
+import matplotlib
+matplotlib.use('Agg')  # Headless - the figure is saved, not shown
 import matplotlib.pyplot as plt
 import numpy as np
 
+from benchmark import DEFAULT_RESULTS, load_results, select_model
+
 # ======================
-# 🔢 Model Results (fill in based on your outputs)
+# 🔢 Model Results (written by benchmark.py)
 # ======================
 
-models = [
-    "Logistic Regression",
-    "Random Forest Classifier",
-    "Naive Bayes",
-    "SVM",
-    "ANN (MLP)",
-]
+parser = argparse.ArgumentParser(description="Plot benchmark.py results")
+parser.add_argument('--results', default=DEFAULT_RESULTS)
+parser.add_argument('--max-latency-ms', type=float, default=None)
+args = parser.parse_args()
+
+if not os.path.exists(args.results):
+    raise SystemExit(f"❌ {args.results} not found - run benchmark.py first")
 
-accuracy = [1.00, 1.00, 1.00, 0.50, 1.00]
-mse =      [0.00, 0.00, 0.00, 0.50, 0.00]
-r2 =       [1.00, 1.00, 1.00, -1.00, 1.00]
+results = load_results(args.results)
+
+models = results['model'].tolist()
+accuracy = results['accuracy'].to_numpy()
+latency = results['latency_ms'].to_numpy()
+size_kb = results['model_size_kb'].to_numpy()
 
 x = np.arange(len(models))  # X-axis positions
-width = 0.25  # Bar width
+width = 0.35  # Bar width
 
 # ======================
 # 📊 Plotting
 # ======================
 
-plt.figure(figsize=(12, 6))
-plt.bar(x - width, accuracy, width, label='Accuracy', color='mediumseagreen')
-plt.bar(x, mse, width, label='MSE', color='tomato')
-plt.bar(x + width, r2, width, label='R² Score', color='dodgerblue')
-
-plt.xlabel('Model')
-plt.ylabel('Metric Value')
-plt.title('🧠 Hydration Model Comparison')
-plt.xticks(ticks=x, labels=models, rotation=20)
-plt.legend()
-plt.grid(True, axis='y', linestyle='--', alpha=0.6)
+fig, (ax_acc, ax_tradeoff) = plt.subplots(1, 2, figsize=(14, 6))
+
+ax_acc.bar(x - width / 2, accuracy, width, label='Accuracy', color='mediumseagreen')
+ax_lat = ax_acc.twinx()
+ax_lat.bar(x + width / 2, latency, width, label='Latency (ms)', color='tomato')
+ax_acc.set_xlabel('Model')
+ax_acc.set_ylabel('Accuracy')
+ax_lat.set_ylabel('Single-row latency (ms)')
+ax_acc.set_title('Hydration Model Comparison')
+ax_acc.set_xticks(x)
+ax_acc.set_xticklabels(models, rotation=20)
+ax_acc.grid(True, axis='y', linestyle='--', alpha=0.6)
+fig.legend(loc='upper right')
+
+# Accuracy vs latency, marker size ~ model size
+ax_tradeoff.scatter(latency, accuracy, s=np.clip(size_kb, 20, 2000), alpha=0.6, color='dodgerblue')
+for name, lat, acc in zip(models, latency, accuracy):
+    ax_tradeoff.annotate(name, (lat, acc), fontsize=8)
+ax_tradeoff.set_xscale('log')
+ax_tradeoff.set_xlabel('Single-row latency (ms, log)')
+ax_tradeoff.set_ylabel('Accuracy')
+ax_tradeoff.set_title('Accuracy vs Latency (size = model KB)')
+ax_tradeoff.grid(True, linestyle='--', alpha=0.6)
+
 plt.tight_layout()
-plt.show()
+out_path = os.path.join(os.path.dirname(os.path.abspath(args.results)), "model_comparison.png")
+plt.savefig(out_path)
+print(f"💾 Saved: {out_path}")
+
+best = select_model(results, args.max_latency_ms)
+print(f"🧠 Selected model: {best}" if best else "❌ No model meets the latency budget")
@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+
+from biosignals.cache import DEFAULT_ROOT, default_cache
+from biosignals.dataset import load_subjects
+from biosignals.features import extract_recording_features
+from biosignals.hrv import recording_hrv
+from biosignals.quality import MIN_QUALITY, mask_low_quality
+from biosignals.merge import stream_spans
+from biosignals.phases import load_phase_index
+
+# Path where your CSVs are
+data_path = 'data/'
+
+parser = argparse.ArgumentParser(description="Windowed physiological features from E4 sensor CSVs")
+parser.add_argument('--data', default=data_path)
+parser.add_argument('--output', default='windowed_features.csv')
+parser.add_argument('--subject', default='S01', help="Subject id (subject-info.csv / Stress_Level_v1/v2.csv) the recording belongs to")
+parser.add_argument('--streams', default='HR,TEMP,EDA,BVP',
+                    help="Comma-separated streams; windows must be covered by all of them (ACC, BVP, EDA, HR, TEMP)")
+parser.add_argument('--window', type=float, default=60.0, help="Window length in seconds")
+parser.add_argument('--hop', type=float, default=10.0, help="Seconds between window starts")
+parser.add_argument('--min-quality', type=float, default=MIN_QUALITY,
+                    help="Blank HR/BVP/HRV features in windows whose BVP quality index is below this (0 keeps all)")
+parser.add_argument('--no-hrv', action='store_true', help="Skip HRV features from IBI.csv (gaps filled from BVP.csv)")
+parser.add_argument('--cache-dir', default=DEFAULT_ROOT, help="Parsed-recording cache; empty string disables it")
+args = parser.parse_args()
+cache = default_cache(args.cache_dir)
+
+paths = {name: os.path.join(args.data, f'{name}.csv') for name in args.streams.split(',')}
+
+# Protocol phases from tags.csv; windows are laid out within each phase so none straddles a boundary
+subject = {row['subject']: row for row in load_subjects(args.data)}.get(args.subject)
+spans = stream_spans(paths, cache)
+phase_index = load_phase_index(args.data, subject['protocol'], subject['ratings'],
+                               min(s for s, _, _ in spans.values()),
+                               max(e for _, e, _ in spans.values())) if subject else None
+
+started = time.perf_counter()
+features = extract_recording_features(paths, window_s=args.window, hop_s=args.hop, cache=cache,
+                                      phase_index=phase_index)
+
+if features.empty:
+    print("❌ No window is covered by every stream - check the spans below or drop a stream with --streams")
+    for name, (start, end, rate) in spans.items():
+        print(f"  {name}: {rate:g} Hz, {end - start:.0f} s from epoch {start:.0f}")
+    sys.exit(1)
+
+# Heart-rate variability on the same windows
+ibi_path = os.path.join(args.data, 'IBI.csv')
+if not args.no_hrv and os.path.exists(ibi_path):
+    bvp_path = os.path.join(args.data, 'BVP.csv')
+    hrv = recording_hrv(ibi_path, features['window_start'].to_numpy(), args.window,
+                        bvp_path=bvp_path if os.path.exists(bvp_path) else None, cache=cache)
+    features = pd.concat([features, hrv], axis=1)
+features = mask_low_quality(features, args.min_quality)
+elapsed = time.perf_counter() - started
+
+# Label each window with the protocol phase it lies in
+if phase_index is not None:
+    features['phase'], features['stress_level'] = phase_index.label(features['window_start'].to_numpy())
+else:
+    print(f"⚠️ No phase labels (unknown subject {args.subject} or no tags.csv)")
+    features['phase'], features['stress_level'] = '', float('nan')
+
+if 'bvp_sqi' in features.columns:
+    masked = int((features['bvp_sqi'] < args.min_quality).sum())
+    print(f"Masked {masked} of {len(features)} windows with BVP quality below {args.min_quality:g}")
+recorded = features['window_start'].iloc[-1] - features['window_start'].iloc[0] + args.window
+features.to_csv(args.output, index=False)
+print(f"Windows: {len(features)} x {features.shape[1] - 3} features "
+      f"({recorded:.0f} s of signal in {elapsed:.2f} s)")
+print(f"✅ Features saved as '{args.output}'")
@@ -1,48 +1,77 @@
-import pandas as pd
 import os
+import sys
+import argparse
+from datetime import datetime, timezone
+
+from biosignals.cache import DEFAULT_ROOT, default_cache
+from biosignals.dataset import load_subjects
+from biosignals.merge import merge_streams, stream_spans
+from biosignals.phases import load_phase_index
 
 # Path where your CSVs are
 data_path = 'data/'  # Change this if your folder is named differently
 
-# Load sensor data
-eda = pd.read_csv(os.path.join(data_path, 'EDA.csv'), header=None)
-temp = pd.read_csv(os.path.join(data_path, 'TEMP.csv'), header=None)
-hr = pd.read_csv(os.path.join(data_path, 'HR.csv'), header=None)
-acc = pd.read_csv(os.path.join(data_path, 'ACC.csv'), header=None)
-
-# Load labels and subject info
-stress_v1 = pd.read_csv(os.path.join(data_path, 'Stress_level_v1.csv'))
-subject_info = pd.read_csv(os.path.join(data_path, 'subject-info.csv'))
-
-# OPTIONAL: Give column names (if missing)
-eda.columns = ['EDA']
-temp.columns = ['Temp']
-hr.columns = ['HR']
-acc.columns = ['Acc_X', 'Acc_Y', 'Acc_Z']
-
-# Reset indexes just to be sure
-eda.reset_index(drop=True, inplace=True)
-temp.reset_index(drop=True, inplace=True)
-hr.reset_index(drop=True, inplace=True)
-acc.reset_index(drop=True, inplace=True)
-
-# Combine features horizontally
-merged = pd.concat([eda, temp, hr, acc], axis=1)
+parser = argparse.ArgumentParser(description="Merge E4 sensor CSVs onto a common clock")
+parser.add_argument('--data', default=data_path)
+parser.add_argument('--output', default='merged_dataset.csv')
+parser.add_argument('--subject', default='S01', help="Subject id (subject-info.csv / Stress_Level_v1/v2.csv) the recording belongs to")
+parser.add_argument('--rate', type=float, default=4.0, help="Common clock rate in Hz")
+parser.add_argument('--how', choices=['inner', 'outer'], default='inner',
+                    help="inner: only times every stream covers; outer: any stream (gaps are NaN)")
+parser.add_argument('--timestamps', action='store_true',
+                    help="Write a leading timestamp column (the training scripts expect the 7-column layout without it)")
+parser.add_argument('--keep-missing', action='store_true',
+                    help="Keep rows where a stream has no value (dropped by default, as the training scripts expect)")
+parser.add_argument('--block-seconds', type=int, default=600, help="Seconds of output processed per block")
+parser.add_argument('--cache-dir', default=DEFAULT_ROOT, help="Parsed-recording cache; empty string disables it")
+args = parser.parse_args()
+cache = default_cache(args.cache_dir)
 
-# Check length match
-print("Merged shape:", merged.shape)
-print("Stress labels shape:", stress_v1.shape)
+# Sensor streams; row 0 of each file is the start time, row 1 the sample rate
+paths = {
+    'EDA': os.path.join(args.data, 'EDA.csv'),
+    'TEMP': os.path.join(args.data, 'TEMP.csv'),
+    'HR': os.path.join(args.data, 'HR.csv'),
+    'ACC': os.path.join(args.data, 'ACC.csv'),
+}
 
-# If stress_v1 has one label per sample:
-# (or you might need to adjust this depending how many labels vs samples you have)
+def fmt(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
 
-merged['stress_level'] = stress_v1['Stroop'] # diff column name (had some issue)
+spans = stream_spans(paths, cache)
+for name, (start, end, rate) in spans.items():
+    print(f"{name}: {rate:g} Hz, {fmt(start)} -> {fmt(end)}")
 
+# Labels: each row gets the self-reported stress level of the protocol phase
+# (from the tags.csv boundaries) its timestamp falls in
+subjects = {row['subject']: row for row in load_subjects(args.data)}
+if args.subject not in subjects:
+    print(f"❌ Unknown subject {args.subject}")
+    sys.exit(1)
+subject = subjects[args.subject]
+phase_index = load_phase_index(args.data, subject['protocol'], subject['ratings'],
+                               min(s for s, _, _ in spans.values()), max(e for _, e, _ in spans.values()))
+if phase_index is None:
+    print("⚠️ No tags.csv phase markers - stress_level will be empty")
 
-# Drop any rows with missing values
-merged = merged.dropna()
+# Stream the merge block by block so long sessions stay in bounded memory
+rows = 0
+complete = 0
+if os.path.exists(args.output):
+    os.remove(args.output)
+for block in merge_streams(paths, target_rate=args.rate, block_seconds=args.block_seconds, how=args.how, cache=cache):
+    block['stress_level'] = phase_index.label(block['timestamp'].to_numpy())[1] if phase_index else float('nan')
+    if not args.timestamps:
+        block = block.drop(columns='timestamp')
+    complete += int(block.notna().all(axis=1).sum())
+    if not args.keep_missing:
+        block = block.dropna()
+    block.to_csv(args.output, mode='a', header=(rows == 0), index=False)
+    rows += len(block)
 
-# Save merged dataset
-merged.to_csv('merged_dataset.csv', index=False)
+print("Merged rows:", rows, f"({complete} with every stream present)")
+if rows == 0:
+    print("❌ No rows with every stream present - try --how outer --keep-missing")
+    sys.exit(1)
 
-print("✅ Merged dataset saved as 'merged_dataset.csv'")
+print(f"✅ Merged dataset saved as '{args.output}'")
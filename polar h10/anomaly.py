@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import deque
+
+# Streaming per-user anomaly detection on live vitals.
+# For each vital a user keeps a robust centre and spread per time-of-day block
+# (plus one for the whole day, used until a block has seen enough readings).
+# Both are exponentially weighted quantile trackers: the median moves a fixed
+# fraction of the current spread toward each reading, and the MAD does the same
+# on the absolute deviations. An update is O(1) and a single outlier can only
+# move either estimate by one small step.
+#
+# A reading is anomalous when its robust z-score, (x - median) / (1.4826 * MAD),
+# exceeds Z_THRESHOLD. Consecutive anomalous readings of one vital form an
+# episode; only the first reading of an episode is reported as new.
+
+# vital -> (spread floor, unit, concerning direction: +1 high, -1 low)
+VITALS = {
+    'HR': (2.0, 'bpm', 1),
+    'Temp': (0.1, 'C', 1),
+    'Water Intake': (0.1, 'L', -1),
+    'RMSSD': (3.0, 'ms', -1),
+}
+# Readings at or below these are missing values (the app sends 0 when a sensor or
+# HealthKit has no data); they are neither scored nor learned
+MISSING_AT_OR_BELOW = {'HR': 0.0, 'Temp': 0.0, 'Water Intake': 0.0, 'RMSSD': 0.0}
+HOURS_PER_BLOCK = 4
+WARMUP = 10  # readings estimated with plain mean/mean-deviation before tracking quantiles
+MIN_READINGS = 20  # a block is used (and anomalies flagged) from this many readings on
+STEP = 0.05
+Z_THRESHOLD = 3.5
+MAD_TO_SIGMA = 1.4826
+RECENT_ANOMALIES = 20
+
+
+class RobustStats:
+    """Exponentially weighted median and MAD of one stream"""
+
+    __slots__ = ('n', 'median', 'mad')
+
+    def __init__(self):
+        self.n = 0
+        self.median = 0.0
+        self.mad = 0.0
+
+    def update(self, x, floor):
+        self.n += 1
+        if self.n <= WARMUP:
+            # Running mean and mean absolute deviation until the trackers have a scale
+            delta = x - self.median
+            self.median += delta / self.n
+            self.mad += (abs(x - self.median) - self.mad) / self.n
+            return
+        step = STEP * max(self.mad, floor)
+        self.median += step if x > self.median else -step if x < self.median else 0.0
+        deviation = abs(x - self.median)
+        self.mad += step if deviation > self.mad else -step if deviation < self.mad else 0.0
+        self.mad = max(self.mad, 0.0)
+
+    def z(self, x, floor):
+        return (x - self.median) / (MAD_TO_SIGMA * max(self.mad, floor))
+
+
+class UserAnomalyState:
+    """A user's robust statistics per vital and time-of-day block, with recent anomalies"""
+
+    def __init__(self):
+        blocks = 24 // HOURS_PER_BLOCK
+        self.stats = {v: [RobustStats() for _ in range(blocks + 1)] for v in VITALS}  # last entry: whole day
+        self.current = {}  # vital -> latest assessment
+        self.recent = deque(maxlen=RECENT_ANOMALIES)
+        self.in_episode = {v: False for v in VITALS}
+
+
+class AnomalyEngine:
+    """Per-user streaming anomaly detector"""
+
+    def __init__(self):
+        self._users = {}
+        self._lock = threading.Lock()
+
+    def _state(self, user_id):
+        state = self._users.get(user_id)
+        if state is None:
+            with self._lock:
+                state = self._users.setdefault(user_id, UserAnomalyState())
+        return state
+
+    def add(self, user_id, reading, t=None):
+        """Score and learn one reading (dict of vital -> value); returns the anomalies that start a new episode"""
+        t = time.time() if t is None else t
+        block = time.localtime(t).tm_hour // HOURS_PER_BLOCK
+        state = self._state(user_id)
+        new = []
+        with self._lock:
+            for vital, (floor, unit, concern) in VITALS.items():
+                value = reading.get(vital)
+                if value is None or value != value or value <= MISSING_AT_OR_BELOW[vital]:  # missing or NaN
+                    continue
+                value = float(value)
+                block_stats, day_stats = state.stats[vital][block], state.stats[vital][-1]
+                reference = block_stats if block_stats.n >= MIN_READINGS else day_stats
+                z = reference.z(value, floor) if reference.n >= MIN_READINGS else 0.0
+                anomalous = abs(z) > Z_THRESHOLD
+                assessment = {
+                    'vital': vital, 'value': value, 'unit': unit, 'expected': reference.median,
+                    'z': z, 'anomalous': anomalous, 'concerning': anomalous and z * concern > 0,
+                    'time_of_day': reference is block_stats, 'timestamp': t,
+                }
+                state.current[vital] = assessment
+                if anomalous and not state.in_episode[vital]:
+                    state.recent.append(assessment)
+                    new.append(assessment)
+                state.in_episode[vital] = anomalous
+                block_stats.update(value, floor)
+                day_stats.update(value, floor)
+        return new
+
+    def snapshot(self, user_id):
+        """(latest assessment per vital, recent anomalies newest first), or None for an unknown user"""
+        state = self._users.get(user_id)
+        if state is None:
+            return None
+        with self._lock:
+            return dict(state.current), list(reversed(state.recent))
+
+    def __len__(self):
+        return len(self._users)
+
@@ -10,22 +10,45 @@ import os
 import sqlite3
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from collections import deque
 import pickle
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 import numpy as np
-import requests
+import sys
 import json
 import threading
-from sklearn.svm import SVC
-from sklearn.ensemble import VotingClassifier
 from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+from training_data import load_training_matrix, count_training_rows
+from flat_forest import FlatForest, compile_model
+from scalable_ensemble import train_ensemble, compare_modes
+from user_calibration import CalibrationTable, init_calibration_table, GLOBAL_FEATURES
+from model_store import ModelStore, read_artifact, scaler_to_arrays, scaler_from_arrays
+from live_hrv import LiveHRVRegistry
+from vitals_ring import VitalsStore
+from live_trend import TrendRegistry, FORECAST_HORIZONS_MIN
+from baselines import QuantileBaselines, init_baseline_table
+from anomaly import AnomalyEngine, Z_THRESHOLD as ANOMALY_Z
+from cohort_stats import CohortSketches, init_sketch_table
+from weather_cache import WeatherCache
+from outbound import OutboundClient
+from response_cache import ResponseCache, cached_user_view, init_version_table, bump_version, read_version
+from collections import OrderedDict
+
+# Shared signal-processing package lives at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from biosignals.activity import ActivityRegistry, met_level
+from biosignals.quality import MIN_QUALITY, live_hr_quality
 
 load_dotenv()
 
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=30.0, max_retries=0)
+
+# Every call to an external service goes through one pooled client with a
+# concurrency limit, circuit breaker and metrics per dependency (GET /dependencies)
+outbound = OutboundClient()
+outbound.register('openweather', max_concurrency=4, timeout_s=5.0, failure_threshold=3, reset_timeout_s=60.0)
+outbound.register('openai', max_concurrency=16, timeout_s=30.0, failure_threshold=5, reset_timeout_s=30.0)
 
 app = Flask(__name__)
 CORS(app)
@@ -119,6 +142,53 @@ def init_db():
         )
     ''')
     
+    # Per-user time-range scans (training, baselines)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_user_metrics_user_time ON user_metrics (user_id, timestamp)')
+    
+    # Daily rollup of user_metrics per activity bucket, kept up to date on insert,
+    # so analytics read a few rows per day instead of every sample
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS user_activity_daily (
+            user_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            samples INTEGER NOT NULL,
+            steps_sum FLOAT NOT NULL,
+            water_sum FLOAT NOT NULL,
+            day_steps FLOAT NOT NULL,
+            day_water FLOAT NOT NULL,
+            hr_sum FLOAT NOT NULL,
+            high_risk INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day, bucket)
+        )
+    ''')
+    if c.execute('SELECT 1 FROM user_activity_daily LIMIT 1').fetchone() is None:
+        # Backfill from existing samples (first start after upgrading)
+        c.execute('''
+            INSERT INTO user_activity_daily
+            SELECT user_id, date(timestamp) AS day,
+                   CASE WHEN COALESCE(steps, 0) < 5000 THEN 'low'
+                        WHEN steps < 10000 THEN 'medium'
+                        ELSE 'high' END AS bucket,
+                   COUNT(*), SUM(COALESCE(steps, 0)), SUM(COALESCE(water_intake, 0)),
+                   MAX(COALESCE(steps, 0)), MAX(COALESCE(water_intake, 0)),
+                   SUM(COALESCE(heart_rate, 0)), SUM(COALESCE(ml_prediction, 0) > 0.7)
+            FROM user_metrics
+            GROUP BY user_id, day, bucket
+        ''')
+    
+    # Create per-user calibration table (personalization without per-user models)
+    init_calibration_table(conn)
+    
+    # Per-user data versions for the response cache
+    init_version_table(conn)
+    
+    # Per-user cohort summaries and the profile columns cohorts are defined by
+    init_sketch_table(conn)
+    
+    # Per-user p10/p50/p90 baselines
+    init_baseline_table(conn)
+    
     conn.commit()
     conn.close()
 
@@ -134,6 +204,9 @@ def store_user_metrics(user_id, metrics_data):
     c = conn.cursor()
     
     try:
+        # Seed a first-seen user's baselines before this row is stored, so it isn't counted twice
+        quantile_baselines.seed_user(conn, user_id)
+        
         c.execute('''
             INSERT INTO user_metrics 
             (user_id, timestamp, heart_rate, body_temp, steps, water_intake, 
@@ -154,19 +227,57 @@ def store_user_metrics(user_id, metrics_data):
             metrics_data.get('ml_prediction', 0)
         ))
         
+        # Roll the sample into its day/activity bucket
+        steps = float(metrics_data.get('Steps', 0) or 0)
+        water = float(metrics_data.get('Water Intake', 0) or 0)
+        c.execute('''
+            INSERT INTO user_activity_daily
+            (user_id, day, bucket, samples, steps_sum, water_sum, day_steps, day_water, hr_sum, high_risk)
+            VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, day, bucket) DO UPDATE SET
+                samples = samples + 1,
+                steps_sum = steps_sum + excluded.steps_sum,
+                water_sum = water_sum + excluded.water_sum,
+                day_steps = MAX(day_steps, excluded.day_steps),
+                day_water = MAX(day_water, excluded.day_water),
+                hr_sum = hr_sum + excluded.hr_sum,
+                high_risk = high_risk + excluded.high_risk
+        ''', (
+            user_id,
+            datetime.now().date().isoformat(),
+            activity_bucket(steps),
+            steps, water, steps, water,
+            float(metrics_data.get('HR', 0) or 0),
+            int(float(metrics_data.get('ml_prediction', 0) or 0) > 0.7)
+        ))
+        
         # Update user's last active time
         c.execute('''
-            INSERT OR REPLACE INTO users (user_id, last_active)
+            INSERT INTO users (user_id, last_active)
             VALUES (?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET last_active = excluded.last_active
         ''', (user_id, datetime.now()))
+        bump_version(conn, user_id)
         
         conn.commit()
-        return True
     except Exception as e:
         print(f"Error storing metrics: {e}")
+        conn.close()
         return False
+    
+    # Only a stored reading goes into the baselines
+    try:
+        quantile_baselines.update(conn, user_id, {
+            'heart_rate': metrics_data.get('HR'),
+            'body_temp': metrics_data.get('Temp'),
+            'steps': metrics_data.get('Steps'),
+            'water_intake': metrics_data.get('Water Intake')
+        })
+    except Exception as e:
+        print(f"Error updating baselines: {e}")
     finally:
         conn.close()
+    return True
 
 def get_user_metrics(user_id, days=7):
     """Get user metrics for the last N days"""
@@ -188,22 +299,31 @@ def get_user_metrics(user_id, days=7):
     finally:
         conn.close()
 
-def get_user_baseline(user_id, days=30):
-    """Calculate user's baseline metrics"""
-    metrics = get_user_metrics(user_id, days)
-    if not metrics:
+def get_user_baseline(user_id):
+    """User's robust baseline: p10/p50/p90 of heart rate, body temperature, steps and water intake"""
+    conn = get_db()
+    try:
+        baseline = quantile_baselines.get(conn, user_id)
+    except Exception as e:
+        print(f"Error getting baseline: {e}")
         return None
-    
-    baseline = {
-        'avg_heart_rate': sum(m['heart_rate'] for m in metrics if m['heart_rate']) / len(metrics),
-        'avg_body_temp': sum(m['body_temp'] for m in metrics if m['body_temp']) / len(metrics),
-        'avg_steps': sum(m['steps'] for m in metrics if m['steps']) / len(metrics),
-        'avg_water_intake': sum(m['water_intake'] for m in metrics if m['water_intake']) / len(metrics),
-        'total_records': len(metrics)
-    }
-    
+    finally:
+        conn.close()
+    if baseline is None:
+        return None
+    baseline['total_records'] = max(v['count'] for v in baseline.values())
     return baseline
 
+def recent_vitals(user_id, current_metrics, minutes=60):
+    """(heart rate, water intake) averaged over the user's recent live readings, or taken from current_metrics"""
+    ring = vitals_store.get(user_id)
+    stats = ring.stats(minutes * 60, time.time(), ['HR', 'Water Intake']) if ring is not None else None
+    if stats is not None:
+        return stats['columns']['HR']['mean'], stats['columns']['Water Intake']['mean']
+    hr = current_metrics.get('HR', current_metrics.get('heart_rate', 0))
+    water = current_metrics.get('Water Intake', current_metrics.get('water_intake', 0))
+    return float(hr or 0), float(water or 0)
+
 def create_alert(user_id, alert_type, message, risk_level):
     """Create an alert for a user"""
     conn = get_db()
@@ -214,6 +334,7 @@ def create_alert(user_id, alert_type, message, risk_level):
             INSERT INTO alerts (user_id, alert_type, message, risk_level)
             VALUES (?, ?, ?, ?)
         ''', (user_id, alert_type, message, risk_level))
+        bump_version(conn, user_id)
         conn.commit()
         return True
     except Exception as e:
@@ -252,10 +373,31 @@ def get_user_alerts(user_id, unread_only=True):
 # Initialize database on startup
 init_db()
 
+# Sharded, versioned store for personal models (model + scaler in one artifact per version).
+# Artifacts are uncompressed so they're memory-mapped on load; MODEL_STORE_COMPRESS=1
+# trades that for smaller files.
+model_store = ModelStore("personal_models", compress=os.getenv("MODEL_STORE_COMPRESS", "0") == "1")
+
 # Load ANN model + scaler
 ann_model = tf.keras.models.load_model("ann_model.h5")
 scaler = joblib.load("ann_scaler.pkl")
 
+# Personalization mode: 'models' trains per-user forests/ensembles, 'calibration'
+# keeps only the shared ANN plus a few calibration params per user
+PERSONALIZATION_MODE = os.getenv("PERSONALIZATION_MODE", "models")
+
+# Per-user normalization + calibration heads for the shared ANN, all users in one table
+calibration_table = CalibrationTable(scaler.mean_, scaler.scale_)
+_conn = get_db()
+calibration_table.load(_conn)
+# Per-user HR/temperature/water summaries merged into age/gender/activity cohorts
+cohort_sketches = CohortSketches()
+cohort_sketches.load(_conn)
+# Per-user robust (quantile) baselines of vitals and water intake
+quantile_baselines = QuantileBaselines()
+quantile_baselines.load(_conn)
+_conn.close()
+
 # Simulated heart rate (replace with Polar H10 live data later)
 latest_hr = random.randint(60, 90)
 real_hr = None  # Store real heart rate if provided
@@ -272,8 +414,29 @@ latest_metrics = {
     'Water Intake': 0.0
 }
 
-# Buffer for last 60 minutes of vitals (assuming 1 sample per minute, adjust as needed)
-vitals_buffer = deque(maxlen=60)  # Each entry: {timestamp, metrics...}
+# Per-user columnar ring buffers of recent vitals (64 readings, a few KB per user)
+vitals_store = VitalsStore(capacity=64)
+# User of the most recent /update_metrics, for clients that don't pass user_id
+last_ingest_user = 'default_user'
+TREND_WINDOW_MINUTES = 20
+
+# Per-user streaming anomaly detection (robust stats per vital and time of day)
+anomaly_engine = AnomalyEngine()
+
+# Per-user online HR/temperature/water trends for future-risk forecasts
+trend_registry = TrendRegistry()
+MIN_TREND_READINGS = 5
+
+# Per-user streaming HRV from live RR intervals (Polar H10); 1 and 5 minute windows
+hrv_registry = LiveHRVRegistry(windows=(60.0, 300.0))
+HRV_TREND_WINDOW_S = 300.0
+# Sustained low RMSSD means high physiological strain
+LOW_RMSSD_MS = 20.0
+MIN_HRV_BEATS = 30
+
+# Per-user activity epochs from raw accelerometer windows (samples in g)
+activity_registry = ActivityRegistry(epoch_s=10.0, units_per_g=1.0)
+ACTIVITY_LEVEL_ORDER = ['sedentary', 'light', 'moderate', 'high']
 
 # Hydration prediction via ANN
 def predict_hydration(hr_value):
@@ -285,46 +448,28 @@ def predict_hydration(hr_value):
     except Exception as e:
         return f"Prediction Error: {e}"
 
-def train_personal_model(user_id, min_records=50):
+def train_personal_model(user_id, min_records=50, max_rows=None):
     """Train a personalized model for a specific user"""
-    # Get user's historical data
-    user_data = get_user_metrics(user_id, days=30)
-    
-    if len(user_data) < min_records:
-        print(f"Not enough data for user {user_id}. Need at least {min_records} records, got {len(user_data)}")
-        return False
-    
     try:
-        # Prepare features and labels
-        features = []
-        labels = []
-        
-        for record in user_data:
-            # Features: heart_rate, body_temp, steps, water_intake, active_energy, acc_x, acc_y, acc_z
-            feature_vector = [
-                record.get('heart_rate', 0),
-                record.get('body_temp', 0),
-                record.get('steps', 0),
-                record.get('water_intake', 0),
-                record.get('active_energy', 0),
-                record.get('acc_x', 0),
-                record.get('acc_y', 0),
-                record.get('acc_z', 0)
-            ]
-            
-            # Label: dehydration risk (1 if high risk, 0 if low)
-            risk_label = 1 if record.get('ml_prediction', 0) > 0.5 else 0
-            
-            features.append(feature_vector)
-            labels.append(risk_label)
+        # Load user's historical data straight into feature/label arrays
+        conn = get_db()
+        try:
+            X, y = load_training_matrix(conn, user_id, days=30, max_rows=max_rows)
+        finally:
+            conn.close()
         
-        # Convert to numpy arrays
-        X = np.array(features)
-        y = np.array(labels)
+        if len(X) < min_records:
+            print(f"Not enough data for user {user_id}. Need at least {min_records} records, got {len(X)}")
+            return False
         
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
         
+        # Fit the scaler first so the model is trained on the same scaled features it is served
+        personal_scaler = StandardScaler()
+        X_train = personal_scaler.fit_transform(X_train)
+        X_test = personal_scaler.transform(X_test)
+        
         # Train personal model
         personal_model = RandomForestClassifier(n_estimators=100, random_state=42)
         personal_model.fit(X_train, y_train)
@@ -337,20 +482,12 @@ def train_personal_model(user_id, min_records=50):
         print(f"Training accuracy: {train_score:.3f}")
         print(f"Test accuracy: {test_score:.3f}")
         
-        # Save personal model
-        model_path = f"personal_models/user_{user_id}_model.pkl"
-        os.makedirs("personal_models", exist_ok=True)
-        
-        with open(model_path, 'wb') as f:
-            pickle.dump(personal_model, f)
-        
-        # Save personal scaler
-        scaler_path = f"personal_models/user_{user_id}_scaler.pkl"
-        personal_scaler = StandardScaler()
-        personal_scaler.fit(X_train)
-        
-        with open(scaler_path, 'wb') as f:
-            pickle.dump(personal_scaler, f)
+        # Save personal model as flat node arrays, together with its scaler
+        model_store.save(user_id, 'personal', arrays={
+            **FlatForest.from_sklearn(personal_model).to_arrays(),
+            **scaler_to_arrays(personal_scaler)
+        }, meta={'test_accuracy': float(test_score)})
+        _cache_invalidate((user_id, 'personal'))
         
         return True
         
@@ -358,22 +495,96 @@ def train_personal_model(user_id, min_records=50):
         print(f"Error training personal model for user {user_id}: {e}")
         return False
 
+# Compiled models kept in memory between requests, least recently used evicted first:
+# (user_id, kind) -> (source path, version stamp, model, scaler)
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", "1000"))
+_model_cache = OrderedDict()
+
+def _cache_get(key, path, stamp):
+    # path None: whichever source the entry was loaded from
+    cached = _model_cache.get(key)
+    if cached is not None and (path is None or cached[0] == path) and cached[1] == stamp:
+        _model_cache.move_to_end(key)
+        return cached[2], cached[3]
+    return None
+
+def _cache_put(key, path, stamp, model, scaler):
+    _model_cache[key] = (path, stamp, model, scaler)
+    _model_cache.move_to_end(key)
+    while len(_model_cache) > MODEL_CACHE_SIZE:
+        _model_cache.popitem(last=False)
+
+def _cache_invalidate(key):
+    _model_cache.pop(key, None)
+
+# Encoded responses of per-user GET endpoints, invalidated by the user's data version
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "10000")),
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MB", "64")) * 1024 * 1024
+)
+
+def user_data_version(user_id):
+    conn = get_db()
+    try:
+        return read_version(conn, user_id)
+    finally:
+        conn.close()
+
+def _load_legacy_model(key, model_path, scaler_path):
+    """Load a pre-store model + scaler pair from loose files in personal_models/"""
+    if not os.path.exists(model_path) or not os.path.exists(scaler_path):
+        return None, None
+    
+    stamp = (os.path.getmtime(model_path), os.path.getmtime(scaler_path))
+    cached = _cache_get(key, model_path, stamp)
+    if cached is not None:
+        return cached
+    
+    if model_path.endswith('.npz'):
+        model = FlatForest.load(model_path)
+    else:
+        with open(model_path, 'rb') as f:
+            model = compile_model(pickle.load(f))
+    
+    with open(scaler_path, 'rb') as f:
+        scaler = pickle.load(f)
+    
+    _cache_put(key, model_path, stamp, model, scaler)
+    return model, scaler
+
+def _load_stored_model(user_id, kind):
+    """Load the latest model + scaler artifact for a user from the model store"""
+    # Training drops the cached entry when it saves a new version, so a cached
+    # store model is current without listing the user's directory
+    cached = _cache_get((user_id, kind), None, None)
+    if cached is not None:
+        return cached
+    
+    path = model_store.latest_path(user_id, kind)
+    if path is None:
+        return None, None
+    
+    arrays, obj, meta = read_artifact(path, mmap=True)
+    model = FlatForest.from_arrays(arrays) if obj is None else compile_model(obj)
+    scaler = scaler_from_arrays(arrays)
+    
+    _cache_put((user_id, kind), path, None, model, scaler)
+    return model, scaler
+
 def load_personal_model(user_id):
     """Load a user's personal model"""
     try:
-        model_path = f"personal_models/user_{user_id}_model.pkl"
-        scaler_path = f"personal_models/user_{user_id}_scaler.pkl"
+        model, scaler = _load_stored_model(user_id, 'personal')
+        if model is not None:
+            return model, scaler
         
-        if not os.path.exists(model_path) or not os.path.exists(scaler_path):
-            return None, None
-        
-        with open(model_path, 'rb') as f:
-            model = pickle.load(f)
-        
-        with open(scaler_path, 'rb') as f:
-            scaler = pickle.load(f)
+        # Models saved before the sharded store
+        scaler_path = f"personal_models/user_{user_id}_scaler.pkl"
+        model_path = f"personal_models/user_{user_id}_model.npz"
+        if not os.path.exists(model_path):
+            model_path = f"personal_models/user_{user_id}_model.pkl"
         
-        return model, scaler
+        return _load_legacy_model((user_id, 'personal'), model_path, scaler_path)
         
     except Exception as e:
         print(f"Error loading personal model for user {user_id}: {e}")
@@ -409,6 +620,9 @@ def predict_personal_dehydration(user_id, current_metrics):
                 'model_type': 'personal',
                 'confidence': 'high'
             }
+        elif user_id in calibration_table:
+            # Shared global model with the user's calibration layer
+            return predict_calibrated_dehydration(user_id, current_metrics)
         else:
             # Fall back to global model
             return predict_global_dehydration(current_metrics)
@@ -417,6 +631,44 @@ def predict_personal_dehydration(user_id, current_metrics):
         print(f"Error in personal prediction for user {user_id}: {e}")
         return predict_global_dehydration(current_metrics)
 
+def global_ann_predict(X_scaled):
+    """Dehydration probabilities from the shared ANN for already-scaled (n, 5) features"""
+    return ann_model.predict(np.asarray(X_scaled, dtype=np.float32), verbose=0).ravel()
+
+def global_ann_risk(temp, hr, acc_x, acc_y, acc_z):
+    """Shared ANN probability for one raw reading, scaled with numpy (no DataFrame)"""
+    x = (np.array([[temp, hr, acc_x, acc_y, acc_z]]) - scaler.mean_) / scaler.scale_
+    return float(global_ann_predict(x)[0])
+
+def train_user_calibration(user_id, min_records=50):
+    """Fit a user's normalization + calibration head for the shared ANN"""
+    conn = get_db()
+    try:
+        if count_training_rows(conn, user_id, days=30) < min_records:
+            print(f"Not enough data for calibration for user {user_id}. Need at least {min_records} records")
+            return False
+        return calibration_table.fit_user(conn, user_id, global_ann_predict) is not None
+    except Exception as e:
+        print(f"Error training calibration for user {user_id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+def predict_calibrated_dehydration(user_id, current_metrics):
+    """Predict dehydration using the shared ANN and the user's calibration layer"""
+    try:
+        features = [[float(current_metrics.get(col, 0) or 0) for col in GLOBAL_FEATURES]]
+        prediction = calibration_table.predict([user_id], features, global_ann_predict)[0]
+        
+        return {
+            'prediction': float(prediction),
+            'model_type': 'calibrated',
+            'confidence': 'high'
+        }
+    except Exception as e:
+        print(f"Error in calibrated prediction for user {user_id}: {e}")
+        return predict_global_dehydration(current_metrics)
+
 def predict_global_dehydration(current_metrics):
     """Predict dehydration using the global ANN model"""
     try:
@@ -450,20 +702,13 @@ def get_personal_recommendations(user_id, current_metrics, prediction_result):
     """Generate personalized recommendations based on user's patterns"""
     try:
         # Get user's baseline
-        baseline = get_user_baseline(user_id, days=30)
+        baseline = get_user_baseline(user_id)
         
         if baseline is None:
             return get_general_recommendations(current_metrics, prediction_result)
         
-        # Get recent trends
-        recent_metrics = get_user_metrics(user_id, days=1)
-        
-        if not recent_metrics:
-            return get_general_recommendations(current_metrics, prediction_result)
-        
-        # Calculate trends
-        avg_hr = sum(m['heart_rate'] for m in recent_metrics if m['heart_rate']) / len(recent_metrics)
-        avg_water = sum(m['water_intake'] for m in recent_metrics if m['water_intake']) / len(recent_metrics)
+        # Recent levels from the live readings
+        avg_hr, avg_water = recent_vitals(user_id, current_metrics)
         
         recommendations = []
         
@@ -475,11 +720,13 @@ def get_personal_recommendations(user_id, current_metrics, prediction_result):
             recommendations.append("⚠️ Moderate dehydration risk detected")
             recommendations.append("Increase your water intake")
         
-        # Compare to personal baseline
-        if avg_hr > baseline['avg_heart_rate'] * 1.1:
+        # Compare to personal baseline: above the user's 90th percentile / below halfway to their 10th
+        hr_base = baseline.get('heart_rate')
+        if hr_base and avg_hr > hr_base['p90']:
             recommendations.append("Your heart rate is higher than usual - consider resting")
         
-        if avg_water < baseline['avg_water_intake'] * 0.8:
+        water_base = baseline.get('water_intake')
+        if water_base and avg_water < (water_base['p10'] + water_base['p50']) / 2:
             recommendations.append("You're drinking less water than usual - increase intake")
         
         # Activity-based recommendations
@@ -520,35 +767,50 @@ def get_general_recommendations(current_metrics, prediction_result):
 
 # Weather API configuration
 WEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
-WEATHER_BASE_URL = "http://api.openweathermap.org/data/2.5/weather"
+WEATHER_BASE_URL = os.getenv("OPENWEATHER_BASE_URL", "http://api.openweathermap.org/data/2.5/weather")
+DEFAULT_LAT, DEFAULT_LON = 40.7128, -74.0060  # New York
+
+def fetch_weather(lat, lon):
+    """Current weather for a location from the weather API (called by the weather cache only)"""
+    params = {
+        'lat': lat,
+        'lon': lon,
+        'appid': WEATHER_API_KEY,
+        'units': 'metric'
+    }
+    
+    # Raises DependencyUnavailable while the API is failing; the cache keeps serving stale weather
+    response = outbound.get('openweather', WEATHER_BASE_URL, params=params)
+    if response.status_code != 200:
+        raise RuntimeError(f"Weather API error: {response.status_code}")
+    weather_data = response.json()
+    return {
+        'temperature': weather_data['main']['temp'],
+        'humidity': weather_data['main']['humidity'],
+        'feels_like': weather_data['main']['feels_like'],
+        'description': weather_data['weather'][0]['description'],
+        'wind_speed': weather_data['wind']['speed']
+    }
 
-def get_weather_data(lat=None, lon=None):
-    """Get current weather data for location"""
+# Weather by ~11 km grid cell: fresh for 10 minutes, served stale for up to an hour
+# while it refreshes in the background; requests never wait on the API
+weather_cache = WeatherCache(
+    fetch_weather,
+    ttl_s=float(os.getenv("WEATHER_TTL_S", "600")),
+    stale_s=float(os.getenv("WEATHER_STALE_S", "3600"))
+).start()
+weather_cache.warm(DEFAULT_LAT, DEFAULT_LON)
+
+def get_weather_data(lat=None, lon=None, wait_s=0.0):
+    """Get current weather data for location (cached; None until the first fetch for the area completes)
+
+    wait_s lets a caller that only wants weather wait for a cold area's first fetch.
+    """
     try:
         # Default to a location if coordinates not provided
         if not lat or not lon:
-            lat, lon = 40.7128, -74.0060  # New York default
-        
-        params = {
-            'lat': lat,
-            'lon': lon,
-            'appid': WEATHER_API_KEY,
-            'units': 'metric'
-        }
-        
-        response = requests.get(WEATHER_BASE_URL, params=params, timeout=5)
-        if response.status_code == 200:
-            weather_data = response.json()
-            return {
-                'temperature': weather_data['main']['temp'],
-                'humidity': weather_data['main']['humidity'],
-                'feels_like': weather_data['main']['feels_like'],
-                'description': weather_data['weather'][0]['description'],
-                'wind_speed': weather_data['wind']['speed']
-            }
-        else:
-            print(f"Weather API error: {response.status_code}")
-            return None
+            lat, lon = DEFAULT_LAT, DEFAULT_LON
+        return weather_cache.get(lat, lon, wait_s=wait_s)
     except Exception as e:
         print(f"Error fetching weather: {e}")
         return None
@@ -579,48 +841,71 @@ def adjust_hydration_for_weather(weather_data, base_recommendation):
     
     return base_recommendation + adjustments
 
+ACTIVITY_BUCKETS = ('low', 'medium', 'high')
+
+def activity_bucket(steps):
+    """Activity bucket of a sample from its step count"""
+    if steps < 5000:
+        return 'low'
+    elif steps < 10000:
+        return 'medium'
+    return 'high'
+
+def get_daily_activity_summary(user_id, days=30):
+    """Per calendar day and activity bucket aggregates for the last N days (today included)
+
+    Read from the user_activity_daily rollup, so the cost grows with days, not samples.
+    Steps and water intake are the phone's cumulative totals for the day, so a
+    day's amount is its largest reading.
+    """
+    conn = get_db()
+    c = conn.cursor()
+    
+    try:
+        first_day = (datetime.now().date() - timedelta(days=int(days) - 1)).isoformat()
+        c.execute('''
+            SELECT day, bucket, samples, steps_sum, water_sum, day_steps, day_water, hr_sum, high_risk
+            FROM user_activity_daily
+            WHERE user_id = ? AND day >= ?
+            ORDER BY day
+        ''', (user_id, first_day))
+        return [dict(row) for row in c.fetchall()]
+    except Exception as e:
+        print(f"Error getting daily activity summary: {e}")
+        return []
+    finally:
+        conn.close()
+
+def activity_correlation_from_summary(summary, since_day=None):
+    """Average steps and water per activity bucket from get_daily_activity_summary rows"""
+    groups = {}
+    for row in summary:
+        if since_day is not None and row['day'] < since_day:
+            continue
+        group = groups.setdefault(row['bucket'], {'steps': 0, 'water_intake': 0, 'count': 0})
+        group['steps'] += row['steps_sum']
+        group['water_intake'] += row['water_sum']
+        group['count'] += row['samples']
+    
+    # Calculate averages
+    correlations = {}
+    for group in ACTIVITY_BUCKETS:
+        data = groups.get(group)
+        if data and data['count'] > 0:
+            correlations[group] = {
+                'avg_steps': data['steps'] / data['count'],
+                'avg_water': data['water_intake'] / data['count'],
+                'samples': data['count']
+            }
+    return correlations
+
 def get_activity_correlation(user_id, days=7):
     """Analyze correlation between activity and hydration needs"""
     try:
-        metrics = get_user_metrics(user_id, days)
-        if len(metrics) < 10:
+        summary = get_daily_activity_summary(user_id, days)
+        if sum(row['samples'] for row in summary) < 10:
             return None
-        
-        # Group by activity level
-        activity_groups = {
-            'low': {'steps': 0, 'water_intake': 0, 'count': 0},
-            'medium': {'steps': 0, 'water_intake': 0, 'count': 0},
-            'high': {'steps': 0, 'water_intake': 0, 'count': 0}
-        }
-        
-        for metric in metrics:
-            steps = metric.get('steps', 0)
-            water = metric.get('water_intake', 0)
-            
-            if steps < 5000:
-                group = 'low'
-            elif steps < 10000:
-                group = 'medium'
-            else:
-                group = 'high'
-            
-            activity_groups[group]['steps'] += steps
-            activity_groups[group]['water_intake'] += water
-            activity_groups[group]['count'] += 1
-        
-        # Calculate averages
-        correlations = {}
-        for group, data in activity_groups.items():
-            if data['count'] > 0:
-                avg_steps = data['steps'] / data['count']
-                avg_water = data['water_intake'] / data['count']
-                correlations[group] = {
-                    'avg_steps': avg_steps,
-                    'avg_water': avg_water,
-                    'samples': data['count']
-                }
-        
-        return correlations
+        return activity_correlation_from_summary(summary)
         
     except Exception as e:
         print(f"Error calculating activity correlation: {e}")
@@ -629,35 +914,53 @@ def get_activity_correlation(user_id, days=7):
 def generate_advanced_analytics(user_id, days=30):
     """Generate comprehensive health analytics"""
     try:
-        metrics = get_user_metrics(user_id, days)
-        if len(metrics) < 5:
+        summary = get_daily_activity_summary(user_id, days)
+        total_records = sum(row['samples'] for row in summary)
+        if total_records < 5:
             return None
         
+        # Collapse the activity buckets into one entry per calendar day
+        daily = {}
+        for row in summary:
+            day = daily.setdefault(row['day'], {'date': row['day'], 'steps': 0, 'water_intake': 0,
+                                                'hr_sum': 0.0, 'samples': 0, 'high_risk': 0})
+            day['steps'] = max(day['steps'], row['day_steps'])
+            day['water_intake'] = max(day['water_intake'], row['day_water'])
+            day['hr_sum'] += row['hr_sum']
+            day['samples'] += row['samples']
+            day['high_risk'] += row['high_risk']
+        days_list = list(daily.values())
+        
         # Calculate various statistics
-        total_steps = sum(m.get('steps', 0) for m in metrics)
-        total_water = sum(m.get('water_intake', 0) for m in metrics)
-        avg_heart_rate = sum(m.get('heart_rate', 0) for m in metrics if m.get('heart_rate')) / len(metrics)
+        total_steps = sum(d['steps'] for d in days_list)
+        total_water = sum(d['water_intake'] for d in days_list)
+        avg_heart_rate = sum(d['hr_sum'] for d in days_list) / total_records
         
         # Dehydration risk analysis
-        high_risk_count = sum(1 for m in metrics if m.get('ml_prediction', 0) > 0.7)
-        risk_percentage = (high_risk_count / len(metrics)) * 100
+        high_risk_count = sum(d['high_risk'] for d in days_list)
+        risk_percentage = (high_risk_count / total_records) * 100
         
-        # Trend analysis
-        recent_metrics = metrics[:7]  # Last 7 days
-        older_metrics = metrics[7:14] if len(metrics) > 14 else []
+        # Trend analysis: the last 7 calendar days against the 7 before them
+        today = datetime.now().date()
+        recent_start = (today - timedelta(days=6)).isoformat()
+        older_start = (today - timedelta(days=13)).isoformat()
+        recent_days = [d for d in days_list if d['date'] >= recent_start]
+        older_days = [d for d in days_list if older_start <= d['date'] < recent_start]
         
-        recent_avg_water = sum(m.get('water_intake', 0) for m in recent_metrics) / len(recent_metrics)
-        older_avg_water = sum(m.get('water_intake', 0) for m in older_metrics) / len(older_metrics) if older_metrics else recent_avg_water
+        overall_avg_water = total_water / len(days_list)
+        recent_avg_water = sum(d['water_intake'] for d in recent_days) / len(recent_days) if recent_days else overall_avg_water
+        older_avg_water = sum(d['water_intake'] for d in older_days) / len(older_days) if older_days else recent_avg_water
         
         water_trend = "improving" if recent_avg_water > older_avg_water else "declining" if recent_avg_water < older_avg_water else "stable"
         
         # Best and worst days
-        best_day = max(metrics, key=lambda x: x.get('water_intake', 0))
-        worst_day = min(metrics, key=lambda x: x.get('water_intake', 0))
+        best_day = max(days_list, key=lambda x: x['water_intake'])
+        worst_day = min(days_list, key=lambda x: x['water_intake'])
         
         analytics = {
             'summary': {
-                'total_days': len(metrics),
+                'total_days': len(days_list),
+                'total_records': total_records,
                 'total_steps': total_steps,
                 'total_water_liters': total_water,
                 'avg_heart_rate': round(avg_heart_rate, 1),
@@ -666,18 +969,18 @@ def generate_advanced_analytics(user_id, days=30):
             'trends': {
                 'water_intake_trend': water_trend,
                 'recent_avg_water': round(recent_avg_water, 2),
-                'overall_avg_water': round(total_water / len(metrics), 2)
+                'overall_avg_water': round(overall_avg_water, 2)
             },
-            'activity_correlation': get_activity_correlation(user_id),
+            'activity_correlation': activity_correlation_from_summary(summary, since_day=recent_start),
             'best_day': {
-                'date': best_day.get('timestamp', ''),
-                'water_intake': best_day.get('water_intake', 0),
-                'steps': best_day.get('steps', 0)
+                'date': best_day['date'],
+                'water_intake': best_day['water_intake'],
+                'steps': best_day['steps']
             },
             'worst_day': {
-                'date': worst_day.get('timestamp', ''),
-                'water_intake': worst_day.get('water_intake', 0),
-                'steps': worst_day.get('steps', 0)
+                'date': worst_day['date'],
+                'water_intake': worst_day['water_intake'],
+                'steps': worst_day['steps']
             }
         }
         
@@ -687,6 +990,57 @@ def generate_advanced_analytics(user_id, days=30):
         print(f"Error generating analytics: {e}")
         return None
 
+# vital -> (card title, category, value format)
+INSIGHT_VITALS = {
+    'HR': ('Heart Rate', 'health', '{:.0f} bpm'),
+    'Temp': ('Body Temperature', 'health', '{:.1f}°C'),
+    'Water Intake': ('Water Intake', 'hydration', '{:.1f} L'),
+    'RMSSD': ('Heart Rate Variability', 'health', '{:.0f} ms'),
+}
+# Robust z-scores beyond this count as a rising/falling trend on a card
+INSIGHT_TREND_Z = 1.0
+
+def generate_insights(user_id):
+    """Insight cards from the anomaly engine's current state (no history scan)"""
+    snapshot = anomaly_engine.snapshot(user_id)
+    if snapshot is None:
+        return []
+    current, recent = snapshot
+    insights = []
+    for vital, (title, category, fmt) in INSIGHT_VITALS.items():
+        assessment = current.get(vital)
+        if assessment is None:
+            continue
+        z = assessment['z']
+        expected = fmt.format(assessment['expected'])
+        if assessment['anomalous']:
+            details = f"Unusual for you: {abs(z):.1f} deviations {'above' if z > 0 else 'below'} your typical {expected}."
+        else:
+            details = "Within your usual range."
+        insights.append({
+            'title': title,
+            'subtitle': f"Typical {'for this time of day' if assessment['time_of_day'] else 'for you'}: {expected}",
+            'value': fmt.format(assessment['value']),
+            'trend': 'up' if z > INSIGHT_TREND_Z else 'down' if z < -INSIGHT_TREND_Z else 'stable',
+            'category': category,
+            'details': details
+        })
+    day_ago = time.time() - 24 * 3600
+    recent = [a for a in recent if a['timestamp'] >= day_ago]
+    if recent:
+        latest = recent[0]
+        insights.append({
+            'title': 'Unusual Readings',
+            'subtitle': 'Last 24 hours',
+            'value': str(len(recent)),
+            'trend': 'up' if latest['z'] > 0 else 'down',
+            'category': INSIGHT_VITALS[latest['vital']][1],
+            'details': f"Most recent: {INSIGHT_VITALS[latest['vital']][0].lower()} at "
+                       f"{INSIGHT_VITALS[latest['vital']][2].format(latest['value'])} "
+                       f"({datetime.fromtimestamp(latest['timestamp']).strftime('%H:%M')})."
+        })
+    return insights
+
 def create_social_achievement(user_id, achievement_type):
     """Create social achievements for users"""
     achievements = {
@@ -707,6 +1061,7 @@ def create_social_achievement(user_id, achievement_type):
             INSERT INTO achievements (user_id, achievement_type, message, earned_at)
             VALUES (?, ?, ?, ?)
         ''', (user_id, achievement_type, achievement_message, datetime.now()))
+        bump_version(conn, user_id)
         conn.commit()
         return True
     except Exception as e:
@@ -767,6 +1122,7 @@ def create_smart_notification(user_id, notification_type, urgency, message, data
             datetime.now(),
             False
         ))
+        bump_version(conn, user_id)
         conn.commit()
         return True
     except Exception as e:
@@ -802,7 +1158,7 @@ def get_user_notifications(user_id, unread_only=True):
     finally:
         conn.close()
 
-def mark_notification_read(notification_id):
+def mark_notification_read(notification_id, user_id=None):
     """Mark a notification as read"""
     conn = get_db()
     c = conn.cursor()
@@ -812,6 +1168,8 @@ def mark_notification_read(notification_id):
             UPDATE notifications SET is_read = TRUE 
             WHERE id = ?
         ''', (notification_id,))
+        if user_id is not None:
+            bump_version(conn, user_id)
         conn.commit()
         return True
     except Exception as e:
@@ -820,12 +1178,11 @@ def mark_notification_read(notification_id):
     finally:
         conn.close()
 
-def check_and_create_smart_notifications(user_id, current_metrics, prediction_result, weather_data=None):
+def check_and_create_smart_notifications(user_id, current_metrics, prediction_result, weather_data=None, anomalies=None):
     """Check conditions and create smart notifications"""
     try:
-        # Get user's recent activity and patterns
-        recent_metrics = get_user_metrics(user_id, days=1)
-        baseline = get_user_baseline(user_id, days=30)
+        # Get user's baseline
+        baseline = get_user_baseline(user_id)
         
         notifications_created = []
         
@@ -908,18 +1265,32 @@ def check_and_create_smart_notifications(user_id, current_metrics, prediction_re
                 notifications_created.append('humidity')
         
         # 5. Pattern-based notifications
-        if baseline and recent_metrics:
-            avg_water = sum(m.get('water_intake', 0) for m in recent_metrics) / len(recent_metrics)
-            if avg_water < baseline['avg_water_intake'] * 0.7:
+        water_base = baseline.get('water_intake') if baseline else None
+        if water_base:
+            _, avg_water = recent_vitals(user_id, current_metrics)
+            if avg_water < water_base['p10']:
                 create_smart_notification(
                     user_id,
                     'pattern_low_water',
                     'medium',
                     "📉 You're drinking less water than usual. Try to increase your intake.",
-                    {'current_avg': avg_water, 'baseline_avg': baseline['avg_water_intake']}
+                    {'current_avg': avg_water, 'baseline_p10': water_base['p10'], 'baseline_p50': water_base['p50']}
                 )
                 notifications_created.append('pattern')
         
+        # 6. Anomaly notifications: the start of an unusual reading in the worrying direction
+        for anomaly in anomalies or []:
+            if anomaly['concerning']:
+                create_smart_notification(
+                    user_id,
+                    'anomaly_' + anomaly['vital'].lower().replace(' ', '_'),
+                    'high' if abs(anomaly['z']) > 2 * ANOMALY_Z else 'medium',
+                    f"🔎 Unusual {INSIGHT_VITALS[anomaly['vital']][0].lower()}: {anomaly['value']:.1f} {anomaly['unit']} "
+                    f"(you're usually around {anomaly['expected']:.1f} at this time).",
+                    {'value': anomaly['value'], 'expected': anomaly['expected'], 'z': anomaly['z']}
+                )
+                notifications_created.append('anomaly')
+        
         return notifications_created
         
     except Exception as e:
@@ -951,61 +1322,34 @@ def update_hr():
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
-def train_ensemble_model(user_id, min_records=50):
-    """Train an ensemble model combining multiple algorithms"""
-    # Get user's historical data
-    user_data = get_user_metrics(user_id, days=30)
-    
-    if len(user_data) < min_records:
-        print(f"Not enough data for ensemble model for user {user_id}. Need at least {min_records} records, got {len(user_data)}")
-        return False
-    
+def train_ensemble_model(user_id, min_records=50, max_rows=None, mode='auto', time_budget_s=60.0):
+    """Train an ensemble model combining multiple algorithms
+
+    mode is 'exact' (RF + RBF SVC), 'scalable' (RF + Nystroem logistic regression,
+    bounded by time_budget_s) or 'auto', which picks by the number of rows.
+    """
     try:
-        # Prepare features and labels
-        features = []
-        labels = []
-        
-        for record in user_data:
-            # Features: heart_rate, body_temp, steps, water_intake, active_energy, acc_x, acc_y, acc_z
-            feature_vector = [
-                record.get('heart_rate', 0),
-                record.get('body_temp', 0),
-                record.get('steps', 0),
-                record.get('water_intake', 0),
-                record.get('active_energy', 0),
-                record.get('acc_x', 0),
-                record.get('acc_y', 0),
-                record.get('acc_z', 0)
-            ]
-            
-            # Label: dehydration risk (1 if high risk, 0 if low)
-            risk_label = 1 if record.get('ml_prediction', 0) > 0.5 else 0
-            
-            features.append(feature_vector)
-            labels.append(risk_label)
+        # Load user's historical data straight into feature/label arrays
+        conn = get_db()
+        try:
+            X, y = load_training_matrix(conn, user_id, days=30, max_rows=max_rows)
+        finally:
+            conn.close()
         
-        # Convert to numpy arrays
-        X = np.array(features)
-        y = np.array(labels)
+        if len(X) < min_records:
+            print(f"Not enough data for ensemble model for user {user_id}. Need at least {min_records} records, got {len(X)}")
+            return False
         
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
         
-        # Create individual models
-        rf_model = RandomForestClassifier(n_estimators=100, random_state=42)
-        svm_model = SVC(probability=True, random_state=42)
-        
-        # Create ensemble model
-        ensemble_model = VotingClassifier(
-            estimators=[
-                ('rf', rf_model),
-                ('svm', svm_model)
-            ],
-            voting='soft'  # Use probability voting
-        )
+        # Fit the scaler first so the ensemble is trained on the same scaled features it is served
+        ensemble_scaler = StandardScaler()
+        X_train = ensemble_scaler.fit_transform(X_train)
+        X_test = ensemble_scaler.transform(X_test)
         
         # Train ensemble model
-        ensemble_model.fit(X_train, y_train)
+        ensemble_model, fit_info = train_ensemble(X_train, y_train, mode=mode, time_budget_s=time_budget_s)
         
         # Evaluate model
         train_score = ensemble_model.score(X_train, y_train)
@@ -1015,27 +1359,18 @@ def train_ensemble_model(user_id, min_records=50):
         y_pred = ensemble_model.predict(X_test)
         precision, recall, f1, _ = precision_recall_fscore_support(y_test, y_pred, average='binary')
         
-        print(f"Ensemble model for user {user_id}:")
+        print(f"Ensemble model for user {user_id} ({fit_info['mode']}, "
+              f"{fit_info['rows_used']} rows, {fit_info['fit_seconds']:.1f}s):")
         print(f"Training accuracy: {train_score:.3f}")
         print(f"Test accuracy: {test_score:.3f}")
         print(f"Precision: {precision:.3f}")
         print(f"Recall: {recall:.3f}")
         print(f"F1-Score: {f1:.3f}")
         
-        # Save ensemble model
-        model_path = f"personal_models/user_{user_id}_ensemble.pkl"
-        os.makedirs("personal_models", exist_ok=True)
-        
-        with open(model_path, 'wb') as f:
-            pickle.dump(ensemble_model, f)
-        
-        # Save ensemble scaler
-        scaler_path = f"personal_models/user_{user_id}_ensemble_scaler.pkl"
-        ensemble_scaler = StandardScaler()
-        ensemble_scaler.fit(X_train)
-        
-        with open(scaler_path, 'wb') as f:
-            pickle.dump(ensemble_scaler, f)
+        # Save ensemble model together with its scaler
+        model_store.save(user_id, 'ensemble', arrays=scaler_to_arrays(ensemble_scaler), obj=ensemble_model,
+                         meta={'test_accuracy': float(test_score), **fit_info})
+        _cache_invalidate((user_id, 'ensemble'))
         
         return True
         
@@ -1043,22 +1378,39 @@ def train_ensemble_model(user_id, min_records=50):
         print(f"Error training ensemble model for user {user_id}: {e}")
         return False
 
+def compare_ensemble_modes(user_id, time_budget_s=60.0):
+    """Accuracy and fit time of the exact vs scalable ensemble on the same user data"""
+    try:
+        conn = get_db()
+        try:
+            X, y = load_training_matrix(conn, user_id, days=30)
+        finally:
+            conn.close()
+        
+        if len(X) < 50 or len(np.unique(y)) < 2:
+            return None
+        
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        scaler = StandardScaler().fit(X_train)
+        return compare_modes(scaler.transform(X_train), y_train, scaler.transform(X_test), y_test,
+                             time_budget_s=time_budget_s)
+        
+    except Exception as e:
+        print(f"Error comparing ensemble modes for user {user_id}: {e}")
+        return None
+
 def load_ensemble_model(user_id):
     """Load a user's ensemble model"""
     try:
+        model, scaler = _load_stored_model(user_id, 'ensemble')
+        if model is not None:
+            return model, scaler
+        
+        # Models saved before the sharded store
         model_path = f"personal_models/user_{user_id}_ensemble.pkl"
         scaler_path = f"personal_models/user_{user_id}_ensemble_scaler.pkl"
         
-        if not os.path.exists(model_path) or not os.path.exists(scaler_path):
-            return None, None
-        
-        with open(model_path, 'rb') as f:
-            model = pickle.load(f)
-        
-        with open(scaler_path, 'rb') as f:
-            scaler = pickle.load(f)
-        
-        return model, scaler
+        return _load_legacy_model((user_id, 'ensemble'), model_path, scaler_path)
         
     except Exception as e:
         print(f"Error loading ensemble model for user {user_id}: {e}")
@@ -1102,126 +1454,135 @@ def predict_with_ensemble(user_id, current_metrics):
         print(f"Error in ensemble prediction for user {user_id}: {e}")
         return predict_personal_dehydration(user_id, current_metrics)
 
-def predict_future_dehydration(user_id, current_metrics, time_horizon_minutes=30):
-    """Predict dehydration risk in the future based on current trends"""
+def future_risk_at(current_risk, trends, horizon_minutes, weather_data, hrv_low, steps):
+    """Projected risk after horizon_minutes from the current risk and per-minute trends"""
+    hr_change = trends['HR'][1] * horizon_minutes if 'HR' in trends else 0.0
+    temp_change = trends['Temp'][1] * horizon_minutes if 'Temp' in trends else 0.0
+    water_change = trends['Water Intake'][1] * horizon_minutes if 'Water Intake' in trends else 0.0
+    future_risk = current_risk
+
+    # Adjust based on trends
+    if hr_change > 5:  # Heart rate increasing
+        future_risk += 0.1
+    if temp_change > 0.5:  # Temperature increasing
+        future_risk += 0.15
+    if water_change < -0.5:  # Water intake decreasing
+        future_risk += 0.2
+
+    # Weather adjustment
+    if weather_data:
+        temp = weather_data.get('temperature', 20)
+        if temp > 30:
+            future_risk += 0.1
+        elif temp > 25:
+            future_risk += 0.05
+
+    # HRV adjustment: low variability over the last 5 minutes signals strain
+    if hrv_low:
+        future_risk += 0.1
+
+    # Activity adjustment
+    if steps > 10000:
+        future_risk += 0.1
+    elif steps > 5000:
+        future_risk += 0.05
+
+    # Cap the risk at 1.0
+    return min(future_risk, 1.0)
+
+def predict_future_dehydration(user_id, current_metrics, time_horizon_minutes=30, current_prediction=None, weather_data=None):
+    """Predict dehydration risk time_horizon_minutes ahead (plus standard horizons) from the user's live trends
+
+    Pass the caller's current_prediction and weather_data to avoid recomputing them;
+    without weather data no weather adjustment is made.
+    """
     try:
-        # Get recent metrics for trend analysis
-        recent_metrics = get_user_metrics(user_id, days=1)
-        
-        if len(recent_metrics) < 5:
+        state = trend_registry.state(user_id)
+        if not state or max(count for _, _, count in state.values()) < MIN_TREND_READINGS:
             return None
-        
-        # Calculate trends
-        hr_trend = 0
-        temp_trend = 0
-        water_trend = 0
-        
-        if len(recent_metrics) >= 2:
-            # Calculate rate of change
-            recent = recent_metrics[:3]  # Last 3 readings
-            older = recent_metrics[-3:] if len(recent_metrics) >= 6 else recent_metrics[-2:]
-            
-            if len(recent) > 0 and len(older) > 0:
-                recent_avg_hr = sum(m.get('heart_rate', 0) for m in recent) / len(recent)
-                older_avg_hr = sum(m.get('heart_rate', 0) for m in older) / len(older)
-                hr_trend = recent_avg_hr - older_avg_hr
-                
-                recent_avg_temp = sum(m.get('body_temp', 0) for m in recent) / len(recent)
-                older_avg_temp = sum(m.get('body_temp', 0) for m in older) / len(older)
-                temp_trend = recent_avg_temp - older_avg_temp
-                
-                recent_avg_water = sum(m.get('water_intake', 0) for m in recent) / len(recent)
-                older_avg_water = sum(m.get('water_intake', 0) for m in older) / len(older)
-                water_trend = recent_avg_water - older_avg_water
-        
+
         # Get current prediction
-        current_prediction = predict_with_ensemble(user_id, current_metrics)
+        if current_prediction is None:
+            current_prediction = predict_with_ensemble(user_id, current_metrics)
         current_risk = current_prediction['prediction']
-        
-        # Predict future risk based on trends
-        future_risk = current_risk
-        
-        # Adjust based on trends
-        if hr_trend > 5:  # Heart rate increasing
-            future_risk += 0.1
-        if temp_trend > 0.5:  # Temperature increasing
-            future_risk += 0.15
-        if water_trend < -0.5:  # Water intake decreasing
-            future_risk += 0.2
-        
-        # Weather adjustment
-        weather_data = get_weather_data()
-        if weather_data:
-            temp = weather_data.get('temperature', 20)
-            if temp > 30:
-                future_risk += 0.1
-            elif temp > 25:
-                future_risk += 0.05
-        
-        # Activity adjustment
-        steps = current_metrics.get('steps', 0)
-        if steps > 10000:
-            future_risk += 0.1
-        elif steps > 5000:
-            future_risk += 0.05
-        
-        # Cap the risk at 1.0
-        future_risk = min(future_risk, 1.0)
-        
+
+        hrv = hrv_registry.metrics(user_id, HRV_TREND_WINDOW_S, now=time.time())
+        hrv_low = bool(hrv and hrv['n_beats'] >= MIN_HRV_BEATS and hrv['rmssd_ms'] is not None
+                       and hrv['rmssd_ms'] < LOW_RMSSD_MS)
+        steps = float(current_metrics.get('Steps', current_metrics.get('steps', 0)) or 0)
+
+        horizons = sorted(set(FORECAST_HORIZONS_MIN) | {time_horizon_minutes})
+        forecasts = {h: future_risk_at(current_risk, state, h, weather_data, hrv_low, steps) for h in horizons}
+        future_risk = forecasts[time_horizon_minutes]
+
         # Determine urgency
         if future_risk > 0.8:
             urgency = "emergency"
-            time_to_dehydration = "10-15 minutes"
         elif future_risk > 0.6:
             urgency = "high"
-            time_to_dehydration = "20-30 minutes"
         elif future_risk > 0.4:
             urgency = "medium"
-            time_to_dehydration = "30-60 minutes"
         else:
             urgency = "low"
-            time_to_dehydration = "No immediate risk"
-        
+        # Earliest forecast horizon at which the risk becomes high
+        at_risk = [h for h in horizons if forecasts[h] > 0.6]
+        time_to_dehydration = f"Within {at_risk[0]} minutes" if at_risk else "No immediate risk"
+
         return {
             'current_risk': current_risk,
             'predicted_risk': future_risk,
+            'time_horizon_minutes': time_horizon_minutes,
             'urgency': urgency,
             'time_to_dehydration': time_to_dehydration,
+            'forecasts': {str(h): forecasts[h] for h in horizons},
             'trends': {
-                'heart_rate_trend': hr_trend,
-                'temperature_trend': temp_trend,
-                'water_intake_trend': water_trend
-            }
+                'heart_rate_trend': state['HR'][1] * time_horizon_minutes if 'HR' in state else 0.0,
+                'temperature_trend': state['Temp'][1] * time_horizon_minutes if 'Temp' in state else 0.0,
+                'water_intake_trend': state['Water Intake'][1] * time_horizon_minutes if 'Water Intake' in state else 0.0
+            },
+            'hrv': hrv
         }
-        
+
     except Exception as e:
         print(f"Error predicting future dehydration: {e}")
         return None
 
-def analyze_activity_intensity(acc_x, acc_y, acc_z, steps, active_energy):
-    """Analyze activity intensity based on accelerometer and activity data"""
+INTENSITY_SCORES = {'sedentary': 0.1, 'light': 0.3, 'moderate': 0.5, 'high': 0.8}
+
+def analyze_activity_intensity(acc_x, acc_y, acc_z, steps, active_energy, activity_summary=None):
+    """Analyze activity intensity based on accelerometer and activity data
+
+    activity_summary is the user's recent ACC epochs (ActivityRegistry.summary);
+    without it only the single current sample is available.
+    """
     try:
         # Calculate movement magnitude
         movement_magnitude = np.sqrt(acc_x**2 + acc_y**2 + acc_z**2)
         
-        # Determine activity level
+        # Determine activity level from the day's totals
         if steps > 10000 or active_energy > 500:
             activity_level = "high"
-            intensity_score = 0.8
         elif steps > 5000 or active_energy > 200:
             activity_level = "moderate"
-            intensity_score = 0.5
-        elif movement_magnitude > 0.5:
+        elif activity_summary is None and movement_magnitude > 0.5:
             activity_level = "light"
-            intensity_score = 0.3
         else:
             activity_level = "sedentary"
-            intensity_score = 0.1
+        
+        # Current intensity from accelerometer epochs (MET bands), whichever is higher
+        met = None
+        if activity_summary is not None:
+            met = activity_summary['met']
+            epoch_level = met_level(met)
+            if ACTIVITY_LEVEL_ORDER.index(epoch_level) > ACTIVITY_LEVEL_ORDER.index(activity_level):
+                activity_level = epoch_level
         
         return {
             'activity_level': activity_level,
-            'intensity_score': intensity_score,
+            'intensity_score': INTENSITY_SCORES[activity_level],
             'movement_magnitude': movement_magnitude,
+            'met': met,
+            'enmo_mg': activity_summary['enmo_mg'] if activity_summary else None,
             'steps': steps,
             'active_energy': active_energy
         }
@@ -1391,7 +1752,8 @@ def get_comprehensive_environmental_analysis(user_id, current_metrics):
             current_metrics.get('acc_y', 0),
             current_metrics.get('acc_z', 0),
             current_metrics.get('steps', 0),
-            current_metrics.get('active_energy', 0)
+            current_metrics.get('active_energy', 0),
+            activity_registry.summary(user_id)
         )
         
         # Get time-based factors
@@ -1478,7 +1840,7 @@ def generate_environmental_recommendations(activity_data, time_data, location_da
 
 @app.route('/update_metrics', methods=['POST'])
 def update_metrics():
-    global latest_metrics, vitals_buffer
+    global latest_metrics, last_ingest_user
     data = request.get_json()
     print(f"[Flask] Received data from Swift: {data}")
     
@@ -1489,8 +1851,26 @@ def update_metrics():
     weather_data = get_weather_data()
     
     # Update only the keys present in the incoming data
+    # RR intervals (ms) from the chest strap feed the streaming HRV estimator
+    rr_intervals = data.get('RR') or data.get('rr_intervals')
+    if rr_intervals:
+        hrv_registry.add_rr(user_id, rr_intervals if isinstance(rr_intervals, list) else [rr_intervals])
+    hrv = hrv_registry.metrics(user_id, now=time.time())
+
+    # Raw accelerometer windows ([[x, y, z], ...] in g at acc_rate Hz) feed the activity engine
+    acc_samples = data.get('acc_samples')
+    if acc_samples:
+        try:
+            activity_registry.add(user_id, acc_samples, float(data.get('acc_rate', 32.0)))
+        except Exception as e:
+            print(f"Error processing accelerometer window: {e}")
+
+    # HR reliability from beat rejections and current movement; low-quality readings are down-weighted
+    activity = activity_registry.summary(user_id, last_epochs=1)
+    hr_quality = live_hr_quality(hrv['rejected_fraction'] if hrv else 0.0, activity['counts'] if activity else None)
+
     for k, v in data.items():
-        if k != 'user_id':  # Don't store user_id in metrics
+        if k not in ('user_id', 'RR', 'rr_intervals', 'acc_samples', 'acc_rate'):  # Don't store ids or raw streams in metrics
             try:
                 latest_metrics[k] = float(v)
             except (ValueError, TypeError):
@@ -1502,9 +1882,9 @@ def update_metrics():
     latest_metrics['Heart Rate'] = float(latest_metrics.get('HR', 0.0))
     print(f"[Flask] After setting display keys: {latest_metrics}")
     
-    # Add to vitals buffer
+    # Add to the user's vitals ring
+    now = time.time()
     vitals_entry = {
-        'timestamp': time.time(),
         'Temp': latest_metrics.get('Body Temp', 0.0),
         'HR': latest_metrics.get('Heart Rate', 0.0),
         'Water Intake': latest_metrics.get('Water Intake', 0.0),
@@ -1512,9 +1892,41 @@ def update_metrics():
         'Acc_Y': latest_metrics.get('Acc_Y', 0.0),
         'Acc_Z': latest_metrics.get('Acc_Z', 0.0),
         'Steps': latest_metrics.get('Steps', 0),
-        'Active Energy': latest_metrics.get('Active Energy', 0.0)
+        'Active Energy': latest_metrics.get('Active Energy', 0.0),
+        'HR Quality': hr_quality,
+        'RMSSD': hrv['rmssd_ms'] if hrv else None
     }
-    vitals_buffer.append(vitals_entry)
+    ring = vitals_store.get(user_id, create=True)
+    # Score the shared ANN once per reading so risk queries don't run the model.
+    # A motion-corrupted HR reading is replaced by the quality-weighted recent mean.
+    ann_hr = vitals_entry['HR']
+    if hr_quality < MIN_QUALITY:
+        recent = ring.stats(TREND_WINDOW_MINUTES * 60, now, ['HR'], weight_column='HR Quality')
+        if recent is not None:
+            ann_hr = recent['columns']['HR']['mean']
+    try:
+        vitals_entry['Risk'] = global_ann_risk(vitals_entry['Temp'], ann_hr, vitals_entry['Acc_X'],
+                                               vitals_entry['Acc_Y'], vitals_entry['Acc_Z'])
+    except Exception as e:
+        print(f"Error scoring reading with ANN: {e}")
+    ring.append(now, vitals_entry)
+    # Motion-corrupted HR is left out of anomaly detection rather than flagged
+    anomalies = anomaly_engine.add(
+        user_id, dict(vitals_entry, HR=None) if hr_quality < MIN_QUALITY else vitals_entry, now)
+    conn = get_db()
+    try:
+        # Users first seen since startup get their trends seeded from stored metrics
+        trend_registry.update(user_id, now, vitals_entry, conn)
+    except Exception as e:
+        print(f"Error updating trends: {e}")
+        trend_registry.update(user_id, now, vitals_entry)
+    try:
+        cohort_sketches.add(user_id, vitals_entry, conn)
+    except Exception as e:
+        print(f"Error updating cohort summary: {e}")
+    finally:
+        conn.close()
+    last_ingest_user = user_id
     
     # Prepare metrics for database
     metrics_for_db = {
@@ -1531,8 +1943,9 @@ def update_metrics():
     # Get ensemble prediction
     prediction_result = predict_with_ensemble(user_id, metrics_for_db)
     
-    # Get future prediction
-    future_prediction = predict_future_dehydration(user_id, metrics_for_db)
+    # Get future prediction from the live trends, reusing this reading's prediction and weather
+    future_prediction = predict_future_dehydration(user_id, metrics_for_db, current_prediction=prediction_result,
+                                                   weather_data=weather_data)
     
     # Get comprehensive environmental analysis
     environmental_analysis = get_comprehensive_environmental_analysis(user_id, metrics_for_db)
@@ -1550,14 +1963,20 @@ def update_metrics():
                    prediction_result['prediction'])
     
     # Create smart notifications
-    notifications_created = check_and_create_smart_notifications(user_id, metrics_for_db, prediction_result, weather_data)
+    notifications_created = check_and_create_smart_notifications(user_id, metrics_for_db, prediction_result, weather_data,
+                                                                 anomalies)
     
-    # Train ensemble model periodically (every 100 records)
-    user_metrics_count = len(get_user_metrics(user_id, days=30))
+    # Retrain personalization periodically (every 100 records)
+    conn = get_db()
+    try:
+        user_metrics_count = count_training_rows(conn, user_id, days=30)
+    finally:
+        conn.close()
     if user_metrics_count % 100 == 0 and user_metrics_count > 0:
         # Train in background (don't block the response)
         import threading
-        threading.Thread(target=train_ensemble_model, args=(user_id,)).start()
+        trainer = train_user_calibration if PERSONALIZATION_MODE == 'calibration' else train_ensemble_model
+        threading.Thread(target=trainer, args=(user_id,)).start()
     
     # Generate base recommendations
     base_recommendations = get_personal_recommendations(user_id, metrics_for_db, prediction_result)
@@ -1583,7 +2002,8 @@ def update_metrics():
         "environmental_analysis": environmental_analysis,
         "recommendations": weather_adjusted_recommendations,
         "weather": weather_data,
-        "notifications_created": notifications_created
+        "notifications_created": notifications_created,
+        "anomalies": anomalies
     })
 
 def check_and_create_achievements(user_id, current_metrics):
@@ -1610,29 +2030,38 @@ def check_and_create_achievements(user_id, current_metrics):
     except Exception as e:
         print(f"Error checking achievements: {e}")
 
-def analyze_dehydration_trend(buffer, window_minutes=20):
+def ring_window_features(ring, window_minutes=TREND_WINDOW_MINUTES, now=None):
+    """Windowed HR/temperature mean/std/slope from a user's vitals ring
+
+    Computed by VitalsRing.stats with biosignals.features.window_summary (HR weighted by its quality).
+    """
+    now = time.time() if now is None else now
+    features = {f'{p}_{s}': None for p in ('hr', 'temp') for s in ('mean', 'std', 'slope')}
+    hr = ring.stats(window_minutes * 60, now, ['HR'], weight_column='HR Quality')
+    temp = ring.stats(window_minutes * 60, now, ['Temp'])
+    for prefix, stats, column in (('hr', hr, 'HR'), ('temp', temp, 'Temp')):
+        if stats is not None:
+            for s in ('mean', 'std', 'slope'):
+                features[f'{prefix}_{s}'] = stats['columns'][column][s]
+    return features
+
+def analyze_dehydration_trend(ring, window_minutes=TREND_WINDOW_MINUTES, now=None):
     # Analyze the last window_minutes of data for risky trends
-    if len(buffer) < 2:
+    if ring is None or len(ring) < 2:
         return "Low", "Not enough data", None
-    now = time.time()
-    window = [entry for entry in buffer if now - entry['timestamp'] <= window_minutes * 60]
-    if len(window) < 2:
+    now = time.time() if now is None else now
+    hr = ring.stats(window_minutes * 60, now, ['HR'], weight_column='HR Quality')
+    stats = ring.stats(window_minutes * 60, now, ['Temp', 'Water Intake', 'Risk'])
+    if stats is None:
         return "Low", "Not enough recent data", None
-    # Calculate trends
-    hr_start, hr_end = window[0]['HR'], window[-1]['HR']
-    temp_start, temp_end = window[0]['Temp'], window[-1]['Temp']
-    water_start, water_end = window[0]['Water Intake'], window[-1]['Water Intake']
-    hr_trend = hr_end - hr_start
-    temp_trend = temp_end - temp_start
-    water_change = water_end - water_start
-    # Use latest ANN prediction if available
-    try:
-        features = [window[-1]['Temp'], window[-1]['HR'], window[-1]['Acc_X'], window[-1]['Acc_Y'], window[-1]['Acc_Z']]
-        columns = ['Temp', 'HR', 'Acc_X', 'Acc_Y', 'Acc_Z']
-        X_df = pd.DataFrame([features], columns=columns)
-        X_scaled = scaler.transform(X_df)
-        ann_pred = ann_model.predict(X_scaled)[0][0]
-    except Exception:
+    # Calculate trends: least-squares change over the window, so one noisy
+    # reading at either end doesn't decide the trend
+    hr_trend = hr['columns']['HR']['slope'] * hr['span_minutes']
+    temp_trend = stats['columns']['Temp']['slope'] * stats['span_minutes']
+    water_end = stats['columns']['Water Intake']['last']
+    # Latest ANN probability, scored when the reading arrived
+    ann_pred = stats['columns']['Risk']['last']
+    if np.isnan(ann_pred):
         ann_pred = None
     # Heuristic rules
     if hr_trend > 10 and temp_trend > 0.5 and water_end < 1.0:
@@ -1646,32 +2075,53 @@ def analyze_dehydration_trend(buffer, window_minutes=20):
 
 @app.route("/predict_dehydration_risk", methods=["GET"])
 def predict_dehydration_risk():
-    global latest_metrics, vitals_buffer
-    # Current status from ANN
-    try:
-        temp = float(latest_metrics.get('Body Temp', 0.0))
-        hr = float(latest_metrics.get('Heart Rate', 0.0))
-        acc_x = float(latest_metrics.get('Acc_X', 0.0))
-        acc_y = float(latest_metrics.get('Acc_Y', 0.0))
-        acc_z = float(latest_metrics.get('Acc_Z', 0.0))
-        water_intake = float(latest_metrics.get('Water Intake', 0.0))
-        features = [temp, hr, acc_x, acc_y, acc_z]
-        columns = ['Temp', 'HR', 'Acc_X', 'Acc_Y', 'Acc_Z']
-        X_df = pd.DataFrame([features], columns=columns)
-        X_scaled = scaler.transform(X_df)
-        prediction = ann_model.predict(X_scaled)[0][0]
-        ann_status = "Dehydrated" if prediction > 0.5 else "Well Hydrated"
-    except Exception as e:
+    # Everything comes from the user's vitals ring; the ANN was scored at ingest
+    ring = vitals_store.get(request.args.get('user_id', last_ingest_user))
+    latest = ring.latest() if ring is not None else None
+    if latest is None or np.isnan(latest['Risk']):
         ann_status = "Unknown"
+    else:
+        ann_status = "Dehydrated" if latest['Risk'] > 0.5 else "Well Hydrated"
     # Trend analysis
-    risk, reason, time_est = analyze_dehydration_trend(vitals_buffer)
+    now = time.time()
+    risk, reason, time_est = analyze_dehydration_trend(ring, now=now)
     return jsonify({
         "current_status": ann_status,
         "future_risk": risk,
         "reason": reason,
-        "time_to_dehydration": f"Approx. {time_est} min" if time_est else None
+        "time_to_dehydration": f"Approx. {time_est} min" if time_est else None,
+        "window_features": ring_window_features(ring, now=now) if latest is not None else None
     })
 
+def ann_hydration_status(data):
+    """ANN prediction plus the water-intake-adjusted hydration status for one reading"""
+    # Map possible alternate names to the correct feature names
+    temp = float(data.get('Temp', data.get('Body Temp', 0)))
+    hr = float(data.get('HR', data.get('Heart Rate', 0)))
+    acc_x = float(data.get('Acc_X', 0))
+    acc_y = float(data.get('Acc_Y', 0))
+    acc_z = float(data.get('Acc_Z', 0))
+    water_intake = float(data.get('Water Intake', 0))
+    prediction = global_ann_risk(temp, hr, acc_x, acc_y, acc_z)
+    ann_status = "Dehydrated" if prediction > 0.5 else "Well Hydrated"
+    # Combine with water intake threshold (1.5L)
+    if water_intake >= 1.5:
+        if ann_status == "Dehydrated":
+            status = "Likely Well Hydrated (good water intake, but physiological signs suggest dehydration)"
+        else:
+            status = "Well Hydrated"
+    else:
+        if ann_status == "Dehydrated":
+            status = "Dehydrated"
+        else:
+            status = "Well Hydrated, but drink more water!"
+    return {
+        "prediction": prediction,
+        "status": status,
+        "ann_status": ann_status,
+        "water_intake": water_intake
+    }
+
 @app.route("/predict_ann", methods=["POST", "GET"])
 def predict_ann():
     if request.method == "POST":
@@ -1679,62 +2129,36 @@ def predict_ann():
     else:
         data = latest_metrics
     try:
-        # Map possible alternate names to the correct feature names
-        temp = float(data.get('Temp', data.get('Body Temp', 0)))
-        hr = float(data.get('HR', data.get('Heart Rate', 0)))
-        acc_x = float(data.get('Acc_X', 0))
-        acc_y = float(data.get('Acc_Y', 0))
-        acc_z = float(data.get('Acc_Z', 0))
-        water_intake = float(data.get('Water Intake', 0))
-        features = [
-            temp,
-            hr,
-            acc_x,
-            acc_y,
-            acc_z
-        ]
-        columns = ['Temp', 'HR', 'Acc_X', 'Acc_Y', 'Acc_Z']
-        X_df = pd.DataFrame([features], columns=columns)
-        X_scaled = scaler.transform(X_df)
-        prediction = ann_model.predict(X_scaled)[0][0]
-        ann_status = "Dehydrated" if prediction > 0.5 else "Well Hydrated"
-        # Combine with water intake threshold (1.5L)
-        if water_intake >= 1.5:
-            if ann_status == "Dehydrated":
-                status = "Likely Well Hydrated (good water intake, but physiological signs suggest dehydration)"
-            else:
-                status = "Well Hydrated"
-        else:
-            if ann_status == "Dehydrated":
-                status = "Dehydrated"
-            else:
-                status = "Well Hydrated, but drink more water!"
-        return jsonify({
-            "prediction": float(prediction),
-            "status": status,
-            "ann_status": ann_status,
-            "water_intake": water_intake
-        })
+        return jsonify(ann_hydration_status(data))
     except Exception as e:
         print("[Flask] ANN prediction error:", e)
         return jsonify({"prediction": "error", "status": "Error", "error": str(e)})
 
+def offline_chat_reply(vitals_str, status_str):
+    """Answer in the assistant's format without the language model (used while it is unavailable)"""
+    advice = ("Drink 250-500 ml of water now and keep sipping regularly."
+              if status_str.startswith("Dehydrated") or "drink more" in status_str
+              else "Keep drinking regularly through the day, more when it is hot or you are active.")
+    return (
+        "The assistant is temporarily unavailable, so here is a quick summary.\n\n"
+        f"1. Current vitals:\n{vitals_str}\n"
+        f"2. Hydration status: {status_str}\n\n"
+        f"3. Advice: {advice}"
+    )
+
 @app.route("/api/chat", methods=["POST"])
 def api_chat():
-    import requests
     data = request.get_json()
     user_message = data.get("message", "")
     if not user_message:
         return jsonify({"error": "Empty message"}), 400
 
-    # Fetch latest vitals and ANN status
-    try:
-        vitals = requests.get("http://localhost:5000/latest_metrics").json()
-    except Exception:
-        vitals = {}
+    # Latest vitals and ANN status, read in-process
+    vitals = dict(latest_metrics)
     try:
-        ann = requests.get("http://localhost:5000/predict_ann").json()
-    except Exception:
+        ann = ann_hydration_status(vitals)
+    except Exception as e:
+        print("[Flask] ANN prediction error:", e)
         ann = {"status": "Unknown", "prediction": None}
     # Build vitals string
     vitals_str = (
@@ -1753,23 +2177,32 @@ def api_chat():
     )
 
     def stream_response():
+        conversation = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+        streamed = False
         try:
-            conversation = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ]
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=conversation,
-                stream=True
-            )
-            for chunk in response:
-                content = chunk.choices[0].delta.content
-                if content:
-                    time.sleep(0.08)
-                    yield content
+            # The call slot is held until the stream ends, so the concurrency limit,
+            # latency and breaker cover the whole response; fails fast while unhealthy
+            with outbound.guard('openai'):
+                response = client.chat.completions.create(
+                    model="gpt-3.5-turbo",
+                    messages=conversation,
+                    stream=True
+                )
+                for chunk in response:
+                    content = chunk.choices[0].delta.content
+                    if content:
+                        time.sleep(0.08)
+                        streamed = True
+                        yield content
         except Exception as e:
-            yield f"[Error] {e}"
+            if streamed:
+                yield f"[Error] {e}"
+            else:
+                print(f"[Flask] Chat model unavailable: {e}")
+                yield offline_chat_reply(vitals_str, status_str)
 
     return Response(stream_response(), mimetype="text/plain")
 
@@ -1784,6 +2217,7 @@ def clear():
 
 # New endpoints for long-term tracking
 @app.route("/user/<user_id>/metrics", methods=["GET"])
+@cached_user_view(response_cache, user_data_version)
 def get_user_metrics_endpoint(user_id):
     """Get user's historical metrics"""
     days = request.args.get('days', 7, type=int)
@@ -1791,13 +2225,14 @@ def get_user_metrics_endpoint(user_id):
     return jsonify(metrics)
 
 @app.route("/user/<user_id>/baseline", methods=["GET"])
+@cached_user_view(response_cache, user_data_version)
 def get_user_baseline_endpoint(user_id):
     """Get user's baseline metrics"""
-    days = request.args.get('days', 30, type=int)
-    baseline = get_user_baseline(user_id, days)
+    baseline = get_user_baseline(user_id)
     return jsonify(baseline)
 
 @app.route("/user/<user_id>/alerts", methods=["GET"])
+@cached_user_view(response_cache, user_data_version)
 def get_user_alerts_endpoint(user_id):
     """Get user's alerts"""
     unread_only = request.args.get('unread_only', 'true').lower() == 'true'
@@ -1815,6 +2250,7 @@ def mark_alert_read(user_id, alert_id):
             UPDATE alerts SET is_read = TRUE 
             WHERE id = ? AND user_id = ?
         ''', (alert_id, user_id))
+        bump_version(conn, user_id)
         conn.commit()
         return jsonify({"status": "success"})
     except Exception as e:
@@ -1829,6 +2265,12 @@ def train_user_model_endpoint(user_id):
     success = train_personal_model(user_id)
     return jsonify({"success": success})
 
+@app.route("/user/<user_id>/train_calibration", methods=["POST"])
+def train_user_calibration_endpoint(user_id):
+    """Fit a user's calibration layer for the shared global model"""
+    success = train_user_calibration(user_id)
+    return jsonify({"success": success})
+
 @app.route("/user/<user_id>/predict", methods=["POST"])
 def predict_user_dehydration_endpoint(user_id):
     """Get personalized dehydration prediction for a user"""
@@ -1848,29 +2290,85 @@ def predict_user_dehydration_endpoint(user_id):
 def get_user_model_status(user_id):
     """Get the status of a user's personal model"""
     model, scaler = load_personal_model(user_id)
-    user_metrics = get_user_metrics(user_id, days=30)
+    conn = get_db()
+    try:
+        total_records = count_training_rows(conn, user_id, days=30)
+    finally:
+        conn.close()
     
     return jsonify({
         "has_personal_model": model is not None,
-        "total_records": len(user_metrics),
-        "model_type": "personal" if model is not None else "global"
+        "has_calibration": user_id in calibration_table,
+        "total_records": total_records,
+        "model_type": "personal" if model is not None else "calibrated" if user_id in calibration_table else "global"
     })
 
+@app.route("/user/<user_id>/profile", methods=["POST"])
+def update_user_profile(user_id):
+    """Set the age, gender and physical activity that define a user's cohort"""
+    data = request.get_json() or {}
+    age = data.get('age')
+    gender = data.get('gender')
+    active = data.get('physically_active')
+    if isinstance(active, str):
+        active = active.strip().lower() in ('yes', 'y', 'true', '1')
+    conn = get_db()
+    try:
+        conn.execute('''
+            INSERT INTO users (user_id, age, gender, physically_active)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                age = excluded.age, gender = excluded.gender, physically_active = excluded.physically_active
+        ''', (user_id, int(age) if age is not None else None, gender, None if active is None else int(bool(active))))
+        conn.commit()
+        cohort_sketches.set_profile(user_id, int(age) if age is not None else None, gender, active)
+        # Save the summary now so a restart finds the user even before PERSIST_EVERY readings
+        cohort_sketches.save_user(conn, user_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        conn.close()
+    return jsonify({"status": "success"})
+
+@app.route("/user/<user_id>/cohort", methods=["GET"])
+def get_user_cohort(user_id):
+    """HR/temperature/water percentiles of similar users and where this user falls in them"""
+    by = request.args.get('by', 'age,gender,activity').split(',')
+    return jsonify(cohort_sketches.compare(user_id, by=[d.strip() for d in by]))
+
+@app.route("/user/<user_id>/hrv", methods=["GET"])
+def get_user_hrv(user_id):
+    """Live HRV metrics from the user's streamed RR intervals"""
+    now = time.time()
+    windows = {f"{int(w)}s": hrv_registry.metrics(user_id, w, now=now) for w in hrv_registry.windows}
+    if windows and all(m is None for m in windows.values()):
+        return jsonify({"error": "No RR intervals received for this user"}), 404
+    return jsonify({"user_id": user_id, "windows": windows})
+
 # New endpoints for advanced features
 @app.route("/user/<user_id>/analytics", methods=["GET"])
+@cached_user_view(response_cache, user_data_version)
 def get_user_analytics_endpoint(user_id):
     """Get comprehensive analytics for a user"""
     days = request.args.get('days', 30, type=int)
     analytics = generate_advanced_analytics(user_id, days)
     return jsonify(analytics)
 
+@app.route("/user/<user_id>/insights", methods=["GET"])
+@cached_user_view(response_cache, user_data_version)
+def get_user_insights_endpoint(user_id):
+    """Insight cards for the dashboard from the live anomaly engine"""
+    return jsonify(generate_insights(user_id))
+
 @app.route("/user/<user_id>/achievements", methods=["GET"])
+@cached_user_view(response_cache, user_data_version)
 def get_user_achievements_endpoint(user_id):
     """Get user's achievements"""
     achievements = get_user_achievements(user_id)
     return jsonify(achievements)
 
 @app.route("/user/<user_id>/activity_correlation", methods=["GET"])
+@cached_user_view(response_cache, user_data_version)
 def get_activity_correlation_endpoint(user_id):
     """Get activity-hydration correlation analysis"""
     days = request.args.get('days', 7, type=int)
@@ -1882,11 +2380,20 @@ def get_weather_endpoint():
     """Get current weather data"""
     lat = request.args.get('lat', type=float)
     lon = request.args.get('lon', type=float)
-    weather = get_weather_data(lat, lon)
+    weather = get_weather_data(lat, lon, wait_s=5.0)
     return jsonify(weather)
 
+@app.route("/dependencies", methods=["GET"])
+def get_dependencies_endpoint():
+    """Health, latency and error metrics of external services"""
+    return jsonify({
+        "dependencies": outbound.metrics(),
+        "weather_cache": weather_cache.stats()
+    })
+
 # New endpoints for notifications
 @app.route("/user/<user_id>/notifications", methods=["GET"])
+@cached_user_view(response_cache, user_data_version)
 def get_user_notifications_endpoint(user_id):
     """Get user's notifications"""
     unread_only = request.args.get('unread_only', 'true').lower() == 'true'
@@ -1896,16 +2403,25 @@ def get_user_notifications_endpoint(user_id):
 @app.route("/user/<user_id>/notifications/<notification_id>/read", methods=["POST"])
 def mark_notification_read_endpoint(user_id, notification_id):
     """Mark a notification as read"""
-    success = mark_notification_read(notification_id)
+    success = mark_notification_read(notification_id, user_id)
     return jsonify({"success": success})
 
 # New endpoints for ensemble models
 @app.route("/user/<user_id>/train_ensemble", methods=["POST"])
 def train_ensemble_model_endpoint(user_id):
     """Train an ensemble model for a user"""
-    success = train_ensemble_model(user_id)
+    mode = request.args.get('mode', 'auto')
+    time_budget = request.args.get('time_budget', 60.0, type=float)
+    success = train_ensemble_model(user_id, mode=mode, time_budget_s=time_budget)
     return jsonify({"success": success})
 
+@app.route("/user/<user_id>/ensemble_comparison", methods=["GET"])
+def ensemble_comparison_endpoint(user_id):
+    """Compare exact vs scalable ensemble accuracy and fit time on the user's data"""
+    time_budget = request.args.get('time_budget', 60.0, type=float)
+    report = compare_ensemble_modes(user_id, time_budget)
+    return jsonify(report)
+
 @app.route("/user/<user_id>/predict_future", methods=["POST"])
 def predict_future_dehydration_endpoint(user_id):
     """Get future dehydration prediction for a user"""
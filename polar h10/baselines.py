@@ -0,0 +1,163 @@
+import threading
+import numpy as np
+
+# Per-user robust baselines: p10/p50/p90 of each vital and of water intake.
+# Each quantile is an exponentially weighted tracker: it steps up by
+# STEP * scale * q when a reading is above it and down by STEP * scale * (1 - q)
+# when below, so it settles where a fraction q of recent readings fall below.
+# The scale is the tracked p10-p90 spread, so steps fit the signal's units. A
+# user costs 12 floats plus counts, updates and reads are O(1), and outliers
+# move the quantiles by one small step at most.
+#
+# The first WARMUP readings are kept and their exact percentiles start the
+# trackers. Users seen before the trackers existed are seeded once from their
+# stored metrics; after that state lives in memory and in user_baselines.
+
+VITALS = ('heart_rate', 'body_temp', 'steps', 'water_intake')  # user_metrics columns
+QUANTILES = np.array([0.1, 0.5, 0.9])
+# Readings at or below these are missing values (the app sends 0 when a sensor has no data)
+MISSING_AT_OR_BELOW = np.array([0.0, 0.0, -1.0, -1.0])
+# Smallest spread used for step sizes, in each vital's units
+SCALE_FLOOR = np.array([2.0, 0.1, 100.0, 0.1])
+STEP = 0.02
+WARMUP = 20
+MIN_READINGS = 10  # fewer readings than this and a vital has no baseline
+SEED_DAYS = 30
+PERSIST_EVERY = 20
+SPREAD_TO_SIGMA = 2.563  # p90 - p10 of a normal distribution in standard deviations
+
+
+def init_baseline_table(conn):
+    """Create the per-user quantile baseline table"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_baselines (
+            user_id TEXT PRIMARY KEY,
+            counts BLOB NOT NULL,
+            quantiles BLOB NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+
+class _UserBaseline:
+    __slots__ = ('quantiles', 'counts', 'warmup', 'unsaved')
+
+    def __init__(self):
+        self.quantiles = np.zeros((len(VITALS), len(QUANTILES)))
+        self.counts = np.zeros(len(VITALS), dtype=np.int64)
+        self.warmup = [[] for _ in VITALS]
+        self.unsaved = 0
+
+    def seed(self, values):
+        """Start from exact percentiles of an (n, len(VITALS)) array of stored readings"""
+        for i in range(len(VITALS)):
+            x = values[:, i]
+            x = x[~np.isnan(x) & (x > MISSING_AT_OR_BELOW[i])]
+            if len(x) >= WARMUP:
+                self.quantiles[i] = np.percentile(x, 100 * QUANTILES)
+                self.counts[i] = len(x)
+                self.warmup[i] = []
+            else:
+                self.warmup[i] = x.tolist()
+                self.counts[i] = len(x)
+                if len(x):
+                    self.quantiles[i] = np.percentile(x, 100 * QUANTILES)
+
+    def update(self, i, x):
+        self.counts[i] += 1
+        q = self.quantiles[i]
+        if self.warmup[i] is not None and self.counts[i] <= WARMUP:
+            self.warmup[i].append(x)
+            q[:] = np.percentile(self.warmup[i], 100 * QUANTILES)
+            if self.counts[i] == WARMUP:
+                self.warmup[i] = None
+            return
+        scale = max((q[-1] - q[0]) / SPREAD_TO_SIGMA, SCALE_FLOOR[i])
+        q += STEP * scale * (QUANTILES - (x < q))
+        q.sort()
+
+
+class QuantileBaselines:
+    """p10/p50/p90 baselines for every user"""
+
+    def __init__(self):
+        self.users = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.users)
+
+    def _user(self, conn, user_id):
+        """A user's state; seeded from stored metrics the first time a user without saved state is seen"""
+        user = self.users.get(user_id)
+        if user is None:
+            user = _UserBaseline()
+            if conn is not None:
+                rows = conn.execute(
+                    'SELECT ' + ', '.join(VITALS) + " FROM user_metrics WHERE user_id = ? "
+                    "AND timestamp >= datetime('now', '-{} days')".format(SEED_DAYS), (user_id,)).fetchall()
+                user.seed(np.array(rows, dtype=np.float64).reshape(-1, len(VITALS)))
+            with self._lock:
+                user = self.users.setdefault(user_id, user)
+        return user
+
+    def seed_user(self, conn, user_id):
+        """Seed a first-seen user from stored metrics; call before storing a new row so the seed doesn't include it"""
+        self._user(conn, user_id)
+
+    def update(self, conn, user_id, row):
+        """Add one stored reading (dict of user_metrics column -> value); persists every PERSIST_EVERY readings"""
+        user = self._user(conn, user_id)
+        with self._lock:
+            for i, vital in enumerate(VITALS):
+                value = row.get(vital)
+                if value is None or not value > MISSING_AT_OR_BELOW[i]:
+                    continue
+                user.update(i, float(value))
+            user.unsaved += 1
+            save = conn is not None and user.unsaved >= PERSIST_EVERY
+        if save:
+            self.save_user(conn, user_id)
+
+    def get(self, conn, user_id):
+        """{vital: {'p10', 'p50', 'p90', 'count'}} for vitals with enough readings, or None"""
+        user = self._user(conn, user_id)
+        with self._lock:
+            baseline = {
+                vital: dict(zip(('p10', 'p50', 'p90'), user.quantiles[i].tolist()), count=int(user.counts[i]))
+                for i, vital in enumerate(VITALS) if user.counts[i] >= MIN_READINGS
+            }
+        return baseline or None
+
+    def save_user(self, conn, user_id):
+        with self._lock:
+            user = self.users.get(user_id)
+            if user is None:
+                return
+            counts, quantiles = user.counts.tobytes(), user.quantiles.tobytes()
+            user.unsaved = 0
+        conn.execute(
+            'INSERT OR REPLACE INTO user_baselines (user_id, counts, quantiles, updated_at) '
+            "VALUES (?, ?, ?, datetime('now'))",
+            (user_id, counts, quantiles)
+        )
+        conn.commit()
+
+    def load(self, conn):
+        """Load every user's saved baselines"""
+        rows = conn.execute('SELECT user_id, counts, quantiles FROM user_baselines').fetchall()
+        for user_id, counts, quantiles in rows:
+            user = _UserBaseline()
+            user.counts = np.frombuffer(counts, dtype=np.int64).copy()
+            user.quantiles = np.frombuffer(quantiles, dtype=np.float64).reshape(len(VITALS), -1).copy()
+            # The warmup readings aren't saved: vitals that hadn't finished warming
+            # up (or were never seen) start their warmup again
+            user.warmup = [None] * len(VITALS)
+            for i in range(len(VITALS)):
+                if user.counts[i] < WARMUP:
+                    user.warmup[i], user.counts[i], user.quantiles[i] = [], 0, 0.0
+            with self._lock:
+                self.users[user_id] = user
+        return len(rows)
+
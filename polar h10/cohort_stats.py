@@ -0,0 +1,301 @@
+import sqlite3
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# "How does this user compare to similar users": per-user mergeable summaries
+# of HR, temperature and water intake, grouped into cohorts by age band, gender
+# and whether the user is physically active (the subject-info.csv attributes).
+#
+# A summary is, per signal, the moments (count, sum, sum of squares) plus a
+# fixed-bin histogram over the signal's physiological range. Both merge by
+# addition and un-merge by subtraction, so every cohort cell (one age band x
+# gender x activity combination) keeps a running total that ingest updates in
+# O(1) and a profile change moves between cells. A cohort query merges at most
+# a few dozen cells, so it takes well under a millisecond regardless of how
+# many users or samples there are. Percentiles are read from the merged
+# histogram; the error is at most one bin (0.75 bpm, 0.05 C, 0.03 L).
+
+SIGNALS = ('HR', 'Temp', 'Water Intake')
+# Histogram range per signal; readings outside it fall into the edge bins
+RANGES = {'HR': (30.0, 222.0), 'Temp': (32.0, 44.8), 'Water Intake': (0.0, 7.68)}
+# Readings at or below these are missing values (the app sends 0 when a sensor has no data)
+MISSING_AT_OR_BELOW = {'HR': 0.0, 'Temp': 0.0, 'Water Intake': -1.0}
+N_BINS = 256
+PERCENTILES = (10, 25, 50, 75, 90)
+
+AGE_BANDS = ((0, 25, '<25'), (25, 35, '25-34'), (35, 50, '35-49'), (50, 200, '50+'))
+DIMENSIONS = ('age', 'gender', 'activity')
+# Write a user's summary to the database every this many readings
+PERSIST_EVERY = 20
+
+_LO = np.array([RANGES[s][0] for s in SIGNALS])
+_WIDTH = np.array([(RANGES[s][1] - RANGES[s][0]) / N_BINS for s in SIGNALS])
+_MISSING = np.array([MISSING_AT_OR_BELOW[s] for s in SIGNALS])
+
+
+def init_sketch_table(conn):
+    """Create the per-user summary table and the profile columns cohorts are defined by"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_sketches (
+            user_id TEXT PRIMARY KEY,
+            moments BLOB NOT NULL,
+            hist BLOB NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    existing = {row[1] for row in conn.execute('PRAGMA table_info(users)')}
+    for column, kind in (('age', 'INTEGER'), ('gender', 'TEXT'), ('physically_active', 'INTEGER')):
+        if existing and column not in existing:
+            conn.execute(f'ALTER TABLE users ADD COLUMN {column} {kind}')
+    conn.commit()
+
+
+def age_band(age):
+    if age is None:
+        return None
+    for lo, hi, name in AGE_BANDS:
+        if lo <= age < hi:
+            return name
+    return None
+
+
+def cohort_key(age=None, gender=None, physically_active=None):
+    """(age band, gender, activity) with None for unknown attributes"""
+    gender = str(gender).strip().lower()[:1] if gender else None
+    if isinstance(physically_active, str):
+        physically_active = physically_active.strip().lower() in ('yes', 'y', 'true', '1')
+    activity = None if physically_active is None else ('active' if physically_active else 'inactive')
+    return age_band(age), gender if gender in ('m', 'f') else None, activity
+
+
+def empty_summary():
+    return np.zeros((len(SIGNALS), 3)), np.zeros((len(SIGNALS), N_BINS), dtype=np.int64)
+
+
+def summarize(values):
+    """(moments, hist) of an (n, len(SIGNALS)) array of readings"""
+    values = np.asarray(values, dtype=np.float64).reshape(-1, len(SIGNALS))
+    moments, hist = empty_summary()
+    valid = values > _MISSING
+    # Clip before the cast: missing values (-inf, NaN) have no integer bin
+    bins = np.clip(np.nan_to_num((values - _LO) / _WIDTH), 0, N_BINS - 1).astype(np.int64)
+    for i in range(len(SIGNALS)):
+        x = values[valid[:, i], i]
+        moments[i] = len(x), x.sum(), (x * x).sum()
+        hist[i] = np.bincount(bins[valid[:, i], i], minlength=N_BINS)
+    return moments, hist
+
+
+def describe(moments, hist, user_median=None):
+    """count/mean/std/percentiles per signal of a merged summary"""
+    out = {}
+    for i, signal in enumerate(SIGNALS):
+        n, s1, s2 = moments[i]
+        if n == 0:
+            out[signal] = None
+            continue
+        mean = s1 / n
+        variance = max(s2 / n - mean * mean, 0.0) * n / (n - 1) if n > 1 else 0.0
+        # Percentiles by linear interpolation within the bin that crosses each rank
+        cumulative = np.cumsum(hist[i])
+        edges = _LO[i] + np.arange(N_BINS + 1) * _WIDTH[i]
+        stats = {'count': int(n), 'mean': float(mean), 'std': float(variance ** 0.5)}
+        for p in PERCENTILES:
+            rank = p / 100.0 * cumulative[-1]
+            b = int(np.searchsorted(cumulative, rank, side='left'))
+            below = cumulative[b - 1] if b > 0 else 0
+            fraction = (rank - below) / hist[i, b] if hist[i, b] else 0.5
+            stats[f'p{p}'] = float(edges[b] + fraction * _WIDTH[i])
+        if user_median is not None and user_median.get(signal) is not None:
+            # Share of the cohort's readings below the user's median
+            b = int(np.clip((user_median[signal] - _LO[i]) // _WIDTH[i], 0, N_BINS - 1))
+            below = (cumulative[b - 1] if b > 0 else 0) + 0.5 * hist[i, b]
+            stats['user_percentile'] = float(100.0 * below / cumulative[-1])
+        out[signal] = stats
+    return out
+
+
+class CohortSketches:
+    """Per-user summaries plus running totals per cohort cell"""
+
+    def __init__(self):
+        self.users = {}  # user_id -> [moments, hist, cohort key, readings since last save]
+        self.cells = {}  # cohort key -> (moments, hist, n_users)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.users)
+
+    def _cell(self, key):
+        cell = self.cells.get(key)
+        if cell is None:
+            moments, hist = empty_summary()
+            cell = self.cells[key] = [moments, hist, 0]
+        return cell
+
+    def _entry(self, user_id):
+        entry = self.users.get(user_id)
+        if entry is None:
+            moments, hist = empty_summary()
+            entry = self.users[user_id] = [moments, hist, (None, None, None), 0]
+            self._cell(entry[2])[2] += 1
+        return entry
+
+    def set_summary(self, user_id, moments, hist):
+        """Replace a user's summary (loading or rebuilding)"""
+        with self._lock:
+            entry = self._entry(user_id)
+            cell = self._cell(entry[2])
+            cell[0] += moments - entry[0]
+            cell[1] += hist - entry[1]
+            entry[0], entry[1], entry[3] = moments.copy(), hist.copy(), 0
+
+    def set_profile(self, user_id, age=None, gender=None, physically_active=None):
+        """Move a user to the cohort cell of their (new) profile"""
+        key = cohort_key(age, gender, physically_active)
+        with self._lock:
+            entry = self._entry(user_id)
+            if entry[2] == key:
+                return
+            old, new = self._cell(entry[2]), self._cell(key)
+            old[0] -= entry[0]
+            old[1] -= entry[1]
+            old[2] -= 1
+            new[0] += entry[0]
+            new[1] += entry[1]
+            new[2] += 1
+            entry[2] = key
+
+    def add(self, user_id, reading, conn=None):
+        """Add one reading (dict of signal -> value); persists the user's summary every PERSIST_EVERY readings"""
+        values = np.array([float(reading.get(s) if reading.get(s) is not None else -np.inf) for s in SIGNALS])
+        valid = values > _MISSING
+        bins = np.clip(((values[valid] - _LO[valid]) / _WIDTH[valid]).astype(np.int64), 0, N_BINS - 1)
+        rows = np.flatnonzero(valid)
+        delta = np.stack([np.ones(len(rows)), values[valid], values[valid] ** 2], axis=1)
+        with self._lock:
+            entry = self._entry(user_id)
+            cell = self._cell(entry[2])
+            for summary in (entry, cell):
+                summary[0][rows] += delta
+                summary[1][rows, bins] += 1
+            entry[3] += 1
+            save = conn is not None and entry[3] >= PERSIST_EVERY
+        if save:
+            self.save_user(conn, user_id)
+
+    def save_user(self, conn, user_id):
+        with self._lock:
+            entry = self.users.get(user_id)
+            if entry is None:
+                return
+            moments, hist = entry[0].tobytes(), entry[1].tobytes()
+            entry[3] = 0
+        conn.execute(
+            'INSERT OR REPLACE INTO user_sketches (user_id, moments, hist, updated_at) '
+            "VALUES (?, ?, ?, datetime('now'))",
+            (user_id, moments, hist)
+        )
+        conn.commit()
+
+    def load(self, conn):
+        """Load every user's summary and profile from the database"""
+        rows = conn.execute('SELECT user_id, moments, hist FROM user_sketches').fetchall()
+        shape = (len(SIGNALS), -1)
+        for user_id, moments, hist in rows:
+            self.set_summary(user_id, np.frombuffer(moments, dtype=np.float64).reshape(shape),
+                             np.frombuffer(hist, dtype=np.int64).reshape(shape))
+        # Every user with a profile, including those whose summary hasn't been saved yet
+        for user_id, age, gender, active in conn.execute(
+                'SELECT user_id, age, gender, physically_active FROM users '
+                'WHERE age IS NOT NULL OR gender IS NOT NULL OR physically_active IS NOT NULL'):
+            self.set_profile(user_id, age, gender, None if active is None else bool(active))
+        return len(rows)
+
+    def query(self, key, by=DIMENSIONS):
+        """Merged summary of the cells matching key on the `by` dimensions; unknown key parts match anything"""
+        wanted = [(i, key[i]) for i, dim in enumerate(DIMENSIONS) if dim in by and key[i] is not None]
+        moments, hist = empty_summary()
+        n_users = 0
+        with self._lock:
+            for cell_key, (cell_moments, cell_hist, cell_users) in self.cells.items():
+                if all(cell_key[i] == value for i, value in wanted):
+                    moments += cell_moments
+                    hist += cell_hist
+                    n_users += cell_users
+        return moments, hist, n_users, {DIMENSIONS[i]: value for i, value in wanted}
+
+    def compare(self, user_id, by=DIMENSIONS):
+        """Cohort percentiles for a user's cohort and where the user's own median falls in them"""
+        entry = self.users.get(user_id)
+        key = entry[2] if entry is not None else (None, None, None)
+        user_median = None
+        if entry is not None:
+            own = describe(entry[0], entry[1])
+            user_median = {s: own[s]['p50'] if own[s] else None for s in SIGNALS}
+        moments, hist, n_users, cohort = self.query(key, by)
+        return {'cohort': cohort, 'n_users': n_users, 'user_median': user_median,
+                'signals': describe(moments, hist, user_median)}
+
+
+def _summarize_users(db_path, user_ids):
+    """Worker: summaries rebuilt from user_metrics for a batch of users"""
+    conn = sqlite3.connect(db_path)
+    try:
+        out = []
+        for user_id in user_ids:
+            rows = conn.execute('SELECT heart_rate, body_temp, water_intake FROM user_metrics WHERE user_id = ?',
+                                (user_id,)).fetchall()
+            values = np.array(rows, dtype=np.float64).reshape(-1, len(SIGNALS))
+            out.append((user_id,) + summarize(np.nan_to_num(values, nan=-np.inf)))
+        return out
+    finally:
+        conn.close()
+
+
+def rebuild(db_path, sketches=None, workers=None, batch_size=200):
+    """Recompute every user's summary from user_metrics and persist them
+
+    With workers > 1 batches of users are summarized in a process pool.
+    """
+    sketches = sketches if sketches is not None else CohortSketches()
+    conn = sqlite3.connect(db_path)
+    try:
+        init_sketch_table(conn)
+        user_ids = [row[0] for row in conn.execute('SELECT DISTINCT user_id FROM user_metrics')]
+        batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+        if workers and workers > 1 and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_summarize_users, [db_path] * len(batches), batches))
+        else:
+            results = [_summarize_users(db_path, batch) for batch in batches]
+        for batch in results:
+            for user_id, moments, hist in batch:
+                sketches.set_summary(user_id, moments, hist)
+        conn.executemany(
+            'INSERT OR REPLACE INTO user_sketches (user_id, moments, hist, updated_at) '
+            "VALUES (?, ?, ?, datetime('now'))",
+            [(u, m.tobytes(), h.tobytes()) for batch in results for u, m, h in batch]
+        )
+        conn.commit()
+        for user_id, age, gender, active in conn.execute('SELECT user_id, age, gender, physically_active FROM users'):
+            if user_id in sketches.users:
+                sketches.set_profile(user_id, age, gender, None if active is None else bool(active))
+        return sketches
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Rebuild per-user cohort summaries from user_metrics")
+    parser.add_argument("database", nargs="?", default="health_data.db")
+    parser.add_argument("--workers", type=int, default=None, help="processes for the rebuild")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    sketches = rebuild(args.database, workers=args.workers)
+    print(f"✅ Rebuilt summaries for {len(sketches)} users in {time.perf_counter() - started:.2f}s")
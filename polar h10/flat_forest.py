@@ -0,0 +1,157 @@
+import numpy as np
+
+# Flat-array export of fitted sklearn forests for fast single-row inference.
+# All trees are packed into contiguous node arrays and evaluated together, one
+# tree level per step, instead of going through sklearn's per-tree dispatch.
+
+
+def _threshold_to_float32(threshold):
+    # sklearn compares float32 features against float64 thresholds. Rounding the
+    # threshold *down* to float32 keeps x <= t identical for every float32 x.
+    t32 = threshold.astype(np.float32)
+    too_high = t32.astype(np.float64) > threshold
+    t32[too_high] = np.nextafter(t32[too_high], np.float32(-np.inf))
+    return t32
+
+
+class FlatForest:
+    """RandomForestClassifier packed into flat node arrays
+
+    feature, threshold, left, right and value are indexed by global node id;
+    roots holds the node id of each tree's root. Leaves point left/right at
+    themselves so every tree can be stepped the same number of times.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, depth, classes):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.depth = int(depth)
+        self.classes_ = classes
+        self.n_features_in_ = int(feature.max()) + 1 if len(feature) else 0
+        # children[2 * node] is the right child, children[2 * node + 1] the left one
+        self._children = np.stack([right, left], axis=1).ravel().astype(np.int64)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Export a fitted RandomForestClassifier"""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left < 0
+            own = np.arange(offset, offset + n, dtype=np.int32)
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(_threshold_to_float32(np.where(is_leaf, 0.0, tree.threshold)))
+            lefts.append(np.where(is_leaf, own, tree.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, own, tree.children_right + offset).astype(np.int32))
+
+            # Per-node class distribution, normalised the same way predict_proba does
+            value = tree.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            values.append((value / totals).astype(np.float32))
+
+            roots.append(offset)
+            depth = max(depth, tree.max_depth)
+            offset += n
+
+        return cls(
+            np.concatenate(features),
+            np.concatenate(thresholds),
+            np.concatenate(lefts),
+            np.concatenate(rights),
+            np.concatenate(values),
+            np.array(roots, dtype=np.int32),
+            depth,
+            np.asarray(forest.classes_)
+        )
+
+    def apply(self, X):
+        """Leaf node id reached in every tree, shape (n_rows, n_trees)"""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+
+        # Work on flat (row, tree) arrays with take(), which is much cheaper than
+        # 2-D fancy indexing when there is only one row
+        flat_x = X.ravel()
+        row_base = np.repeat(np.arange(n_rows, dtype=np.int64) * n_features, n_trees)
+        node = np.tile(self.roots.astype(np.int64), n_rows)
+        for _ in range(self.depth):
+            go_left = flat_x.take(row_base + self.feature.take(node)) <= self.threshold.take(node)
+            node = self._children.take(2 * node + go_left)
+        return node.reshape(n_rows, n_trees)
+
+    def predict_proba(self, X):
+        """Class probabilities averaged over trees, matching RandomForestClassifier.predict_proba"""
+        leaves = self.apply(X)
+        return self.value[leaves].mean(axis=1, dtype=np.float64)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def to_arrays(self):
+        """The node arrays as a dict, for saving or embedding in a larger artifact"""
+        return {
+            'feature': self.feature, 'threshold': self.threshold,
+            'left': self.left, 'right': self.right, 'value': self.value,
+            'roots': self.roots, 'depth': np.array(self.depth), 'classes': self.classes_
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(
+            arrays['feature'], arrays['threshold'], arrays['left'], arrays['right'],
+            arrays['value'], arrays['roots'], arrays['depth'], arrays['classes']
+        )
+
+    def save(self, path):
+        """Write the node arrays to a compressed .npz file"""
+        np.savez_compressed(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_arrays(data)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left,
+                                      self.right, self.value, self.roots))
+
+
+class CompiledVoting:
+    """Soft-voting ensemble whose forest members are FlatForests"""
+
+    def __init__(self, estimators, weights=None):
+        self.estimators = estimators
+        self.weights = weights
+        self.classes_ = estimators[0].classes_
+
+    def predict_proba(self, X):
+        probas = [est.predict_proba(X) for est in self.estimators]
+        return np.average(probas, axis=0, weights=self.weights)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def compile_model(model):
+    """Swap sklearn forests for FlatForests; anything else is returned unchanged"""
+    from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+
+    if isinstance(model, RandomForestClassifier):
+        return FlatForest.from_sklearn(model)
+    if isinstance(model, VotingClassifier) and model.voting == 'soft':
+        return CompiledVoting([compile_model(est) for est in model.estimators_], model.weights)
+    return model
+
@@ -0,0 +1,189 @@
+import threading
+import time
+
+# Streaming heart-rate variability for live RR intervals (e.g. Polar H10).
+# Each user keeps a fixed-size ring buffer of accepted beats and, per sliding
+# time window, running sums of RR, RR^2 and successive differences. Adding a
+# beat and evicting the ones that left a window are O(1) each, so metrics are
+# always current without recomputing over the window.
+#
+# A successive difference is attributed to the later beat and only counts while
+# both beats are inside the window.
+
+MIN_RR_MS = 300.0
+MAX_RR_MS = 2000.0
+# A beat whose RR differs from the running reference by more than this fraction is ectopic/artifact
+ECTOPIC_FRACTION = 0.2
+# After this many rejections in a row the reference is reset (a real change in heart rate)
+MAX_CONSECUTIVE_REJECTS = 5
+REFERENCE_ALPHA = 0.1
+NN50_MS = 50.0
+# Smoothing of the recent rejection rate (about the last 20 beats)
+REJECT_RATE_ALPHA = 0.05
+
+DEFAULT_WINDOWS = (60.0, 300.0)
+
+
+class _WindowSums:
+    __slots__ = ('seconds', 'start', 'n', 's1', 's2', 'pairs', 'd2', 'nn50')
+
+    def __init__(self, seconds, start=0):
+        self.seconds = seconds
+        self.start = start  # absolute index of the oldest beat in the window
+        self.n = 0
+        self.s1 = 0.0
+        self.s2 = 0.0
+        self.pairs = 0
+        self.d2 = 0.0
+        self.nn50 = 0
+
+
+class StreamingHRV:
+    """RMSSD, SDNN and mean RR over sliding time windows with O(1) updates per beat"""
+
+    def __init__(self, windows=DEFAULT_WINDOWS):
+        self.windows = {float(w): _WindowSums(float(w)) for w in windows}
+        # Enough slots for the longest window at the fastest plausible heart rate
+        self.capacity = int(max(self.windows) * 1000.0 / MIN_RR_MS) + 2
+        self._t = [0.0] * self.capacity
+        self._rr = [0.0] * self.capacity
+        self._diff = [None] * self.capacity  # rr - previous rr, or None when not paired
+        self.count = 0  # absolute index of the next beat
+        self.last_time = None
+        self._last_rr = None
+        self._reference = None
+        self._consecutive_rejects = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.reject_rate = 0.0
+        self._lock = threading.Lock()
+
+    def _is_artifact(self, rr):
+        if rr < MIN_RR_MS or rr > MAX_RR_MS:
+            return True
+        if self._reference is not None and abs(rr - self._reference) > ECTOPIC_FRACTION * self._reference:
+            if self._consecutive_rejects < MAX_CONSECUTIVE_REJECTS:
+                return True
+            self._reference = rr  # sustained change, not an ectopic beat
+        return False
+
+    def _evict(self, window, index):
+        """Remove beat `index` (the oldest) from a window"""
+        slot = index % self.capacity
+        rr = self._rr[slot]
+        window.n -= 1
+        window.s1 -= rr
+        window.s2 -= rr * rr
+        # The next beat's difference was paired with this one; it leaves the window too
+        nxt = index + 1
+        if nxt < self.count:
+            d = self._diff[nxt % self.capacity]
+            if d is not None:
+                window.pairs -= 1
+                window.d2 -= d * d
+                window.nn50 -= abs(d) > NN50_MS
+        window.start = nxt
+
+    def add_beat(self, rr_ms, t):
+        """Add one RR interval (ms) ending at time t (s); returns False if it was rejected"""
+        rr = float(rr_ms)
+        with self._lock:
+            if self._is_artifact(rr):
+                self.rejected += 1
+                self.reject_rate += REJECT_RATE_ALPHA * (1.0 - self.reject_rate)
+                self._consecutive_rejects += 1
+                self._last_rr = None  # differences never span a rejected beat
+                return False
+            self._consecutive_rejects = 0
+            self.accepted += 1
+            self.reject_rate -= REJECT_RATE_ALPHA * self.reject_rate
+            self._reference = rr if self._reference is None else self._reference + REFERENCE_ALPHA * (rr - self._reference)
+
+            if self.last_time is not None and t <= self.last_time:
+                t = self.last_time + 1e-3
+            index = self.count
+            slot = index % self.capacity
+            d = None if self._last_rr is None else rr - self._last_rr
+            self._t[slot] = t
+            self._rr[slot] = rr
+            self._diff[slot] = d
+            self.count = index + 1
+            self.last_time = t
+            self._last_rr = rr
+
+            for window in self.windows.values():
+                paired = d is not None and index - 1 >= window.start
+                window.n += 1
+                window.s1 += rr
+                window.s2 += rr * rr
+                if paired:
+                    window.pairs += 1
+                    window.d2 += d * d
+                    window.nn50 += abs(d) > NN50_MS
+                cutoff = t - window.seconds
+                while window.start < self.count and (self._t[window.start % self.capacity] <= cutoff
+                                                     or self.count - window.start > self.capacity):
+                    self._evict(window, window.start)
+            return True
+
+    def add_rr(self, rr_list_ms, received_at=None):
+        """Add a batch of RR intervals whose last beat ended at received_at; returns how many were accepted"""
+        received_at = time.time() if received_at is None else received_at
+        # Place the beats backwards from the receive time
+        ends = []
+        t = received_at
+        for rr in reversed(rr_list_ms):
+            ends.append(t)
+            t -= float(rr) / 1000.0
+        return sum(self.add_beat(rr, t) for rr, t in zip(rr_list_ms, reversed(ends)))
+
+    def metrics(self, window_s=None, now=None):
+        """Current metrics for one window (default: the shortest)"""
+        with self._lock:
+            window = self.windows[float(window_s) if window_s is not None else min(self.windows)]
+            if now is not None:
+                # Drop beats that aged out since the last beat arrived
+                cutoff = now - window.seconds
+                while window.start < self.count and self._t[window.start % self.capacity] <= cutoff:
+                    self._evict(window, window.start)
+            n, pairs = window.n, window.pairs
+            mean_rr = window.s1 / n if n else None
+            variance = max(window.s2 - n * mean_rr * mean_rr, 0.0) / (n - 1) if n > 1 else None
+            return {
+                'window_s': window.seconds,
+                'n_beats': n,
+                'mean_rr_ms': mean_rr,
+                'mean_hr': 60000.0 / mean_rr if mean_rr else None,
+                'sdnn_ms': variance ** 0.5 if variance is not None else None,
+                'rmssd_ms': (window.d2 / pairs) ** 0.5 if pairs else None,
+                'pnn50': 100.0 * window.nn50 / pairs if pairs else None,
+                'rejected_fraction': self.reject_rate,
+            }
+
+
+class LiveHRVRegistry:
+    """One StreamingHRV per user, created on first beat"""
+
+    def __init__(self, windows=DEFAULT_WINDOWS):
+        self.windows = windows
+        self._estimators = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id, create=True):
+        estimator = self._estimators.get(user_id)
+        if estimator is None and create:
+            with self._lock:
+                estimator = self._estimators.setdefault(user_id, StreamingHRV(self.windows))
+        return estimator
+
+    def add_rr(self, user_id, rr_list_ms, received_at=None):
+        return self.get(user_id).add_rr(rr_list_ms, received_at)
+
+    def metrics(self, user_id, window_s=None, now=None):
+        """Metrics for a user, or None if no beats were ever received"""
+        estimator = self.get(user_id, create=False)
+        return estimator.metrics(window_s, now) if estimator is not None else None
+
+    def __len__(self):
+        return len(self._estimators)
+
@@ -0,0 +1,103 @@
+import math
+import threading
+from datetime import datetime, timedelta
+
+# Online per-user trends of live vitals for future-risk forecasts.
+# Each signal keeps Holt's linear smoothing state (a level and a slope per
+# minute) adapted to irregular sampling: the smoothing weight of a reading grows
+# with the time since the previous one, 1 - exp(-dt / tau). An update is O(1)
+# and a forecast at any horizon is level + slope * horizon, so no history has to
+# be stored or re-read. A user first seen since startup is seeded once from
+# their last SEED_MINUTES of stored metrics, so forecasts survive a restart.
+
+TREND_SIGNALS = ('HR', 'Temp', 'Water Intake')
+LEVEL_TAU_MIN = 5.0
+SLOPE_TAU_MIN = 15.0
+FORECAST_HORIZONS_MIN = (15, 30, 60, 120)
+SEED_MINUTES = 120
+# user_metrics column of each signal, for seeding
+SIGNAL_COLUMNS = {'HR': 'heart_rate', 'Temp': 'body_temp', 'Water Intake': 'water_intake'}
+
+
+class HoltTrend:
+    """Level and slope (per minute) of one irregularly sampled signal"""
+
+    __slots__ = ('level', 'slope', 'last_time', 'count')
+
+    def __init__(self):
+        self.level = None
+        self.slope = 0.0
+        self.last_time = None
+        self.count = 0
+
+    def update(self, value, t):
+        """Add a reading taken at time t (s)"""
+        value = float(value)
+        self.count += 1
+        if self.level is None:
+            self.level, self.last_time = value, t
+            return
+        dt = (t - self.last_time) / 60.0
+        if dt <= 0:
+            # Same timestamp: refine the level only
+            self.level += (1.0 - math.exp(-1e-3 / LEVEL_TAU_MIN)) * (value - self.level)
+            return
+        predicted = self.level + self.slope * dt
+        level = predicted + (1.0 - math.exp(-dt / LEVEL_TAU_MIN)) * (value - predicted)
+        self.slope += (1.0 - math.exp(-dt / SLOPE_TAU_MIN)) * ((level - self.level) / dt - self.slope)
+        self.level = level
+        self.last_time = t
+
+    def forecast(self, horizon_min):
+        return self.level + self.slope * horizon_min
+
+
+class TrendRegistry:
+    """One set of HoltTrend estimators per user, updated on every ingest"""
+
+    def __init__(self, signals=TREND_SIGNALS):
+        self.signals = signals
+        self._trends = {}
+        self._lock = threading.Lock()
+
+    def _seed(self, conn, user_id, trends):
+        """Replay a user's last SEED_MINUTES of stored metrics into fresh trends"""
+        signals = [s for s in self.signals if s in SIGNAL_COLUMNS]
+        since = datetime.now() - timedelta(minutes=SEED_MINUTES)
+        rows = conn.execute(
+            'SELECT timestamp, ' + ', '.join(SIGNAL_COLUMNS[s] for s in signals) +
+            ' FROM user_metrics WHERE user_id = ? AND timestamp >= ? ORDER BY timestamp',
+            (user_id, str(since))).fetchall()
+        for row in rows:
+            t = datetime.fromisoformat(str(row[0])).timestamp()
+            for signal, value in zip(signals, row[1:]):
+                if value is not None:
+                    trends[signal].update(value, t)
+
+    def update(self, user_id, t, values, conn=None):
+        """Feed one reading (dict of signal -> value; missing/None signals are skipped)
+
+        With a connection, a user seen for the first time is seeded from their stored metrics first.
+        """
+        trends = self._trends.get(user_id)
+        if trends is None:
+            trends = {s: HoltTrend() for s in self.signals}
+            if conn is not None:
+                self._seed(conn, user_id, trends)
+            with self._lock:
+                trends = self._trends.setdefault(user_id, trends)
+        for signal, trend in trends.items():
+            value = values.get(signal)
+            if value is not None:
+                trend.update(value, t)
+
+    def state(self, user_id):
+        """{signal: (level, slope per minute, readings)} for a user, or None if never updated"""
+        trends = self._trends.get(user_id)
+        if trends is None:
+            return None
+        return {s: (tr.level, tr.slope, tr.count) for s, tr in trends.items() if tr.level is not None}
+
+    def __len__(self):
+        return len(self._trends)
+
@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import pickle
+import hashlib
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+# Sharded, versioned store for personal models.
+# Each user's model and scaler are written together as one artifact file under
+# root/<h[:2]>/<h[2:4]>/<h>/ (h = sha1 of the user id), so no directory holds more
+# than a few hundred entries even with 100k+ users. Artifacts are versioned by
+# write time; gc() removes superseded versions.
+#
+# Artifact layout:
+#   b'HMS1' | uint32 header length | JSON header | padding | array/blob sections
+# Arrays are stored either zlib-compressed or raw and 64-byte aligned. Raw arrays
+# can be loaded as read-only memory maps; compressed ones are decompressed on load.
+# ModelStore writes raw arrays unless asked to compress, so loads can map them.
+# Non-array objects (e.g. sklearn pipelines) go into a zlib-compressed pickle blob.
+
+MAGIC = b'HMS1'
+ALIGN = 64
+EXTENSION = '.hms'
+
+
+def scaler_to_arrays(scaler, prefix='scaler_'):
+    """A fitted StandardScaler's state as plain arrays"""
+    return {prefix + 'mean': np.asarray(scaler.mean_, dtype=np.float64),
+            prefix + 'scale': np.asarray(scaler.scale_, dtype=np.float64)}
+
+
+def scaler_from_arrays(arrays, prefix='scaler_'):
+    """Rebuild a StandardScaler that transforms exactly like the saved one"""
+    scaler = StandardScaler()
+    scaler.mean_ = np.asarray(arrays[prefix + 'mean'])
+    scaler.scale_ = np.asarray(arrays[prefix + 'scale'])
+    scaler.var_ = scaler.scale_ ** 2
+    scaler.n_features_in_ = len(scaler.mean_)
+    scaler.n_samples_seen_ = 0
+    return scaler
+
+
+def _pad(n):
+    return (-n) % ALIGN
+
+
+def write_artifact(path, arrays=None, obj=None, meta=None, compress=True, level=6):
+    """Write arrays + an optional pickled object + metadata to one artifact file, atomically"""
+    sections = []
+    header = {'meta': meta or {}, 'arrays': {}, 'blob': None}
+
+    for name, array in (arrays or {}).items():
+        array = np.asarray(array)
+        raw = array.tobytes(order='C')
+        data = zlib.compress(raw, level) if compress else raw
+        header['arrays'][name] = {
+            'dtype': array.dtype.str, 'shape': list(array.shape),
+            'codec': 'zlib' if compress else 'raw', 'length': len(data)
+        }
+        sections.append((name, data))
+    if obj is not None:
+        data = zlib.compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL), level)
+        header['blob'] = {'codec': 'zlib-pickle', 'length': len(data)}
+        sections.append((None, data))
+
+    # Offsets depend on the header size, which depends on the offsets; reserve room and fix up
+    header_bytes = json.dumps(header).encode()
+    reserve = len(header_bytes) + 32 * (len(sections) + 1)
+    offset = len(MAGIC) + 4 + reserve
+    offset += _pad(offset)
+    for name, data in sections:
+        entry = header['arrays'][name] if name is not None else header['blob']
+        entry['offset'] = offset
+        offset += len(data) + _pad(len(data))
+    header_bytes = json.dumps(header).encode().ljust(reserve)
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        for name, data in sections:
+            entry = header['arrays'][name] if name is not None else header['blob']
+            f.seek(entry['offset'])
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_artifact(path, mmap=False):
+    """Read an artifact written by write_artifact; returns (arrays, obj, meta)
+
+    With mmap=True, raw (uncompressed) arrays are returned as read-only memory maps.
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a model artifact")
+        (header_len,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_len).decode())
+
+        arrays = {}
+        for name, entry in header['arrays'].items():
+            dtype = np.dtype(entry['dtype'])
+            shape = tuple(entry['shape'])
+            if entry['codec'] == 'raw' and mmap and len(shape) > 0 and entry['length'] > 0:
+                arrays[name] = np.memmap(path, dtype=dtype, mode='r', offset=entry['offset'], shape=shape)
+                continue
+            f.seek(entry['offset'])
+            data = f.read(entry['length'])
+            if entry['codec'] == 'zlib':
+                data = zlib.decompress(data)
+            arrays[name] = np.reshape(np.frombuffer(data, dtype=dtype), shape)
+
+        obj = None
+        if header['blob'] is not None:
+            f.seek(header['blob']['offset'])
+            obj = pickle.loads(zlib.decompress(f.read(header['blob']['length'])))
+
+    return arrays, obj, header['meta']
+
+
+class ModelStore:
+    """Versioned per-user model artifacts, sharded two levels deep by user-id hash"""
+
+    def __init__(self, root="personal_models", compress=False):
+        self.root = root
+        self.compress = compress
+
+    def user_dir(self, user_id):
+        digest = hashlib.sha1(str(user_id).encode()).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _versions(self, user_id, kind):
+        """Artifact paths for a user/kind, oldest first"""
+        directory = self.user_dir(user_id)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        prefix = kind + '-'
+        versions = sorted(n for n in names if n.startswith(prefix) and n.endswith(EXTENSION))
+        return [os.path.join(directory, n) for n in versions]
+
+    def latest_path(self, user_id, kind):
+        versions = self._versions(user_id, kind)
+        return versions[-1] if versions else None
+
+    def save(self, user_id, kind, arrays=None, obj=None, meta=None, keep=2):
+        """Write a new version of a user's artifact and drop all but the newest `keep` versions"""
+        directory = self.user_dir(user_id)
+        os.makedirs(directory, exist_ok=True)
+        version = time.time_ns()
+        path = os.path.join(directory, f"{kind}-{version:020d}{EXTENSION}")
+        meta = dict(meta or {}, user_id=str(user_id), kind=kind, version=version)
+        write_artifact(path, arrays, obj, meta, compress=self.compress)
+        self.gc_user(user_id, kind, keep)
+        return path
+
+    def load(self, user_id, kind, mmap=False):
+        """Latest (arrays, obj, meta) for a user/kind, or None"""
+        path = self.latest_path(user_id, kind)
+        if path is None:
+            return None
+        return read_artifact(path, mmap=mmap)
+
+    def gc_user(self, user_id, kind, keep=2):
+        """Delete all but the newest `keep` versions of one user's artifact"""
+        removed = 0
+        for path in self._versions(user_id, kind)[:-keep] if keep > 0 else self._versions(user_id, kind):
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def gc(self, keep=1, tmp_max_age_s=3600):
+        """Sweep the whole store: old versions beyond `keep` and abandoned temp files"""
+        removed = 0
+        now = time.time()
+        for directory, _, names in os.walk(self.root):
+            by_kind = {}
+            for name in names:
+                path = os.path.join(directory, name)
+                if '.tmp' in name:
+                    if now - os.path.getmtime(path) > tmp_max_age_s:
+                        os.remove(path)
+                        removed += 1
+                elif name.endswith(EXTENSION):
+                    by_kind.setdefault(name.rsplit('-', 1)[0], []).append(path)
+            for paths in by_kind.values():
+                for path in sorted(paths)[:-keep]:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+def migrate_legacy(legacy_dir="personal_models", store=None):
+    """Move flat-directory user_{id}_*.pkl/.npz models into the sharded store"""
+    from flat_forest import FlatForest, compile_model
+
+    store = store or ModelStore(legacy_dir)
+    migrated = 0
+    for name in sorted(os.listdir(legacy_dir)):
+        if not name.startswith('user_') or not name.endswith('_scaler.pkl'):
+            continue
+        stem = name[len('user_'):-len('_scaler.pkl')]
+        is_ensemble = stem.endswith('_ensemble')
+        user_id = stem[:-len('_ensemble')] if is_ensemble else stem
+        scaler_path = os.path.join(legacy_dir, name)
+        with open(scaler_path, 'rb') as f:
+            scaler = pickle.load(f)
+
+        if is_ensemble:
+            model_paths = [os.path.join(legacy_dir, f"user_{user_id}_ensemble.pkl")]
+        else:
+            model_paths = [os.path.join(legacy_dir, f"user_{user_id}_model.npz"),
+                           os.path.join(legacy_dir, f"user_{user_id}_model.pkl")]
+        model_path = next((p for p in model_paths if os.path.exists(p)), None)
+        if model_path is None:
+            continue
+
+        if is_ensemble:
+            with open(model_path, 'rb') as f:
+                store.save(user_id, 'ensemble', arrays=scaler_to_arrays(scaler), obj=pickle.load(f))
+        else:
+            if model_path.endswith('.npz'):
+                forest = FlatForest.load(model_path)
+            else:
+                with open(model_path, 'rb') as f:
+                    forest = compile_model(pickle.load(f))
+            store.save(user_id, 'personal', arrays={**forest.to_arrays(), **scaler_to_arrays(scaler)})
+
+        os.remove(model_path)
+        os.remove(scaler_path)
+        migrated += 1
+    return migrated
+
+
+if __name__ == "__main__":
+    # python model_store.py migrate|gc [root]
+    command = sys.argv[1] if len(sys.argv) > 1 else 'gc'
+    root = sys.argv[2] if len(sys.argv) > 2 else "personal_models"
+    if command == 'migrate':
+        print(f"✅ Migrated {migrate_legacy(root)} legacy models into {root}")
+    elif command == 'gc':
+        print(f"🧹 Removed {ModelStore(root).gc()} stale files from {root}")
+    else:
+        print("Usage: python model_store.py migrate|gc [root]")
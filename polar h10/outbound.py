@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Shared client for calls to external services (weather API, OpenAI, ...).
+# One requests.Session keeps pooled keep-alive connections per host. Every
+# dependency is registered with:
+#   - a concurrency limit: callers beyond it are turned away at once instead of
+#     queueing behind a slow service
+#   - a circuit breaker: after failure_threshold consecutive failures the
+#     dependency is "open" and calls fail fast (serving the caller's fallback)
+#     for reset_timeout_s, then one trial call decides whether it closes again
+#   - latency and outcome metrics
+# Flask serves requests from threads, so this is thread-based rather than
+# asyncio; the effect on callers is the same: a slow or failing dependency costs
+# them a fast fallback, not a full timeout.
+
+
+class DependencyUnavailable(Exception):
+    """Raised when a call is short-circuited by an open breaker or the concurrency limit"""
+
+
+class _FailedResult(Exception):
+    """A result that counts as a failure (e.g. an HTTP 5xx response)"""
+
+    def __init__(self, result):
+        self.result = result
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout_s=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go through now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout_s:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True  # exactly one trial call
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self._trial_running = self.CLOSED, 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state, self.opened_at = self.OPEN, time.time()
+
+
+class DependencyMetrics:
+    """Call outcomes and recent latencies of one dependency"""
+
+    def __init__(self, window=256):
+        self.calls = 0
+        self.errors = 0
+        self.short_circuited = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=window)  # seconds, successful and failed calls
+        self._lock = threading.Lock()
+
+    def record(self, latency_s, ok):
+        with self._lock:
+            self.calls += 1
+            self.errors += not ok
+            self.latencies.append(latency_s)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self.latencies)
+        pick = lambda q: round(latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000, 1) if latencies else None
+        return {'calls': self.calls, 'errors': self.errors, 'short_circuited': self.short_circuited,
+                'rejected': self.rejected, 'latency_ms_p50': pick(0.5), 'latency_ms_p95': pick(0.95)}
+
+
+class Dependency:
+    def __init__(self, name, max_concurrency, timeout_s, breaker):
+        self.name = name
+        self.timeout_s = timeout_s
+        self.breaker = breaker
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.metrics = DependencyMetrics()
+
+
+class OutboundClient:
+    """Pooled HTTP session plus per-dependency concurrency limits, circuit breakers and metrics"""
+
+    def __init__(self, pool_maxsize=32):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.dependencies = {}
+
+    def register(self, name, max_concurrency=8, timeout_s=5.0, failure_threshold=5, reset_timeout_s=30.0):
+        self.dependencies[name] = Dependency(name, max_concurrency, timeout_s,
+                                             CircuitBreaker(failure_threshold, reset_timeout_s))
+        return self.dependencies[name]
+
+    def _admit(self, name):
+        """The dependency, if a call may start now; raises DependencyUnavailable otherwise"""
+        dependency = self.dependencies[name]
+        if not dependency.breaker.allow():
+            dependency.metrics.short_circuited += 1
+            raise DependencyUnavailable(f"{name}: circuit open")
+        if not dependency.slots.acquire(blocking=False):
+            dependency.metrics.rejected += 1
+            # A half-open trial that never ran must not keep the breaker waiting
+            if dependency.breaker.state == CircuitBreaker.HALF_OPEN:
+                dependency.breaker.record_failure()
+            raise DependencyUnavailable(f"{name}: too many concurrent calls")
+        return dependency
+
+    @contextmanager
+    def guard(self, name):
+        """Hold one of a dependency's call slots for the with block
+
+        Raises DependencyUnavailable on entry if the breaker is open or the
+        dependency is at its concurrency limit. The block's duration is the
+        call's latency and an exception escaping it counts as a failure, so a
+        streamed response is covered until the last chunk is read.
+        """
+        dependency = self._admit(name)
+        started = time.perf_counter()
+        failed = False
+        try:
+            yield dependency
+        except Exception:
+            failed = True
+            raise
+        finally:
+            dependency.slots.release()
+            dependency.metrics.record(time.perf_counter() - started, not failed)
+            if failed:
+                dependency.breaker.record_failure()
+            else:
+                dependency.breaker.record_success()
+
+    def call(self, name, fn, fallback=None, is_failure=None):
+        """Run fn() as a call to dependency `name`
+
+        If the breaker is open or the dependency is at its concurrency limit,
+        fallback() is returned (or DependencyUnavailable raised without one).
+        Exceptions from fn, or results for which is_failure(result) is true,
+        count as failures; with a fallback, failures also return fallback().
+        """
+        try:
+            with self.guard(name):
+                result = fn()
+                if is_failure and is_failure(result):
+                    raise _FailedResult(result)
+            return result
+        except _FailedResult as e:
+            return e.result if fallback is None else fallback()
+        except Exception:
+            if fallback is None:
+                raise
+            return fallback()
+
+    def request(self, name, method, url, fallback=None, **kwargs):
+        """HTTP request through the pooled session; 5xx responses count as failures"""
+        kwargs.setdefault('timeout', self.dependencies[name].timeout_s)
+        return self.call(name, lambda: self.session.request(method, url, **kwargs), fallback,
+                         is_failure=lambda response: response.status_code >= 500)
+
+    def get(self, name, url, fallback=None, **kwargs):
+        return self.request(name, 'GET', url, fallback, **kwargs)
+
+    def metrics(self):
+        return {name: dict(d.metrics.snapshot(), state=d.breaker.state)
+                for name, d in self.dependencies.items()}
+
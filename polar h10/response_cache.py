@@ -0,0 +1,121 @@
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, request
+
+# Read-through cache for per-user GET endpoints.
+# Every write that changes what a user's dashboard shows bumps that user's data
+# version in SQLite (shared by all server workers). A cached response is keyed by
+# (user, endpoint, query parameters, data version), so a bump makes the old
+# entries unreachable and they age out of the LRU. Responses carry a content
+# ETag; a poll whose If-None-Match still matches gets an empty 304.
+# MAX_AGE_S bounds staleness of views that also depend on the clock (e.g.
+# "last 7 days").
+
+
+def init_version_table(conn):
+    """Create the per-user data version table"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_data_versions (
+            user_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.commit()
+
+
+def bump_version(conn, user_id):
+    """Mark a user's data as changed; runs in the caller's transaction"""
+    conn.execute('''
+        INSERT INTO user_data_versions (user_id, version) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+    ''', (user_id,))
+
+
+def read_version(conn, user_id):
+    row = conn.execute('SELECT version FROM user_data_versions WHERE user_id = ?', (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+class ResponseCache:
+    """LRU of encoded responses, bounded by entry count and total body size"""
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024, max_age_s=300.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self._entries = OrderedDict()  # key -> (etag, body, mimetype, stored_at)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[3] > self.max_age_s:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        entry = (etag, body, mimetype, time.time())
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self.nbytes += len(body)
+            while self._entries and (len(self._entries) > self.max_entries or self.nbytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+        return entry
+
+    def _drop(self, key):
+        self.nbytes -= len(self._entries.pop(key)[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        return {'entries': len(self._entries), 'bytes': self.nbytes, 'hits': self.hits, 'misses': self.misses}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _conditional(entry):
+    """304 if the client already holds this entry, otherwise the cached body"""
+    etag, body, mimetype, _ = entry
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def cached_user_view(cache, get_version):
+    """Decorator for GET views taking user_id; get_version(user_id) returns the current data version"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(user_id, **kwargs):
+            key = (user_id, request.endpoint, tuple(sorted(request.args.items(multi=True))), get_version(user_id))
+            entry = cache.get(key)
+            if entry is None:
+                response = view(user_id, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response  # errors and tuples are not cached
+                entry = cache.put(key, response.get_data(), response.mimetype)
+            return _conditional(entry)
+        return wrapper
+    return decorator
@@ -0,0 +1,127 @@
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, VotingClassifier
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.svm import SVC
+
+# Personal ensemble training that stays bounded for users with large histories.
+# The exact ensemble pairs a random forest with an RBF SVC(probability=True), which
+# is roughly quadratic in rows plus an internal CV for Platt scaling. The scalable
+# ensemble swaps the SVC for a Nystroem RBF approximation feeding a logistic
+# regression (probabilities without Platt CV), caps each forest tree's bootstrap
+# sample, and grows its training set only while it fits the time budget.
+
+# Above this many rows 'auto' mode switches to the scalable ensemble
+EXACT_MAX_ROWS = 20000
+
+# Training-set sizes tried by fit_within_budget, doubling from here
+START_ROWS = 5000
+
+NYSTROEM_COMPONENTS = 300
+FOREST_MAX_SAMPLES = 20000
+
+
+def build_exact_ensemble(random_state=42):
+    """The original RF + RBF SVC soft-voting ensemble"""
+    return VotingClassifier(
+        estimators=[
+            ('rf', RandomForestClassifier(n_estimators=100, random_state=random_state)),
+            ('svm', SVC(probability=True, random_state=random_state))
+        ],
+        voting='soft'
+    )
+
+
+def build_scalable_ensemble(n_rows, random_state=42):
+    """RF with capped bootstrap samples + Nystroem RBF logistic regression, soft-voted"""
+    kernel_svm = make_pipeline(
+        Nystroem(kernel='rbf', n_components=min(NYSTROEM_COMPONENTS, n_rows), random_state=random_state),
+        LogisticRegression(max_iter=200)
+    )
+    forest = RandomForestClassifier(
+        n_estimators=100,
+        max_samples=min(FOREST_MAX_SAMPLES, n_rows) if n_rows > FOREST_MAX_SAMPLES else None,
+        min_samples_leaf=2,
+        random_state=random_state
+    )
+    return VotingClassifier(estimators=[('rf', forest), ('svm', kernel_svm)], voting='soft')
+
+
+def stratified_subsample(y, n, random_state=42):
+    """Indices of an n-row subsample that keeps the class balance of y"""
+    if n >= len(y):
+        return np.arange(len(y))
+    rng = np.random.default_rng(random_state)
+    picked = []
+    for cls in np.unique(y):
+        cls_idx = np.flatnonzero(y == cls)
+        take = max(1, int(round(n * len(cls_idx) / len(y))))
+        picked.append(rng.choice(cls_idx, size=min(take, len(cls_idx)), replace=False))
+    return np.sort(np.concatenate(picked))
+
+
+def fit_within_budget(X, y, time_budget_s=60.0, random_state=42):
+    """Fit the scalable ensemble on doubling stratified subsamples until the time budget runs out
+
+    Each fit is roughly linear in rows, so the next doubling is only attempted if
+    twice the last fit time still fits in what is left of the budget.
+    Returns (model, rows_used, fit_seconds).
+    """
+    deadline = time.perf_counter() + time_budget_s
+    n = min(START_ROWS, len(y))
+    model, rows_used, fit_time = None, 0, 0.0
+    while True:
+        idx = stratified_subsample(y, n, random_state)
+        if len(np.unique(y[idx])) < 2:
+            break
+        candidate = build_scalable_ensemble(len(idx), random_state)
+        start = time.perf_counter()
+        candidate.fit(X[idx], y[idx])
+        elapsed = time.perf_counter() - start
+        model, rows_used, fit_time = candidate, len(idx), fit_time + elapsed
+
+        remaining = deadline - time.perf_counter()
+        if n >= len(y) or 2 * elapsed > remaining:
+            break
+        n = min(2 * n, len(y))
+    return model, rows_used, fit_time
+
+
+def train_ensemble(X_train, y_train, mode='auto', time_budget_s=60.0, random_state=42):
+    """Train a personal ensemble; mode is 'exact', 'scalable' or 'auto' (by row count)
+
+    Returns (model, info) where info records the mode, rows used and fit time.
+    """
+    if mode == 'auto':
+        mode = 'exact' if len(y_train) <= EXACT_MAX_ROWS else 'scalable'
+
+    if mode == 'exact':
+        model = build_exact_ensemble(random_state)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        return model, {'mode': 'exact', 'rows_used': len(y_train), 'fit_seconds': time.perf_counter() - start}
+
+    if mode == 'scalable':
+        model, rows_used, fit_time = fit_within_budget(X_train, y_train, time_budget_s, random_state)
+        return model, {'mode': 'scalable', 'rows_used': rows_used, 'fit_seconds': fit_time}
+
+    raise ValueError(f"Unknown ensemble mode: {mode}")
+
+
+def compare_modes(X_train, y_train, X_test, y_test, exact_max_rows=EXACT_MAX_ROWS, time_budget_s=60.0):
+    """Accuracy and fit time of the exact vs scalable ensemble on the same split
+
+    The exact ensemble is trained on at most exact_max_rows (stratified) rows so
+    the comparison itself stays feasible; rows_used says how many it saw.
+    """
+    report = {}
+    exact_idx = stratified_subsample(y_train, exact_max_rows)
+    for mode, (Xm, ym) in (('exact', (X_train[exact_idx], y_train[exact_idx])),
+                           ('scalable', (X_train, y_train))):
+        model, info = train_ensemble(Xm, ym, mode=mode, time_budget_s=time_budget_s)
+        info['accuracy'] = float((model.predict(X_test) == y_test).mean())
+        report[mode] = info
+    return report
+
@@ -0,0 +1,85 @@
+import numpy as np
+
+# Shared loader for personal-model training data.
+# Streams the feature columns straight from SQLite into preallocated float32 arrays
+# instead of building dicts and nested Python lists first.
+
+# Column order used by every personal/ensemble model
+FEATURE_COLUMNS = [
+    'heart_rate', 'body_temp', 'steps', 'water_intake',
+    'active_energy', 'acc_x', 'acc_y', 'acc_z'
+]
+
+# Rows pulled from the cursor per fetchmany() call
+FETCH_CHUNK = 8192
+
+
+def _window_clause(days):
+    return "user_id = ? AND timestamp >= datetime('now', '-{} days')".format(int(days))
+
+
+def count_training_rows(conn, user_id, days=30):
+    """Count a user's rows in the training window without fetching them"""
+    c = conn.cursor()
+    c.execute('SELECT COUNT(*) FROM user_metrics WHERE ' + _window_clause(days), (user_id,))
+    return c.fetchone()[0]
+
+
+def time_stratified_indices(n_rows, max_rows, random_state=42):
+    """Pick max_rows of n_rows time-ordered rows, one at random from each equal-width time stratum"""
+    if max_rows is None or n_rows <= max_rows:
+        return None
+    rng = np.random.default_rng(random_state)
+    edges = np.linspace(0, n_rows, max_rows + 1)
+    starts = np.ceil(edges[:-1]).astype(np.int64)
+    widths = np.maximum(np.ceil(edges[1:]).astype(np.int64) - starts, 1)
+    return np.minimum(starts + (rng.random(max_rows) * widths).astype(np.int64), n_rows - 1)
+
+
+def load_training_matrix(conn, user_id, days=30, max_rows=None, label_threshold=0.5, random_state=42,
+                         columns=FEATURE_COLUMNS):
+    """Load (X, y) for a user as float32 features and int8 labels
+
+    Rows are read in time order with fetchmany() and written into arrays sized
+    from a COUNT(*) up front. When max_rows is set and the user has more rows,
+    a time-stratified subsample is kept so the whole window stays represented.
+    """
+    n_rows = count_training_rows(conn, user_id, days)
+    keep = time_stratified_indices(n_rows, max_rows, random_state)
+    n_out = n_rows if keep is None else len(keep)
+
+    X = np.empty((n_out, len(columns)), dtype=np.float32)
+    y = np.empty(n_out, dtype=np.int8)
+    if n_out == 0:
+        return X, y
+
+    # Null handling and labelling are pushed into SQL so every fetched row is a flat numeric tuple
+    select_cols = ', '.join(f'COALESCE({col}, 0)' for col in columns)
+    c = conn.cursor()
+    c.execute(
+        f'SELECT {select_cols}, CASE WHEN ml_prediction > ? THEN 1 ELSE 0 END '
+        'FROM user_metrics WHERE ' + _window_clause(days) + ' ORDER BY timestamp',
+        (label_threshold, user_id)
+    )
+
+    n_features = len(columns)
+    row_pos = 0   # position in the full result set
+    out_pos = 0   # position in the output arrays
+    while out_pos < n_out:
+        rows = c.fetchmany(FETCH_CHUNK)
+        if not rows:
+            break
+        chunk = np.array(rows, dtype=np.float32)
+        if keep is not None:
+            # keep is sorted, so the wanted rows of this chunk are a contiguous run of it
+            lo = np.searchsorted(keep, row_pos)
+            hi = np.searchsorted(keep, row_pos + len(rows))
+            chunk = chunk[keep[lo:hi] - row_pos]
+        end = min(out_pos + len(chunk), n_out)
+        X[out_pos:end] = chunk[:end - out_pos, :n_features]
+        y[out_pos:end] = chunk[:end - out_pos, n_features]
+        out_pos = end
+        row_pos += len(rows)
+
+    # Rows may have aged out of the window between COUNT(*) and SELECT
+    return X[:out_pos], y[:out_pos]
@@ -0,0 +1,172 @@
+import threading
+import numpy as np
+
+from training_data import load_training_matrix
+
+# Per-user personalization on top of the one shared global ANN.
+# Instead of a pickled forest per user, each user gets 12 float32 numbers:
+# a feature normalization (mean/std for the 5 global-model inputs) and a
+# logistic calibration head (slope/intercept on the global model's logit).
+# All users live in one SQLite table and one set of in-memory arrays, so the
+# whole fleet fits in RAM and can be evaluated in a single batch.
+
+# user_metrics columns in the order the global ANN expects (Temp, HR, Acc_X, Acc_Y, Acc_Z)
+GLOBAL_FEATURES = ['body_temp', 'heart_rate', 'acc_x', 'acc_y', 'acc_z']
+N_FEATURES = len(GLOBAL_FEATURES)
+
+# Layout of a user's packed params: mean[5], std[5], slope, intercept
+N_PARAMS = 2 * N_FEATURES + 2
+
+# Pseudo-count pulling a user's mean/std toward the population ones, so users
+# with little data stay close to the global model
+PRIOR_SAMPLES = 100
+
+EPS = 1e-6
+
+
+def init_calibration_table(conn):
+    """Create the compact per-user calibration table"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_calibration (
+            user_id TEXT PRIMARY KEY,
+            n_samples INTEGER NOT NULL,
+            params BLOB NOT NULL,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+
+def _logit(p):
+    p = np.clip(np.asarray(p, dtype=np.float64), EPS, 1 - EPS)
+    return np.log(p / (1 - p))
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def _fit_head(logits, y, l2=1.0, iterations=25):
+    """Fit slope/intercept of sigmoid(a * logit + b) by Newton's method with a pull toward (1, 0)"""
+    a, b = 1.0, 0.0
+    for _ in range(iterations):
+        p = _sigmoid(a * logits + b)
+        r = p - y
+        w = p * (1 - p)
+        grad = np.array([r @ logits + l2 * (a - 1.0), r.sum() + l2 * b])
+        hess = np.array([[w @ (logits * logits) + l2, w @ logits],
+                         [w @ logits, w.sum() + l2]])
+        step = np.linalg.solve(hess, grad)
+        a, b = a - step[0], b - step[1]
+        if np.abs(step).max() < 1e-6:
+            break
+    return a, b
+
+
+class CalibrationTable:
+    """All users' calibration params as contiguous float32 arrays
+
+    global_mean/global_std are the shared ANN scaler's statistics; a user's
+    features are z-scored with their own (shrunk) mean/std, which is the
+    space the global scaler maps the population into.
+    """
+
+    def __init__(self, global_mean, global_std, capacity=1024):
+        self.global_mean = np.asarray(global_mean, dtype=np.float32)
+        self.global_std = np.asarray(global_std, dtype=np.float32)
+        self.params = np.zeros((capacity, N_PARAMS), dtype=np.float32)
+        self.index = {}  # user_id -> row in params
+        self._lock = threading.Lock()
+
+    def __contains__(self, user_id):
+        return user_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def nbytes(self):
+        return len(self.index) * N_PARAMS * self.params.itemsize
+
+    def _row_for(self, user_id):
+        row = self.index.get(user_id)
+        if row is None:
+            row = len(self.index)
+            if row >= len(self.params):
+                grown = np.zeros((2 * len(self.params), N_PARAMS), dtype=np.float32)
+                grown[:row] = self.params[:row]
+                self.params = grown
+            self.index[user_id] = row
+        return row
+
+    def set(self, user_id, params):
+        with self._lock:
+            row = self._row_for(user_id)  # may grow self.params
+            self.params[row] = params
+
+    def identity_params(self):
+        """Params that reproduce the plain global model"""
+        return np.concatenate([self.global_mean, self.global_std, [1.0, 0.0]]).astype(np.float32)
+
+    def load(self, conn):
+        """Load every user's params from the database"""
+        rows = conn.execute('SELECT user_id, params FROM user_calibration').fetchall()
+        for user_id, blob in rows:
+            self.set(user_id, np.frombuffer(blob, dtype=np.float32))
+        return len(rows)
+
+    def fit_user(self, conn, user_id, global_predict, days=30, max_rows=20000):
+        """Fit and persist a user's normalization + calibration head
+
+        global_predict maps already-scaled features (n, 5) to dehydration
+        probabilities from the shared model.
+        """
+        X, y = load_training_matrix(conn, user_id, days=days, max_rows=max_rows, columns=GLOBAL_FEATURES)
+        n = len(X)
+        if n == 0:
+            return None
+
+        # Shrink the user's statistics toward the population ones
+        weight = n / (n + PRIOR_SAMPLES)
+        user_mean = X.mean(axis=0)
+        user_var = X.var(axis=0)
+        mean = weight * user_mean + (1 - weight) * self.global_mean
+        var = weight * user_var + (1 - weight) * self.global_std ** 2
+        std = np.sqrt(np.maximum(var, EPS))
+
+        logits = _logit(global_predict((X - mean) / std))
+        if len(np.unique(y)) < 2:
+            slope, intercept = 1.0, 0.0
+        else:
+            slope, intercept = _fit_head(logits, y.astype(np.float64))
+
+        params = np.concatenate([mean, std, [slope, intercept]]).astype(np.float32)
+        self.set(user_id, params)
+        conn.execute(
+            'INSERT OR REPLACE INTO user_calibration (user_id, n_samples, params, updated_at) '
+            "VALUES (?, ?, ?, datetime('now'))",
+            (user_id, n, params.tobytes())
+        )
+        conn.commit()
+        return params
+
+    def _gather(self, user_ids):
+        rows = np.array([self.index.get(u, -1) for u in user_ids], dtype=np.int64)
+        params = self.params[np.maximum(rows, 0)]
+        params[rows < 0] = self.identity_params()
+        return params
+
+    def transform(self, user_ids, X):
+        """Scale raw features (n, 5) with each row's user normalization"""
+        params = self._gather(user_ids)
+        return (np.asarray(X, dtype=np.float32) - params[:, :N_FEATURES]) / params[:, N_FEATURES:2 * N_FEATURES]
+
+    def calibrate(self, user_ids, global_probs):
+        """Apply each row's user calibration head to global-model probabilities"""
+        params = self._gather(user_ids)
+        return _sigmoid(params[:, -2] * _logit(global_probs) + params[:, -1])
+
+    def predict(self, user_ids, X, global_predict):
+        """Personalized probabilities for a batch of (user, raw feature row) pairs in one model call"""
+        global_probs = np.asarray(global_predict(self.transform(user_ids, X)), dtype=np.float64).ravel()
+        return self.calibrate(user_ids, global_probs)
@@ -0,0 +1,123 @@
+import os
+import sys
+import threading
+import numpy as np
+
+# Shared signal-processing package lives at the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from biosignals.features import window_summary
+
+# Per-user columnar ring buffer of live vitals.
+# Each vital is a float32 column and timestamps are int64 milliseconds. Every
+# row is written twice (at i and i + capacity), so the newest `capacity` rows
+# are always one contiguous slice: window queries are a binary search on time
+# plus one small copy of that slice (taken under the lock, so a concurrent
+# append can't change it mid-query) and vectorized statistics, no Python loops.
+# A 64-row buffer with the default columns is about 6 KB per user.
+
+VITAL_COLUMNS = ['HR', 'Temp', 'Water Intake', 'Acc_X', 'Acc_Y', 'Acc_Z', 'Steps', 'Active Energy',
+                 'HR Quality', 'RMSSD', 'Risk']
+
+
+class VitalsRing:
+    """Fixed-capacity, time-indexed ring of one user's vitals"""
+
+    def __init__(self, capacity=64, columns=VITAL_COLUMNS):
+        self.capacity = capacity
+        self.columns = list(columns)
+        self.column_index = {name: i for i, name in enumerate(self.columns)}
+        self._t = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.full((len(self.columns), 2 * capacity), np.nan, dtype=np.float32)
+        self._head = 0  # slot of the next write, in [0, capacity)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    @property
+    def nbytes(self):
+        return self._t.nbytes + self._values.nbytes
+
+    def append(self, timestamp, entry):
+        """Add one reading; timestamp in seconds, entry maps column name to value (missing -> NaN)"""
+        row = np.array([np.nan if entry.get(c) is None else entry[c] for c in self.columns], dtype=np.float32)
+        t_ms = int(timestamp * 1000)
+        with self._lock:
+            for slot in (self._head, self._head + self.capacity):
+                self._t[slot] = t_ms
+                self._values[:, slot] = row
+            self._head = (self._head + 1) % self.capacity
+            self.count += 1
+
+    def _view(self):
+        """(timestamps, values) of all stored rows, oldest first, as views"""
+        n = len(self)
+        end = self._head + self.capacity
+        return self._t[end - n:end], self._values[:, end - n:end]
+
+    def window(self, seconds, now):
+        """(timestamps ms, values (n_columns, n)) of the rows from the last `seconds` before now, as copies"""
+        with self._lock:
+            t, values = self._view()
+            first = np.searchsorted(t, int((now - seconds) * 1000), side='left')
+            return t[first:].copy(), values[:, first:].copy()
+
+    def latest(self):
+        """Newest row as a dict, or None when empty"""
+        with self._lock:
+            if self.count == 0:
+                return None
+            slot = (self._head - 1) % self.capacity
+            return dict(zip(self.columns, self._values[:, slot].tolist()), timestamp=int(self._t[slot]) / 1000.0)
+
+    def stats(self, seconds, now, columns=None, weight_column=None):
+        """Per-column mean/std/slope (per minute)/min/max/first/last over the window, or None if < 2 rows
+
+        columns defaults to all of them; weight_column (e.g. 'HR Quality') weights
+        the fit by that column's values.
+        """
+        t, values = self.window(seconds, now)
+        if len(t) < 2:
+            return None
+        columns = self.columns if columns is None else list(columns)
+        rows = values[[self.column_index[c] for c in columns]]
+        weights = None
+        if weight_column is not None:
+            weights = np.nan_to_num(values[self.column_index[weight_column]], nan=1.0)
+            if weights.sum() <= 0:
+                weights = None
+        with np.errstate(invalid='ignore'):
+            mean, std, slope, low, high = window_summary(t / 1000.0, rows, weights)
+        return {
+            'n': len(t),
+            'span_minutes': (t[-1] - t[0]) / 60000.0,
+            'columns': {name: {'mean': float(mean[i]), 'std': float(std[i]), 'slope': float(slope[i]),
+                               'min': float(low[i]), 'max': float(high[i]),
+                               'first': float(rows[i, 0]), 'last': float(rows[i, -1])}
+                        for i, name in enumerate(columns)},
+        }
+
+
+class VitalsStore:
+    """One VitalsRing per user"""
+
+    def __init__(self, capacity=64, columns=VITAL_COLUMNS):
+        self.capacity = capacity
+        self.columns = columns
+        self._rings = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id, create=False):
+        ring = self._rings.get(user_id)
+        if ring is None and create:
+            with self._lock:
+                ring = self._rings.setdefault(user_id, VitalsRing(self.capacity, self.columns))
+        return ring
+
+    def append(self, user_id, timestamp, entry):
+        self.get(user_id, create=True).append(timestamp, entry)
+
+    def __len__(self):
+        return len(self._rings)
+
@@ -0,0 +1,156 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Non-blocking cache in front of the weather API.
+# Coordinates are rounded to a grid (0.1 degree, about 11 km) so nearby users
+# share an entry. An entry is fresh for ttl_s; after that it is still served
+# for up to stale_s while one background fetch replaces it (stale-while-
+# revalidate). Fetches are single-flight: at most one per grid cell is in
+# flight, however many requests ask for it. A refresher thread re-fetches
+# entries that were read recently before they go stale, so active locations
+# never miss. Requests never wait on the API: an unknown cell returns None
+# (callers already treat that as "no weather") and starts a fetch.
+
+DEFAULT_PRECISION = 1
+FAILURE_BACKOFF_S = 30.0
+
+
+class _Entry:
+    __slots__ = ('value', 'fetched_at', 'last_read', 'failed_at')
+
+    def __init__(self):
+        self.value = None
+        self.fetched_at = 0.0
+        self.last_read = 0.0
+        self.failed_at = 0.0
+
+
+class WeatherCache:
+    """TTL cache keyed by rounded lat/lon with single-flight background refreshes
+
+    fetch(lat, lon) returns the weather dict (or raises); it is only ever called
+    from the cache's worker threads.
+    """
+
+    def __init__(self, fetch, ttl_s=600.0, stale_s=3600.0, precision=DEFAULT_PRECISION,
+                 refresh_interval_s=60.0, keep_warm_s=3600.0, max_workers=4):
+        self.fetch = fetch
+        self.ttl_s = ttl_s
+        self.stale_s = stale_s
+        self.precision = precision
+        self.refresh_interval_s = refresh_interval_s
+        self.keep_warm_s = keep_warm_s
+        self._entries = {}
+        self._in_flight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='weather')
+        self._refresher = None
+        self._stop = threading.Event()
+        self.fetches = 0
+        self.failures = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def key(self, lat, lon):
+        return round(float(lat), self.precision), round(float(lon), self.precision)
+
+    def _schedule(self, key, now):
+        """Start a fetch for key unless one is in flight or the last one failed just now (lock held)"""
+        entry = self._entries.get(key)
+        if key in self._in_flight or (entry is not None and now - entry.failed_at < FAILURE_BACKOFF_S):
+            return self._in_flight.get(key)
+        future = self._pool.submit(self._run_fetch, key)
+        self._in_flight[key] = future
+        return future
+
+    def _run_fetch(self, key):
+        try:
+            value = self.fetch(*key)
+            failed = False
+        except Exception as e:
+            print(f"Weather fetch failed for {key}: {e}")
+            value, failed = None, True
+        now = time.time()
+        with self._lock:
+            entry = self._entries.setdefault(key, _Entry())
+            self.fetches += 1
+            if failed or value is None:
+                self.failures += 1
+                entry.failed_at = now  # keep serving the stale value
+            else:
+                entry.value, entry.fetched_at, entry.failed_at = value, now, 0.0
+            self._in_flight.pop(key, None)
+        return value
+
+    def get(self, lat, lon, wait_s=0.0):
+        """Cached weather for a location; None if nothing usable is cached yet
+
+        With wait_s > 0 a cold lookup waits up to that long for the fetch it starts.
+        """
+        key = self.key(lat, lon)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.last_read = now
+                age = now - entry.fetched_at
+                if entry.value is not None and age <= self.ttl_s:
+                    self.hits += 1
+                    return entry.value
+                if entry.value is not None and age <= self.ttl_s + self.stale_s:
+                    self.stale_hits += 1
+                    self._schedule(key, now)
+                    return entry.value
+            else:
+                self._entries[key] = entry = _Entry()
+                entry.last_read = now
+            self.misses += 1
+            future = self._schedule(key, now)
+        if wait_s > 0 and future is not None:
+            try:
+                return future.result(timeout=wait_s)
+            except Exception:
+                return None
+        return None
+
+    def warm(self, lat, lon):
+        """Start fetching a location (e.g. the default one at startup)"""
+        with self._lock:
+            self._entries.setdefault(self.key(lat, lon), _Entry()).last_read = time.time()
+            return self._schedule(self.key(lat, lon), time.time())
+
+    def refresh_due(self, now=None):
+        """Schedule fetches for recently read entries nearing expiry and drop long-unused ones"""
+        now = time.time() if now is None else now
+        scheduled = 0
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if now - entry.last_read > max(self.keep_warm_s, self.ttl_s + self.stale_s):
+                    if key not in self._in_flight:
+                        del self._entries[key]
+                    continue
+                if now - entry.last_read <= self.keep_warm_s and now - entry.fetched_at > 0.8 * self.ttl_s:
+                    scheduled += self._schedule(key, now) is not None
+        return scheduled
+
+    def start(self):
+        """Run refresh_due every refresh_interval_s in a daemon thread"""
+        if self._refresher is None:
+            def loop():
+                while not self._stop.wait(self.refresh_interval_s):
+                    self.refresh_due()
+            self._refresher = threading.Thread(target=loop, name='weather-refresher', daemon=True)
+            self._refresher.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._pool.shutdown(wait=False)
+
+    def stats(self):
+        return {'entries': len(self._entries), 'in_flight': len(self._in_flight), 'hits': self.hits,
+                'stale_hits': self.stale_hits, 'misses': self.misses, 'fetches': self.fetches,
+                'failures': self.failures}
+
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The backend modules live in "polar h10/" (not a package) and the signal code in
+# biosignals/ at the repository root; make both importable from the tests.
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+for path in (ROOT, os.path.join(ROOT, 'polar h10')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,41 @@
+import threading
+
+import numpy as np
+
+from biosignals.activity import ActivityRegistry
+
+RATE = 32.0
+
+
+def epoch_of_samples(seed):
+    # One 10 s epoch of 1 g at rest plus a little movement
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.normal(0, 0.05, 320), rng.normal(0, 0.05, 320), 1 + rng.normal(0, 0.05, 320)])
+
+
+def test_first_windows_from_concurrent_requests_share_one_stream():
+    registry = ActivityRegistry()
+    start = threading.Barrier(8)
+
+    def post(k):
+        start.wait()
+        registry.add('u', epoch_of_samples(k), RATE, t_first=0.0)
+
+    threads = [threading.Thread(target=post, args=(k,)) for k in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # No thread's window was dropped by a stream another thread replaced
+    assert registry.summary('u', last_epochs=100)['epochs'] == 8
+
+
+def test_rate_change_starts_a_new_stream():
+    registry = ActivityRegistry()
+    registry.add('u', epoch_of_samples(0), RATE)
+    stream = registry._streams['u']
+    registry.add('u', epoch_of_samples(1), RATE)
+    assert registry._streams['u'] is stream and registry.summary('u')['epochs'] == 2
+    registry.add('u', epoch_of_samples(2), 50.0)
+    assert registry._streams['u'].rate == 50.0 and registry.summary('u') is None
+    assert registry.summary('other') is None
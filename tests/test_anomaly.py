@@ -0,0 +1,75 @@
+import time
+
+import numpy as np
+import pytest
+
+from anomaly import MIN_READINGS, Z_THRESHOLD, AnomalyEngine, RobustStats
+
+# Local midnight, so each test's readings land in known time-of-day blocks
+T0 = time.mktime((2025, 6, 1, 0, 0, 0, 0, 0, -1))
+
+
+def steady(engine, n, user='u', start=T0, seed=0):
+    rng = np.random.default_rng(seed)
+    for i in range(n):
+        engine.add(user, {'HR': 70 + rng.normal(0, 2), 'Temp': 36.7 + rng.normal(0, 0.05)}, start + i * 60)
+    return start + n * 60
+
+
+def test_robust_stats_resist_a_single_outlier():
+    stats = RobustStats()
+    for x in np.random.default_rng(1).normal(70, 2, 300):
+        stats.update(x, 2.0)
+    median, mad = stats.median, stats.mad
+    stats.update(500.0, 2.0)
+    assert median == pytest.approx(70, abs=1) and mad == pytest.approx(2 * 0.6745, abs=0.5)
+    assert abs(stats.median - median) <= 0.05 * max(mad, 2.0) + 1e-12
+
+
+def test_no_flags_before_min_readings():
+    engine = AnomalyEngine()
+    t = steady(engine, MIN_READINGS - 1)
+    assert engine.add('u', {'HR': 200.0}, t) == []
+    assert engine.snapshot('u')[0]['HR']['z'] == 0.0
+
+
+def test_spike_flagged_once_per_episode():
+    engine = AnomalyEngine()
+    t = steady(engine, 60)
+    flagged = []
+    for i, hr in enumerate([110.0, 115.0, 112.0, 70.0, 70.0, 118.0]):
+        flagged.append([a['vital'] for a in engine.add('u', {'HR': hr, 'Temp': 36.7}, t + i * 60)])
+    # Three anomalous readings in a row are one episode; the later spike starts a new one
+    assert flagged == [['HR'], [], [], [], [], ['HR']]
+    current, recent = engine.snapshot('u')
+    assert len(recent) == 2 and recent[0]['value'] == 118.0
+    assert recent[0]['z'] > Z_THRESHOLD and recent[0]['concerning']
+    assert not current['Temp']['anomalous']
+
+
+def test_low_reading_is_anomalous_but_only_concerning_in_its_direction():
+    engine = AnomalyEngine()
+    t = steady(engine, 60)
+    (low,) = engine.add('u', {'HR': 40.0}, t)
+    assert low['z'] < -Z_THRESHOLD and not low['concerning']
+
+
+def test_missing_values_are_neither_scored_nor_learned():
+    engine = AnomalyEngine()
+    t = steady(engine, 30)
+    assert engine.add('u', {'HR': 0.0, 'Temp': float('nan'), 'Water Intake': None}, t) == []
+    current, _ = engine.snapshot('u')
+    assert current['HR']['value'] != 0.0 and 'Water Intake' not in current
+    state = engine._users['u']
+    assert state.stats['HR'][-1].n == 30 and state.stats['Water Intake'][-1].n == 0
+
+
+def test_time_of_day_block_used_once_it_has_enough_readings():
+    engine = AnomalyEngine()
+    # Two hours of night readings fill one 4-hour block
+    steady(engine, 120)
+    assert engine.snapshot('u')[0]['HR']['time_of_day']
+    # The first reading in a new block falls back to the whole-day statistics
+    engine.add('u', {'HR': 70.0}, T0 + 12 * 3600)
+    assert not engine.snapshot('u')[0]['HR']['time_of_day']
+    assert engine.snapshot('other') is None and len(engine) == 1
@@ -0,0 +1,105 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from baselines import MIN_READINGS, VITALS, WARMUP, QuantileBaselines, init_baseline_table
+
+
+def reading(hr, temp=36.7, steps=4000.0, water=1.2):
+    return {'heart_rate': hr, 'body_temp': temp, 'steps': steps, 'water_intake': water}
+
+
+def test_exact_percentiles_during_warmup():
+    baselines = QuantileBaselines()
+    hr = np.random.default_rng(0).normal(72, 6, WARMUP)
+    for i, value in enumerate(hr):
+        baselines.update(None, 'u', reading(value))
+        if i + 1 < MIN_READINGS:
+            assert baselines.get(None, 'u') is None
+    tracked = baselines.get(None, 'u')['heart_rate']
+    assert [tracked['p10'], tracked['p50'], tracked['p90']] == pytest.approx(np.percentile(hr, [10, 50, 90]))
+    assert tracked['count'] == WARMUP
+
+
+def test_switches_to_tracking_after_warmup():
+    baselines = QuantileBaselines()
+    for value in range(1, WARMUP + 1):
+        baselines.update(None, 'u', reading(float(value)))
+    user = baselines.users['u']
+    assert user.warmup[0] is None
+    before = user.quantiles[0].copy()
+    # Once tracking, one extreme reading moves each quantile by one small step
+    baselines.update(None, 'u', reading(500.0))
+    assert np.all(user.quantiles[0] > before)
+    assert np.all(user.quantiles[0] - before < 1.0)
+
+
+def test_tracked_quantiles_follow_the_distribution():
+    rng = np.random.default_rng(1)
+    hr = np.concatenate([rng.normal(72, 6, 3000), [190.0] * 20])
+    rng.shuffle(hr)
+    baselines = QuantileBaselines()
+    for value in hr:
+        baselines.update(None, 'u', reading(value))
+    tracked = baselines.get(None, 'u')['heart_rate']
+    exact = np.percentile(hr, [10, 50, 90])
+    assert [tracked['p10'], tracked['p50'], tracked['p90']] == pytest.approx(exact, abs=2.5)
+
+
+def test_missing_values_are_skipped():
+    baselines = QuantileBaselines()
+    for _ in range(MIN_READINGS):
+        baselines.update(None, 'u', reading(70.0, temp=0.0, water=None))
+    assert set(baselines.get(None, 'u')) == {'heart_rate', 'steps'}
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE user_metrics (user_id TEXT, timestamp DATETIME, '
+                 + ', '.join(f'{v} REAL' for v in VITALS) + ')')
+    init_baseline_table(conn)
+    yield conn
+    conn.close()
+
+
+def test_seeds_first_seen_user_from_stored_metrics(conn):
+    # Seeding compares against SQLite's datetime('now'), which is UTC
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    rows = [('u', now - timedelta(hours=i), 60.0 + i, 36.7, 5000.0, 1.0) for i in range(30)]
+    rows.append(('u', now - timedelta(days=60), 200.0, 36.7, 5000.0, 1.0))  # older than SEED_DAYS
+    conn.executemany('INSERT INTO user_metrics VALUES (?, ?, ?, ?, ?, ?)', rows)
+    hr = QuantileBaselines().get(conn, 'u')['heart_rate']
+    assert hr['count'] == 30
+    assert hr['p50'] == pytest.approx(np.percentile(60.0 + np.arange(30), 50))
+
+
+def test_load_restarts_unfinished_warmup(conn):
+    baselines = QuantileBaselines()
+    for i in range(WARMUP + 5):
+        # Water intake only every other reading, so it's still warming up
+        baselines.update(None, 'u', reading(70.0 + i % 5, water=1.0 if i % 2 else None))
+    baselines.save_user(conn, 'u')
+
+    loaded = QuantileBaselines()
+    assert loaded.load(conn) == 1
+    user = loaded.users['u']
+    np.testing.assert_array_equal(user.quantiles[0], baselines.users['u'].quantiles[0])
+    assert user.counts[0] == WARMUP + 5 and user.warmup[0] is None
+    assert user.counts[3] == 0 and user.warmup[3] == []
+    # The loaded user isn't re-seeded from user_metrics
+    assert loaded.get(conn, 'u')['heart_rate']['count'] == WARMUP + 5
+
+
+def test_seed_before_storing_counts_the_new_row_once(conn):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    conn.executemany('INSERT INTO user_metrics VALUES (?, ?, ?, ?, ?, ?)',
+                     [('u', now - timedelta(hours=i), 70.0, 36.7, 5000.0, 1.0) for i in range(12)])
+    baselines = QuantileBaselines()
+    # As store_user_metrics does: seed, store the row, then update
+    baselines.seed_user(conn, 'u')
+    conn.execute('INSERT INTO user_metrics VALUES (?, ?, ?, ?, ?, ?)', ('u', now, 72.0, 36.7, 5000.0, 1.0))
+    baselines.update(conn, 'u', reading(72.0))
+    assert baselines.get(conn, 'u')['heart_rate']['count'] == 13
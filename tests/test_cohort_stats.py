@@ -0,0 +1,95 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from cohort_stats import (N_BINS, RANGES, SIGNALS, CohortSketches, cohort_key, describe, init_sketch_table,
+                          rebuild, summarize)
+
+WIDTH = {s: (hi - lo) / N_BINS for s, (lo, hi) in RANGES.items()}
+
+
+def readings(n, seed=0, hr=75.0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.normal(hr, 12, n), rng.normal(36.9, 0.4, n), rng.uniform(0.2, 3.5, n)])
+
+
+def test_percentiles_within_one_bin_of_numpy():
+    values = readings(20000)
+    stats = describe(*summarize(values))
+    for i, signal in enumerate(SIGNALS):
+        assert stats[signal]['count'] == len(values)
+        assert stats[signal]['mean'] == pytest.approx(values[:, i].mean())
+        assert stats[signal]['std'] == pytest.approx(values[:, i].std(ddof=1), rel=1e-6)
+        for p in (10, 25, 50, 75, 90):
+            assert abs(stats[signal][f'p{p}'] - np.percentile(values[:, i], p)) <= WIDTH[signal]
+
+
+def test_missing_values_are_skipped():
+    moments, hist = summarize([[0.0, 36.8, 1.0], [72.0, 0.0, 0.0], [np.nan, 37.0, -1.0]])
+    # HR and Temp send 0 for no data; 0 L of water is a real reading
+    np.testing.assert_array_equal(moments[:, 0], [1, 2, 2])
+    np.testing.assert_array_equal(hist.sum(axis=1), [1, 2, 2])
+    assert describe(*summarize(np.zeros((0, 3))))['HR'] is None
+
+
+def test_cohort_key_normalizes_profile():
+    assert cohort_key(30, 'Female', 'Yes') == ('25-34', 'f', 'active')
+    assert cohort_key(None, 'x', False) == (None, None, 'inactive')
+
+
+def test_add_matches_batch_summary_and_profile_moves_cells():
+    sketches = CohortSketches()
+    values = readings(50)
+    for row in values:
+        sketches.add('u', dict(zip(SIGNALS, row)))
+    moments, hist = summarize(values)
+    np.testing.assert_allclose(sketches.users['u'][0], moments)
+    np.testing.assert_array_equal(sketches.users['u'][1], hist)
+
+    sketches.set_profile('u', 30, 'm', True)
+    cell = sketches.cells[('25-34', 'm', 'active')]
+    assert cell[2] == 1 and cell[1].sum() == hist.sum()
+    unknown = sketches.cells[(None, None, None)]
+    assert unknown[2] == 0 and unknown[1].sum() == 0
+
+
+def test_query_merges_matching_cells_and_compare_ranks_user():
+    sketches = CohortSketches()
+    for k, (age, gender) in enumerate([(22, 'm'), (30, 'm'), (40, 'f')]):
+        user = f'u{k}'
+        sketches.set_summary(user, *summarize(readings(500, seed=k, hr=60.0 + 10 * k)))
+        sketches.set_profile(user, age, gender, True)
+
+    moments, _, n_users, cohort = sketches.query(('25-34', 'm', 'active'), by=('gender',))
+    assert n_users == 2 and cohort == {'gender': 'm'} and moments[0, 0] == 1000
+
+    result = sketches.compare('u1', by=('activity',))
+    assert result['n_users'] == 3
+    # u1's median HR (~70) is the middle of the three users
+    assert 35 < result['signals']['HR']['user_percentile'] < 65
+
+
+def test_load_restores_summaries_and_profiles(tmp_path):
+    db = tmp_path / 'health.db'
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE users (user_id TEXT PRIMARY KEY)')
+    conn.execute('CREATE TABLE user_metrics (user_id TEXT, heart_rate REAL, body_temp REAL, water_intake REAL)')
+    init_sketch_table(conn)
+    conn.executemany('INSERT INTO users (user_id, age, gender, physically_active) VALUES (?, ?, ?, ?)',
+                     [('a', 30, 'f', 1), ('b', 60, 'm', 0)])
+    conn.executemany('INSERT INTO user_metrics VALUES (?, ?, ?, ?)',
+                     [('a', *row) for row in readings(40)])
+    conn.commit()
+    conn.close()
+
+    rebuilt = rebuild(str(db))
+    assert rebuilt.users['a'][2] == ('25-34', 'f', 'active')
+
+    conn = sqlite3.connect(db)
+    loaded = CohortSketches()
+    assert loaded.load(conn) == 1
+    conn.close()
+    np.testing.assert_array_equal(loaded.users['a'][1], rebuilt.users['a'][1])
+    # b has a profile but no saved summary yet
+    assert loaded.users['b'][2] == ('50+', 'm', 'inactive') and loaded.users['b'][0].sum() == 0
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from flat_forest import FlatForest, _threshold_to_float32
+from model_store import read_artifact, write_artifact
+
+FOREST_PARAMS = [
+    {'n_estimators': 100},
+    {'n_estimators': 30, 'max_depth': 6},
+    {'n_estimators': 50, 'min_samples_leaf': 5, 'max_features': None},
+]
+
+
+@pytest.fixture(scope='module')
+def vitals():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(3000, 8)) * [10, 0.5, 3000, 1, 100, 1, 1, 1] + [75, 36.6, 5000, 1.5, 200, 0, 0, 1]
+    y = (X[:, 0] + 20 * X[:, 1] - X[:, 3] * 10 + rng.normal(scale=5, size=len(X)) > 800).astype(int)
+    return X, y
+
+
+@pytest.mark.parametrize('params', FOREST_PARAMS, ids=['unbounded', 'max_depth', 'max_features_none'])
+def test_matches_sklearn(vitals, params):
+    X, y = vitals
+    forest = RandomForestClassifier(random_state=42, **params).fit(X[:2000], y[:2000])
+    flat = FlatForest.from_sklearn(forest)
+    X_check = np.vstack([X[2000:], X[:200]])
+    np.testing.assert_allclose(flat.predict_proba(X_check), forest.predict_proba(X_check), atol=1e-6)
+    np.testing.assert_array_equal(flat.predict(X_check), forest.predict(X_check))
+
+
+def test_single_row_input(vitals):
+    X, y = vitals
+    forest = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    flat = FlatForest.from_sklearn(forest)
+    np.testing.assert_allclose(flat.predict_proba(X[0]), forest.predict_proba(X[:1]), atol=1e-6)
+
+
+# Adjacent float32 values whose float64 midpoint rounds to nearest *up* to HI,
+# so a plain float32 cast of the threshold would send HI left
+LO = np.nextafter(np.float32(36.6), np.float32(np.inf))
+HI = np.nextafter(LO, np.float32(np.inf))
+
+
+def test_threshold_rounds_down_to_float32():
+    threshold = np.array([(np.float64(LO) + np.float64(HI)) / 2])
+    assert np.float32(threshold[0]) == HI
+    t32 = _threshold_to_float32(threshold)
+    assert t32.dtype == np.float32
+    assert t32[0] <= threshold[0]
+    # Every float32 x compares the same way against the rounded threshold
+    assert (LO <= t32[0]) == (np.float64(LO) <= threshold[0])
+    assert (HI <= t32[0]) == (np.float64(HI) <= threshold[0])
+
+
+def test_split_between_adjacent_float32_values():
+    X = np.array([[LO], [HI]] * 20, dtype=np.float64)
+    y = np.array([0, 1] * 20)
+    forest = RandomForestClassifier(n_estimators=5, bootstrap=False, random_state=0).fit(X, y)
+    flat = FlatForest.from_sklearn(forest)
+    np.testing.assert_array_equal(flat.predict(X[:2]), forest.predict(X[:2]))
+    np.testing.assert_array_equal(flat.predict(X[:2]), [0, 1])
+
+
+def test_round_trip_through_model_store(vitals, tmp_path):
+    X, y = vitals
+    forest = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    flat = FlatForest.from_sklearn(forest)
+    for compress in (True, False):
+        path = str(tmp_path / f'model-{compress}.hms')
+        write_artifact(path, arrays=flat.to_arrays(), compress=compress)
+        arrays, _, _ = read_artifact(path, mmap=not compress)
+        loaded = FlatForest.from_arrays(arrays)
+        np.testing.assert_array_equal(loaded.predict_proba(X[:300]), flat.predict_proba(X[:300]))
+        np.testing.assert_array_equal(loaded.classes_, forest.classes_)
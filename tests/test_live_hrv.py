@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from live_hrv import LiveHRVRegistry, StreamingHRV
+
+
+def batch_metrics(times, rrs, window_s, now):
+    """Reference over a run of accepted, consecutive beats"""
+    times, rrs = np.asarray(times), np.asarray(rrs)
+    inside = times > now - window_s
+    paired = inside[1:] & inside[:-1]
+    diffs = np.diff(rrs)[paired]
+    return inside.sum(), rrs[inside].mean(), rrs[inside].std(ddof=1), np.sqrt(np.mean(diffs ** 2)), paired.sum()
+
+
+def test_matches_batch_computation_while_evicting():
+    rng = np.random.default_rng(0)
+    rr = 800 + 40 * np.sin(np.arange(1500) / 15) + rng.normal(0, 10, 1500)
+    t = 1.7e9 + np.cumsum(rr) / 1000.0
+    estimator = StreamingHRV()
+    for i, (value, ts) in enumerate(zip(rr, t)):
+        assert estimator.add_beat(value, ts)
+        if i in (50, 400, 1499):
+            for window in estimator.windows:
+                m = estimator.metrics(window)
+                n, mean, sdnn, rmssd, pairs = batch_metrics(t[:i + 1], rr[:i + 1], window, ts)
+                assert m['n_beats'] == n
+                assert m['mean_rr_ms'] == pytest.approx(mean)
+                assert m['sdnn_ms'] == pytest.approx(sdnn, rel=1e-6)
+                assert m['rmssd_ms'] == pytest.approx(rmssd)
+                # The pair of the oldest beat leaves with it: n beats in a row make n - 1 pairs
+                assert estimator.windows[window].pairs == pairs == n - 1
+
+
+def test_rejected_beat_breaks_the_pair():
+    estimator = StreamingHRV(windows=(60.0,))
+    t = 1000.0
+    for rr in (800, 820, 2500, 810, 790):  # 2500 ms is out of range
+        t += rr / 1000.0
+        estimator.add_beat(rr, t)
+    m = estimator.metrics()
+    assert m['n_beats'] == 4
+    # Pairs: 800-820 and 810-790; nothing spans the rejected beat
+    assert estimator.windows[60.0].pairs == 2
+    assert m['rmssd_ms'] == pytest.approx(20.0)
+    assert estimator.rejected == 1
+
+
+def test_ectopic_beats_rejected_until_sustained():
+    estimator = StreamingHRV(windows=(60.0,))
+    t = 0.0
+    accepted = []
+    for rr in [800] * 5 + [500] * 8:
+        t += rr / 1000.0
+        accepted.append(estimator.add_beat(rr, t))
+    # Five rejections in a row, then the faster rhythm is taken as real
+    assert accepted == [True] * 5 + [False] * 5 + [True] * 3
+
+
+def test_beats_age_out_at_query_time():
+    estimator = StreamingHRV(windows=(60.0,))
+    estimator.add_rr([800.0, 810.0, 790.0], received_at=100.0)
+    assert estimator.metrics(now=100.0)['n_beats'] == 3
+    m = estimator.metrics(now=200.0)
+    assert m['n_beats'] == 0 and m['rmssd_ms'] is None and estimator.windows[60.0].pairs == 0
+
+
+def test_batch_is_placed_back_from_receive_time():
+    registry = LiveHRVRegistry(windows=(60.0,))
+    assert registry.metrics('u') is None
+    assert registry.add_rr('u', [1000.0, 1000.0], received_at=50.0) == 2
+    estimator = registry.get('u')
+    assert estimator.last_time == 50.0
+    assert estimator._t[0] == pytest.approx(49.0)
@@ -0,0 +1,69 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from live_trend import HoltTrend, TrendRegistry
+
+
+def test_recovers_slope_of_irregular_ramp():
+    rng = np.random.default_rng(0)
+    trend = HoltTrend()
+    t0 = 1.7e9
+    for i in range(120):
+        t = t0 + i * 60 + rng.uniform(-10, 10)
+        trend.update(70 + 0.5 * (t - t0) / 60 + rng.normal(0, 1), t)
+    assert trend.slope == pytest.approx(0.5, abs=0.1)
+    assert trend.forecast(30) == pytest.approx(trend.level + 30 * trend.slope)
+
+
+def test_same_timestamp_only_refines_level():
+    trend = HoltTrend()
+    trend.update(70.0, 100.0)
+    trend.update(90.0, 100.0)
+    assert trend.slope == 0.0 and trend.last_time == 100.0
+    assert 70.0 < trend.level < 71.0
+
+
+def test_registry_skips_missing_signals():
+    registry = TrendRegistry()
+    assert registry.state('u') is None
+    registry.update('u', 100.0, {'HR': 70.0, 'Temp': None})
+    state = registry.state('u')
+    assert set(state) == {'HR'} and state['HR'] == (70.0, 0.0, 1)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE user_metrics (user_id TEXT, timestamp DATETIME, heart_rate REAL, '
+                 'body_temp REAL, water_intake REAL)')
+    yield conn
+    conn.close()
+
+
+def test_seeds_first_seen_user_from_recent_metrics(conn):
+    now = datetime.now()
+    rows = [('u', now - timedelta(minutes=60 - i), 70 + 0.3 * i, 36.8, 1.0) for i in range(60)]
+    # Older than the seed window, and another user's rows: both ignored
+    rows += [('u', now - timedelta(hours=5), 200.0, 40.0, 9.0), ('v', now, 150.0, 39.0, 0.5)]
+    conn.executemany('INSERT INTO user_metrics VALUES (?, ?, ?, ?, ?)', rows)
+
+    registry = TrendRegistry()
+    registry.update('u', time.time(), {'HR': 88.0, 'Temp': 36.8}, conn)
+    state = registry.state('u')
+    assert state['HR'][2] == 61 and state['Water Intake'][2] == 60
+    assert state['HR'][1] == pytest.approx(0.3, abs=0.02)
+    assert state['Temp'][0] == pytest.approx(36.8)
+
+    # Seeding happens once; a later connection doesn't replay the rows again
+    registry.update('u', time.time() + 60, {'HR': 88.0}, conn)
+    assert registry.state('u')['HR'][2] == 62
+
+
+def test_unknown_user_starts_empty(conn):
+    registry = TrendRegistry()
+    registry.update('new', 100.0, {'HR': 70.0}, conn)
+    assert registry.state('new')['HR'][2] == 1
@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from model_store import (ModelStore, read_artifact, scaler_from_arrays, scaler_to_arrays,
+                         write_artifact)
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_artifact_round_trip(tmp_path, compress):
+    path = str(tmp_path / 'a.hms')
+    arrays = {'w': np.arange(12, dtype=np.float32).reshape(3, 4), 'depth': np.array(7), 'empty': np.zeros(0)}
+    write_artifact(path, arrays, obj={'kind': 'pipeline'}, meta={'rows': 3}, compress=compress)
+    loaded, obj, meta = read_artifact(path, mmap=True)
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(loaded[name], array)
+        assert loaded[name].dtype == array.dtype
+    assert obj == {'kind': 'pipeline'} and meta == {'rows': 3}
+    assert isinstance(loaded['w'], np.memmap) == (not compress)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'x.hms'
+    path.write_bytes(b'not an artifact')
+    with pytest.raises(ValueError):
+        read_artifact(str(path))
+
+
+def test_versions_and_gc(tmp_path):
+    store = ModelStore(str(tmp_path))
+    assert store.load('u1', 'personal') is None
+    for i in range(4):
+        store.save('u1', 'personal', arrays={'v': np.array([i])}, keep=2)
+    store.save('u1', 'ensemble', arrays={'v': np.array([9])})
+    assert len(store._versions('u1', 'personal')) == 2
+    arrays, _, meta = store.load('u1', 'personal')
+    assert arrays['v'][0] == 3 and meta['user_id'] == 'u1' and meta['kind'] == 'personal'
+    # Sharded two levels deep by the user-id hash
+    assert os.path.relpath(store.user_dir('u1'), str(tmp_path)).count(os.sep) == 2
+    assert store.gc(keep=1) == 1
+    assert len(store._versions('u1', 'personal')) == 1 and store.load('u1', 'ensemble') is not None
+
+
+def test_scaler_round_trip():
+    X = np.random.default_rng(0).normal(5, 2, size=(100, 5))
+    scaler = StandardScaler().fit(X)
+    np.testing.assert_array_equal(scaler_from_arrays(scaler_to_arrays(scaler)).transform(X), scaler.transform(X))
+
+
+def test_store_writes_raw_arrays_that_load_as_memory_maps(tmp_path):
+    store = ModelStore(str(tmp_path))
+    store.save('u1', 'personal', arrays={'w': np.arange(8.0)})
+    arrays, _, _ = store.load('u1', 'personal', mmap=True)
+    assert isinstance(arrays['w'], np.memmap)
+    np.testing.assert_array_equal(arrays['w'], np.arange(8.0))
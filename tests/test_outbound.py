@@ -0,0 +1,116 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('requests')
+
+import outbound
+from outbound import CircuitBreaker, DependencyUnavailable, OutboundClient
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(outbound, 'time', SimpleNamespace(time=lambda: now[0], perf_counter=time.perf_counter))
+    return now
+
+
+def test_breaker_opens_then_half_opens_for_one_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout_s=30.0)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    clock[0] += 30.0
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    # Exactly one trial call at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0 and breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=30.0)
+    breaker.record_failure()
+    clock[0] += 31.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opened_at == clock[0]
+    assert not breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_guard_rejects_beyond_the_concurrency_limit():
+    client = OutboundClient()
+    client.register('api', max_concurrency=1)
+    with client.guard('api'):
+        with pytest.raises(DependencyUnavailable, match='too many'):
+            with client.guard('api'):
+                pass
+    # The slot is released: a new call goes through
+    with client.guard('api'):
+        pass
+    metrics = client.metrics()['api']
+    assert metrics['rejected'] == 1 and metrics['calls'] == 2 and metrics['errors'] == 0
+
+
+def test_call_falls_back_on_failures_and_open_breaker(clock):
+    client = OutboundClient()
+    client.register('api', failure_threshold=2, reset_timeout_s=30.0)
+    calls = []
+
+    def boom():
+        calls.append(1)
+        raise ConnectionError('down')
+
+    assert client.call('api', boom, fallback=lambda: 'cached') == 'cached'
+    with pytest.raises(ConnectionError):
+        client.call('api', boom)
+    # Open now: fn isn't called at all
+    assert client.call('api', boom, fallback=lambda: 'cached') == 'cached'
+    with pytest.raises(DependencyUnavailable, match='circuit open'):
+        client.call('api', boom)
+    assert len(calls) == 2
+    metrics = client.metrics()['api']
+    assert metrics['state'] == 'open' and metrics['errors'] == 2 and metrics['short_circuited'] == 2
+
+    clock[0] += 30.0
+    assert client.call('api', lambda: 'fresh') == 'fresh'
+    assert client.metrics()['api']['state'] == 'closed'
+
+
+def test_failed_results_count_as_failures():
+    client = OutboundClient()
+    client.register('api', failure_threshold=2)
+    bad = lambda r: r['status'] >= 500
+    # Without a fallback the failed result itself is returned
+    assert client.call('api', lambda: {'status': 503}, is_failure=bad) == {'status': 503}
+    assert client.call('api', lambda: {'status': 503}, fallback=lambda: None, is_failure=bad) is None
+    assert client.metrics()['api']['state'] == 'open'
+
+
+def test_request_uses_the_session_and_dependency_timeout(monkeypatch):
+    client = OutboundClient()
+    client.register('weather', timeout_s=2.5)
+    seen = []
+
+    def fake_request(method, url, **kwargs):
+        seen.append((method, url, kwargs))
+        return SimpleNamespace(status_code=502)
+
+    monkeypatch.setattr(client.session, 'request', fake_request)
+    assert client.get('weather', 'http://api.test/w', fallback=lambda: 'none', params={'q': 1}) == 'none'
+    assert seen == [('GET', 'http://api.test/w', {'params': {'q': 1}, 'timeout': 2.5})]
+    assert client.metrics()['weather']['errors'] == 1
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import scalable_ensemble
+from scalable_ensemble import fit_within_budget, stratified_subsample, train_ensemble
+
+
+def make_data(n, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 4))
+    y = ((X[:, 0] + X[:, 1] ** 2 - X[:, 3] + rng.normal(scale=0.5, size=n)) > 1).astype(int)
+    return X, y
+
+
+def test_stratified_subsample_keeps_class_balance():
+    y = np.array([0] * 900 + [1] * 100)
+    idx = stratified_subsample(y, 200)
+    assert len(idx) == 200
+    assert len(np.unique(idx)) == 200
+    assert (y[idx] == 1).sum() == 20
+    np.testing.assert_array_equal(stratified_subsample(y, 5000), np.arange(len(y)))
+
+
+def test_auto_mode_switches_on_row_count(monkeypatch):
+    monkeypatch.setattr(scalable_ensemble, 'EXACT_MAX_ROWS', 300)
+    monkeypatch.setattr(scalable_ensemble, 'START_ROWS', 200)
+    X, y = make_data(250)
+    _, info = train_ensemble(X, y, mode='auto')
+    assert info['mode'] == 'exact' and info['rows_used'] == 250
+    X, y = make_data(400)
+    model, info = train_ensemble(X, y, mode='auto')
+    assert info['mode'] == 'scalable'
+    assert model.predict_proba(X[:5]).shape == (5, 2)
+
+
+def test_budget_stops_doubling(monkeypatch):
+    monkeypatch.setattr(scalable_ensemble, 'START_ROWS', 200)
+    X, y = make_data(1600)
+    _, rows_used, _ = fit_within_budget(X, y, time_budget_s=0.0)
+    assert rows_used == 200
+    _, rows_used, _ = fit_within_budget(X, y, time_budget_s=600.0)
+    assert rows_used == 1600
+
+
+def test_unknown_mode():
+    X, y = make_data(50)
+    with pytest.raises(ValueError):
+        train_ensemble(X, y, mode='fast')
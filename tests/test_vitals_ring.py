@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from vitals_ring import VitalsRing, VitalsStore
+
+NOW = 1.7e9
+
+
+def filled_ring(n, capacity=64, step_s=30):
+    ring = VitalsRing(capacity=capacity)
+    for i in range(n):
+        ring.append(NOW - (n - 1 - i) * step_s, {'HR': 70 + i * 0.1, 'Temp': 36.5, 'HR Quality': 1.0})
+    return ring
+
+
+def test_window_keeps_rows_inside_the_time_range():
+    ring = filled_ring(10)
+    t, values = ring.window(120, NOW)
+    # Rows at now - 120 s (inclusive) .. now
+    np.testing.assert_array_equal(t, (NOW - np.array([120, 90, 60, 30, 0])) * 1000)
+    assert values.shape == (len(ring.columns), 5)
+    assert ring.window(10, NOW + 5000)[0].size == 0
+
+
+def test_wrapped_ring_returns_newest_rows_in_order():
+    ring = filled_ring(200)
+    assert len(ring) == 64 and ring.count == 200
+    t, values = ring.window(10 ** 6, NOW)
+    assert len(t) == 64 and np.all(np.diff(t) > 0)
+    hr = values[ring.column_index['HR']]
+    np.testing.assert_allclose(hr, 70 + np.arange(136, 200) * 0.1, rtol=1e-6)
+    assert ring.latest()['timestamp'] == NOW
+
+
+def test_window_returns_copies():
+    ring = filled_ring(64)
+    t, values = ring.window(600, NOW)
+    before = values.copy()
+    for i in range(64):
+        ring.append(NOW + 1 + i, {'HR': 0.0})
+    np.testing.assert_array_equal(values, before)
+
+
+def test_stats_slope_and_summary():
+    ring = filled_ring(41)
+    stats = ring.stats(20 * 60, NOW, ['HR', 'Temp'], weight_column='HR Quality')
+    hr = stats['columns']['HR']
+    assert stats['n'] == 41 and stats['span_minutes'] == pytest.approx(20.0)
+    # +0.1 bpm per 30 s reading
+    assert hr['slope'] == pytest.approx(0.2, rel=1e-4)
+    assert hr['first'] == pytest.approx(70.0) and hr['last'] == pytest.approx(74.0, rel=1e-6)
+    assert hr['min'] == pytest.approx(70.0) and hr['max'] == pytest.approx(74.0, rel=1e-6)
+    assert stats['columns']['Temp']['slope'] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_quality_weights_discount_bad_readings():
+    ring = VitalsRing()
+    for i in range(10):
+        spike = i == 9
+        ring.append(NOW - (9 - i) * 30, {'HR': 150.0 if spike else 70.0, 'HR Quality': 0.0 if spike else 1.0})
+    weighted = ring.stats(600, NOW, ['HR'], weight_column='HR Quality')['columns']['HR']
+    plain = ring.stats(600, NOW, ['HR'])['columns']['HR']
+    assert weighted['mean'] == pytest.approx(70.0)
+    assert plain['mean'] == pytest.approx(78.0)
+
+
+def test_stats_needs_two_rows_and_missing_values_are_nan():
+    ring = filled_ring(1)
+    assert ring.stats(600, NOW) is None
+    assert np.isnan(ring.latest()['Water Intake'])
+
+
+def test_store_creates_rings_on_demand():
+    store = VitalsStore(capacity=8)
+    assert store.get('u') is None
+    store.append('u', NOW, {'HR': 70.0})
+    assert len(store) == 1 and len(store.get('u')) == 1 and store.get('u').capacity == 8
@@ -0,0 +1,128 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import weather_cache
+from weather_cache import FAILURE_BACKOFF_S, WeatherCache
+
+
+class FakeWeather:
+    """fetch stand-in: counts calls, can block until released or fail"""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = False
+
+    def __call__(self, lat, lon):
+        self.calls.append((lat, lon))
+        self.release.wait(5)
+        if self.fail:
+            raise ConnectionError('weather API down')
+        return {'temperature': 20.0 + len(self.calls), 'humidity': 40}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(weather_cache, 'time', SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def api():
+    return FakeWeather()
+
+
+@pytest.fixture
+def cache(api, clock):
+    cache = WeatherCache(api, ttl_s=600.0, stale_s=3600.0)
+    yield cache
+    api.release.set()
+    cache.stop()
+
+
+def settle(cache):
+    for future in list(cache._in_flight.values()):
+        future.result(timeout=5)
+
+
+def test_cold_miss_returns_none_then_the_value(cache, api):
+    assert cache.get(40.7128, -74.0060) is None
+    settle(cache)
+    # Nearby coordinates share the rounded grid cell
+    assert cache.get(40.71, -74.01) == {'temperature': 21.0, 'humidity': 40}
+    assert api.calls == [(40.7, -74.0)]
+    assert cache.stats()['misses'] == 1 and cache.stats()['hits'] == 1
+
+
+def test_concurrent_lookups_share_one_fetch(cache, api):
+    api.release.clear()
+    assert all(cache.get(40.7, -74.0) is None for _ in range(50))
+    assert cache.stats()['in_flight'] == 1
+    api.release.set()
+    settle(cache)
+    assert len(api.calls) == 1
+
+
+def test_stale_value_served_while_revalidating(cache, api, clock):
+    cache.get(40.7, -74.0)
+    settle(cache)
+    clock[0] += 700  # past ttl_s, inside stale_s
+    api.release.clear()
+    assert cache.get(40.7, -74.0)['temperature'] == 21.0
+    assert cache.get(40.7, -74.0)['temperature'] == 21.0
+    assert cache.stats()['in_flight'] == 1 and cache.stats()['stale_hits'] == 2
+    api.release.set()
+    settle(cache)
+    assert len(api.calls) == 2 and cache.get(40.7, -74.0)['temperature'] == 22.0
+
+
+def test_expired_past_stale_window_is_a_miss(cache, clock):
+    cache.get(40.7, -74.0)
+    settle(cache)
+    clock[0] += 600 + 3600 + 1
+    assert cache.get(40.7, -74.0) is None
+
+
+def test_failed_fetch_keeps_stale_value_and_backs_off(cache, api, clock):
+    cache.get(40.7, -74.0)
+    settle(cache)
+    clock[0] += 700
+    api.fail = True
+    assert cache.get(40.7, -74.0)['temperature'] == 21.0
+    settle(cache)
+    assert cache.stats()['failures'] == 1
+    # Within the backoff the stale value is served without another fetch
+    clock[0] += FAILURE_BACKOFF_S / 2
+    assert cache.get(40.7, -74.0)['temperature'] == 21.0
+    assert len(api.calls) == 2
+    clock[0] += FAILURE_BACKOFF_S
+    api.fail = False
+    cache.get(40.7, -74.0)
+    settle(cache)
+    assert len(api.calls) == 3 and cache.get(40.7, -74.0)['temperature'] == 23.0
+
+
+def test_cold_lookup_can_wait_for_its_fetch(cache):
+    assert cache.get(51.5, -0.12, wait_s=2.0)['temperature'] == 21.0
+
+
+def test_refresh_due_rewarms_read_entries_and_drops_unused(api, clock):
+    cache = WeatherCache(api, ttl_s=600.0, stale_s=3600.0, keep_warm_s=300.0)
+    cache.get(40.7, -74.0)
+    cache.get(51.5, -0.1)
+    settle(cache)
+    clock[0] += 500  # past 0.8 * ttl_s
+    cache.get(40.7, -74.0)
+    # Only the cell read within keep_warm_s is re-fetched ahead of expiry
+    assert cache.refresh_due() == 1
+    settle(cache)
+    assert len(api.calls) == 3
+    # Unread for longer than the stale window: dropped
+    clock[0] += 3800
+    assert cache.refresh_due() == 0
+    assert cache.stats()['entries'] == 1
+    cache.stop()